@@ -0,0 +1,33 @@
+"""
+Общее ядро LabEquipment Manager
+
+Хранилище (схема, DatabaseManager, кэши, кампусы) и вспомогательные
+модули, которые импортируют все три версии интерфейса. Оптимизация слоя
+данных, сделанная здесь, сразу доходит до каждой версии.
+"""
+from .database import (
+    DatabaseManager,
+    ShardedDatabase,
+    MaintenanceConflictError,
+    QuotaExceededError,
+    StaleRecordError,
+    DEFAULT_CAMPUS,
+    MAINTENANCE_SYNC_MS,
+    SCHEMA_VERSION,
+    add_campus,
+    hash_password,
+    open_database,
+    series_dates,
+    shard_path,
+    validate_series,
+    verify_password,
+)
+from .startup import STARTUP, StartupTrace
+
+__all__ = [
+    'DatabaseManager', 'ShardedDatabase', 'MaintenanceConflictError', 'QuotaExceededError',
+    'StaleRecordError', 'DEFAULT_CAMPUS', 'MAINTENANCE_SYNC_MS', 'SCHEMA_VERSION', 'STARTUP',
+    'StartupTrace',
+    'add_campus', 'hash_password', 'open_database', 'series_dates', 'shard_path',
+    'validate_series', 'verify_password',
+]
@@ -0,0 +1,191 @@
+"""
+Аналитика загрузки оборудования для вкладки статистики
+
+История заявок загружается в компактные столбцы (array) - по одному
+значению на заявку: оборудование, день, слот, статус, группа. Все расчёты
+выполняются проходами по столбцам через map/compress/Counter без создания
+объекта на каждую строку.
+"""
+from array import array
+from collections import Counter
+from datetime import date, timedelta
+from itertools import compress, repeat
+from operator import floordiv, mod, sub
+
+# Временные слоты (как в форме подачи заявки)
+TIME_SLOTS = ('9:00-11:00', '11:00-13:00', '13:00-15:00', '15:00-17:00')
+
+# Коды статусов в столбце status
+STATUS_CODES = {'pending': 0, 'approved': 1, 'rejected': 2, 'completed': 3}
+
+# Таблицы признаков по коду статуса: занят ли слот, принято ли решение
+BOOKED = (0, 1, 0, 1, 0)
+DECIDED = (0, 1, 1, 1, 0)
+
+# Смещение julianday относительно date.toordinal()
+_JULIAN_OFFSET = 1721424.5
+
+WEEKDAYS = ('Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс')
+
+
+class RequestColumns:
+    """Столбцы истории заявок за период"""
+
+    __slots__ = ('equipment_id', 'day', 'slot', 'status', 'group', 'groups',
+                 'first_day', 'last_day')
+
+    def __init__(self, first_day, last_day):
+        self.equipment_id = array('l')
+        self.day = array('l')
+        self.slot = array('b')
+        self.status = array('b')
+        self.group = array('l')
+        self.groups = []
+        self.first_day = first_day
+        self.last_day = last_day
+
+    def __len__(self):
+        return len(self.day)
+
+    @classmethod
+    def load(cls, connection, first_day=None, last_day=None, source="requests"):
+        """Загрузить заявки за период [first_day, last_day] (date).
+
+        По умолчанию берётся год, заканчивающийся датой последней заявки.
+        source - таблица или подзапрос (например, заявки вместе с архивом).
+        """
+        cursor = connection.cursor()
+        if last_day is None:
+            last_day = cls.latest_day(connection, source) or date.today()
+        if first_day is None:
+            first_day = last_day - timedelta(days=364)
+
+        columns = cls(first_day, last_day)
+        status_case = " ".join(
+            f"WHEN '{name}' THEN {code}" for name, code in STATUS_CODES.items()
+        )
+        slot_case = " ".join(
+            f"WHEN '{slot}' THEN {index}" for index, slot in enumerate(TIME_SLOTS)
+        )
+        cursor.execute(f"""
+            SELECT equipment_id,
+                   CAST(julianday(desired_date) - {_JULIAN_OFFSET} AS INTEGER),
+                   CASE desired_time_slot {slot_case} ELSE -1 END,
+                   CASE status {status_case} ELSE 4 END,
+                   student_group
+            FROM {source}
+            WHERE desired_date BETWEEN ? AND ?
+        """, (first_day.isoformat(), last_day.isoformat()))
+        rows = cursor.fetchall()
+        if not rows:
+            return columns
+
+        equipment_ids, days, slots, statuses, groups = zip(*rows)
+        group_codes = {}
+        columns.equipment_id.extend(equipment_ids)
+        columns.day.extend(days)
+        columns.slot.extend(slots)
+        columns.status.extend(statuses)
+        columns.group.extend(map(lambda g: group_codes.setdefault(g, len(group_codes)), groups))
+        columns.groups = list(group_codes)
+        return columns
+
+    @staticmethod
+    def latest_day(connection, source="requests"):
+        """Дата последней заявки в источнике (или None)"""
+        cursor = connection.cursor()
+        cursor.execute(
+            f"SELECT MAX(desired_date) FROM {source} WHERE julianday(desired_date) IS NOT NULL"
+        )
+        latest = cursor.fetchone()[0]
+        return date.fromisoformat(latest) if latest else None
+
+    @classmethod
+    def concat(cls, parts, first_day, last_day):
+        """Объединить столбцы, загруженные за один период из разных баз"""
+        columns = cls(first_day, last_day)
+        group_codes = {}
+        for part in parts:
+            columns.equipment_id.extend(part.equipment_id)
+            columns.day.extend(part.day)
+            columns.slot.extend(part.slot)
+            columns.status.extend(part.status)
+            recode = [group_codes.setdefault(group, len(group_codes)) for group in part.groups]
+            columns.group.extend(map(recode.__getitem__, part.group))
+        columns.groups = list(group_codes)
+        return columns
+
+    def mask(self, table):
+        """Маска строк по таблице признаков статуса (BOOKED, DECIDED...)"""
+        return bytes(map(table.__getitem__, self.status))
+
+    def weekday(self):
+        """День недели каждой заявки (0 - понедельник)"""
+        return map(mod, map(sub, self.day, repeat(1)), repeat(7))
+
+    def first_monday(self):
+        """Понедельник недели, с которой начинается период"""
+        return self.first_day - timedelta(days=self.first_day.weekday())
+
+    def week(self):
+        """Номер недели от начала периода (недели начинаются с понедельника)"""
+        return map(floordiv, map(sub, self.day, repeat(self.first_monday().toordinal())), repeat(7))
+
+
+class UtilizationReport:
+    """Показатели загрузки оборудования за период"""
+
+    def __init__(self, columns, equipment_ids=()):
+        self.columns = columns
+        self.days = (columns.last_day - columns.first_day).days + 1
+        self.capacity = self.days * len(TIME_SLOTS)
+
+        booked = columns.mask(BOOKED)
+        decided = columns.mask(DECIDED)
+
+        self.booked_by_equipment = Counter(compress(columns.equipment_id, booked))
+        self.decided_by_equipment = Counter(compress(columns.equipment_id, decided))
+        self.booked_by_group = Counter(compress(columns.group, booked))
+        self.booked_by_week = Counter(compress(columns.week(), booked))
+        self.heatmap = Counter(compress(zip(columns.weekday(), columns.slot), booked))
+        self.equipment_ids = sorted(set(equipment_ids) | set(self.booked_by_equipment))
+
+    def utilization(self, equipment_id):
+        """Доля занятых слотов оборудования за период"""
+        return self.booked_by_equipment[equipment_id] / self.capacity if self.capacity else 0.0
+
+    def approval_rate(self, equipment_id):
+        """Доля одобренных среди рассмотренных заявок"""
+        decided = self.decided_by_equipment[equipment_id]
+        return self.booked_by_equipment[equipment_id] / decided if decided else 0.0
+
+    def group_counts(self):
+        """Число занятых слотов по учебным группам (по убыванию)"""
+        groups = self.columns.groups
+        return [(groups[code], count) for code, count in self.booked_by_group.most_common()]
+
+    def week_counts(self):
+        """Число занятых слотов по неделям: [(понедельник недели, число)]"""
+        start = self.columns.first_monday()
+        return [(start + timedelta(weeks=week), self.booked_by_week[week])
+                for week in sorted(self.booked_by_week)]
+
+    def heatmap_rows(self):
+        """Тепловая карта: строки по дням недели, столбцы по слотам"""
+        return [[self.heatmap[(weekday, slot)] for slot in range(len(TIME_SLOTS))]
+                for weekday in range(7)]
+
+    def peak_slot(self):
+        """Самый загруженный (день недели, слот) или None"""
+        if not self.heatmap:
+            return None
+        (weekday, slot), _ = self.heatmap.most_common(1)[0]
+        return WEEKDAYS[weekday], TIME_SLOTS[slot] if slot >= 0 else "?"
+
+
+def build_report(connection, equipment_ids=(), first_day=None, last_day=None,
+                 source="requests"):
+    """Загрузить столбцы и посчитать отчёт о загрузке"""
+    return UtilizationReport(
+        RequestColumns.load(connection, first_day, last_day, source), equipment_ids
+    )
@@ -0,0 +1,265 @@
+"""
+Правила автоматического рассмотрения заявок
+
+Заявки со статусом 'pending' обрабатываются порциями. Для каждой порции
+один раз строятся индексы (статус оборудования, окна обслуживания, занятые
+слоты, число заявок преподавателя за месяц), после чего правила проверяются по словарям
+и множествам без запросов на каждую заявку. Решение и имя сработавшего
+правила записываются в таблицу rule_decisions.
+"""
+import json
+from collections import Counter, defaultdict
+from datetime import date
+
+# Сколько активных (на рассмотрении и одобренных) заявок в месяц может иметь преподаватель
+TEACHER_MONTHLY_QUOTA = 20
+
+# Действия правил и итоговые статусы заявок
+ACTIONS = {'approve': 'approved', 'reject': 'rejected', 'waitlist': 'waitlisted'}
+
+
+class PendingRequest:
+    """Заявка, ожидающая рассмотрения"""
+
+    __slots__ = ('id', 'teacher_id', 'equipment_id', 'date', 'time_slot')
+
+    def __init__(self, request_id, teacher_id, equipment_id, date, time_slot):
+        self.id = request_id
+        self.teacher_id = teacher_id
+        self.equipment_id = equipment_id
+        self.date = date
+        self.time_slot = time_slot
+
+    @property
+    def slot(self):
+        return self.equipment_id, self.date, self.time_slot
+
+    @property
+    def month(self):
+        return self.date[:7]
+
+
+class BatchContext:
+    """Индексы доступности и квот для порции заявок"""
+
+    def __init__(self, connection, requests):
+        cursor = connection.cursor()
+        cursor.execute("SELECT id, status FROM equipment")
+        self.equipment_status = dict(cursor.fetchall())
+
+        dates = sorted({request.date for request in requests})
+        cursor.execute("""
+            SELECT equipment_id, desired_date, desired_time_slot FROM requests
+            WHERE status = 'approved' AND desired_date IN (SELECT value FROM json_each(?))
+        """, (json.dumps(dates),))
+        self.taken_slots = set(cursor.fetchall())
+
+        # Занятия одобренных серий тоже занимают слот, кроме переопределённых
+        # не в 'approved' (как в find_series_conflicts)
+        equipment_ids = sorted({request.equipment_id for request in requests})
+        cursor.execute("""
+            SELECT id, equipment_id, time_slot, start_date, end_date, interval_days
+            FROM recurring_requests
+            WHERE status = 'approved' AND equipment_id IN (SELECT value FROM json_each(?))
+              AND start_date <= ? AND end_date >= ?
+        """, (json.dumps(equipment_ids), dates[-1], dates[0]))
+        series = cursor.fetchall()
+        cursor.execute("""
+            SELECT series_id, occurrence_date FROM recurring_overrides
+            WHERE status != 'approved' AND occurrence_date IN (SELECT value FROM json_each(?))
+        """, (json.dumps(dates),))
+        released = set(cursor.fetchall())
+        for series_id, equipment_id, time_slot, start_date, end_date, interval_days in series:
+            first = date.fromisoformat(start_date)
+            self.taken_slots.update(
+                (equipment_id, day, time_slot) for day in dates
+                if start_date <= day <= end_date
+                and (date.fromisoformat(day) - first).days % interval_days == 0
+                and (series_id, day) not in released
+            )
+
+        # Окна обслуживания оборудования порции, пересекающие её даты
+        cursor.execute("""
+            SELECT equipment_id, start_date, end_date FROM maintenance_windows
+            WHERE equipment_id IN (SELECT value FROM json_each(?))
+              AND start_date <= ? AND end_date >= ?
+        """, (json.dumps(equipment_ids), dates[-1], dates[0]))
+        self.maintenance = defaultdict(list)
+        for equipment_id, start_date, end_date in cursor.fetchall():
+            self.maintenance[equipment_id].append((start_date, end_date))
+
+        # Статус 'maintenance' выставлен расписанием, если у оборудования есть
+        # активное окно - любое, а не только пересекающее даты порции
+        cursor.execute("""
+            SELECT DISTINCT equipment_id FROM maintenance_windows
+            WHERE state = 'active' AND equipment_id IN (SELECT value FROM json_each(?))
+        """, (json.dumps(equipment_ids),))
+        self.scheduled = {row[0] for row in cursor.fetchall()}
+
+        # Счётчики квот (pending + approved) ведутся триггерами в quota_usage
+        months = sorted({request.month for request in requests})
+        teachers = sorted({str(request.teacher_id) for request in requests})
+        cursor.execute("""
+            SELECT key, period, count FROM quota_usage
+            WHERE scope = 'teacher'
+              AND key IN (SELECT value FROM json_each(?))
+              AND period IN (SELECT value FROM json_each(?))
+        """, (json.dumps(teachers), json.dumps(months)))
+        self.teacher_usage = Counter(
+            {(int(teacher_id), month): count for teacher_id, month, count in cursor.fetchall()}
+        )
+
+    def is_available(self, request):
+        """Оборудование в работе; статус 'maintenance', выставленный по расписанию,
+        не мешает заявкам вне окна обслуживания"""
+        status = self.equipment_status.get(request.equipment_id)
+        return status == 'available' or (
+            status == 'maintenance' and request.equipment_id in self.scheduled
+        )
+
+    def in_maintenance(self, request):
+        return any(start <= request.date <= end
+                   for start, end in self.maintenance.get(request.equipment_id, ()))
+
+    def is_slot_free(self, request):
+        return request.slot not in self.taken_slots
+
+    def usage(self, request):
+        """Активные заявки преподавателя за месяц заявки (включая её саму)"""
+        return self.teacher_usage[(request.teacher_id, request.month)]
+
+    def book(self, request):
+        """Учесть одобренную заявку в индексах порции"""
+        self.taken_slots.add(request.slot)
+
+    def release(self, request):
+        """Отклонённая или поставленная в лист ожидания заявка больше не активна
+        и не занимает квоту преподавателя"""
+        self.teacher_usage[(request.teacher_id, request.month)] -= 1
+
+
+class ApprovalRule:
+    """Правило: если predicate(заявка, контекст) истинно - выполнить action"""
+
+    __slots__ = ('name', 'description', 'action', 'predicate')
+
+    def __init__(self, name, description, action, predicate):
+        if action not in ACTIONS:
+            raise ValueError(f"Неизвестное действие правила: {action}")
+        self.name = name
+        self.description = description
+        self.action = action
+        self.predicate = predicate
+
+    def matches(self, request, context):
+        return self.predicate(request, context)
+
+
+def default_rules(teacher_quota=TEACHER_MONTHLY_QUOTA):
+    """Набор правил по умолчанию (проверяются по порядку, срабатывает первое)
+
+    Квота считается по активным заявкам (на рассмотрении и одобренным),
+    поэтому текущая заявка уже входит в счётчик.
+    """
+    return [
+        ApprovalRule(
+            'equipment_maintenance', "оборудование на обслуживании в эту дату", 'reject',
+            lambda request, ctx: ctx.in_maintenance(request)
+        ),
+        ApprovalRule(
+            'equipment_unavailable', "оборудование недоступно", 'reject',
+            lambda request, ctx: not ctx.is_available(request)
+        ),
+        ApprovalRule(
+            'slot_taken', "слот уже занят", 'waitlist',
+            lambda request, ctx: not ctx.is_slot_free(request)
+        ),
+        ApprovalRule(
+            'auto_approve', "оборудование доступно, слот свободен, квота не превышена", 'approve',
+            lambda request, ctx: ctx.usage(request) <= teacher_quota
+        ),
+    ]
+
+
+def first_approvable(connection, requests, rules=None):
+    """Первая из заявок (по порядку), которую правила одобрили бы сейчас, или None
+
+    Используется при продвижении листа ожидания. Заявки из листа ожидания
+    не входят в счётчик квоты, поэтому каждая проверяется так, будто уже
+    стала активной.
+    """
+    if not requests:
+        return None
+    rules = rules if rules is not None else default_rules()
+    context = BatchContext(connection, requests)
+    for request in requests:
+        key = (request.teacher_id, request.month)
+        context.teacher_usage[key] += 1
+        rule = next((rule for rule in rules if rule.matches(request, context)), None)
+        if rule is not None and rule.action == 'approve':
+            return request
+        context.teacher_usage[key] -= 1
+    return None
+
+
+def evaluate_pending(connection, rules=None, batch_size=200, audit=None):
+    """Рассмотреть все заявки 'pending' по правилам, порциями по batch_size
+
+    Заявки, к которым не подошло ни одно правило, остаются на рассмотрении.
+    Решения записываются в журнал audit (AuditLog), если он передан.
+    Возвращает Counter с числом решений по каждому правилу.
+    """
+    rules = rules if rules is not None else default_rules()
+    cursor = connection.cursor()
+    decided = Counter()
+    last_id = 0
+
+    while True:
+        cursor.execute("""
+            SELECT id, teacher_id, equipment_id, desired_date, desired_time_slot
+            FROM requests
+            WHERE status = 'pending' AND id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (last_id, batch_size))
+        requests = [PendingRequest(*row) for row in cursor.fetchall()]
+        if not requests:
+            break
+        last_id = requests[-1].id
+
+        context = BatchContext(connection, requests)
+        decisions = []
+        for request in requests:
+            rule = next((rule for rule in rules if rule.matches(request, context)), None)
+            if rule is None:
+                continue
+            if rule.action == 'approve':
+                context.book(request)
+            else:
+                context.release(request)
+            decisions.append((request, rule))
+            decided[rule.name] += 1
+
+        cursor.executemany(
+            "UPDATE requests SET status = ?, admin_notes = ? WHERE id = ?",
+            [(ACTIONS[rule.action], f"Автоматически: {rule.description}", request.id)
+             for request, rule in decisions]
+        )
+        if audit is not None:
+            for request, rule in decisions:
+                audit.record('update', 'requests', request.id, {'status': 'pending'}, {
+                    'status': ACTIONS[rule.action], 'admin_notes': f"Автоматически: {rule.description}"
+                })
+        cursor.executemany(
+            """INSERT OR IGNORE INTO waitlist (request_id, equipment_id, desired_date, time_slot)
+               VALUES (?, ?, ?, ?)""",
+            [(request.id, *request.slot) for request, rule in decisions if rule.action == 'waitlist']
+        )
+        cursor.executemany(
+            """INSERT OR REPLACE INTO rule_decisions (request_id, rule, action)
+               VALUES (?, ?, ?)""",
+            [(request.id, rule.name, rule.action) for request, rule in decisions]
+        )
+        connection.commit()
+
+    return decided
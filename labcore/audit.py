@@ -0,0 +1,190 @@
+"""
+Журнал изменений (аудит)
+
+Каждое изменение заявок, оборудования и пользователей записывается как
+запись {ts, actor, action, entity, id, before, after}. Записи попадают в
+таблицу audit_pending в той же транзакции, что и само изменение, а когда
+их набирается batch_size, упаковываются в сегмент: JSON-строки, сжатые
+zlib, - одна строка BLOB в audit_segments. Индекс audit_index
+(сущность, id -> сегмент) позволяет читать историю объекта, распаковывая
+только нужные сегменты. Сегменты и индекс только дополняются: UPDATE и
+DELETE запрещены триггерами.
+"""
+import json
+import zlib
+from datetime import datetime
+
+# Сколько записей собирается перед упаковкой в сегмент
+AUDIT_BATCH_SIZE = 500
+
+# Поля, которые не попадают в журнал (version - служебный номер версии строки)
+REDACTED_FIELDS = ('password', 'version')
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS audit_pending (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity TEXT NOT NULL,
+        entity_id INTEGER NOT NULL,
+        record TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_audit_pending_entity ON audit_pending (entity, entity_id);
+
+    CREATE TABLE IF NOT EXISTS audit_segments (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        first_at TEXT NOT NULL,
+        last_at TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        data BLOB NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS audit_index (
+        entity TEXT NOT NULL,
+        entity_id INTEGER NOT NULL,
+        segment_id INTEGER NOT NULL,
+        PRIMARY KEY (entity, entity_id, segment_id)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS trg_audit_segments_no_update
+    BEFORE UPDATE ON audit_segments
+    BEGIN SELECT RAISE(ABORT, 'audit_segments is append-only'); END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_audit_segments_no_delete
+    BEFORE DELETE ON audit_segments
+    BEGIN SELECT RAISE(ABORT, 'audit_segments is append-only'); END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_audit_index_no_update
+    BEFORE UPDATE ON audit_index
+    BEGIN SELECT RAISE(ABORT, 'audit_index is append-only'); END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_audit_index_no_delete
+    BEFORE DELETE ON audit_index
+    BEGIN SELECT RAISE(ABORT, 'audit_index is append-only'); END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_audit_pending_no_update
+    BEFORE UPDATE ON audit_pending
+    BEGIN SELECT RAISE(ABORT, 'audit_pending is append-only'); END;
+"""
+
+
+def create_schema(cursor):
+    """Создать таблицы журнала"""
+    cursor.executescript(SCHEMA)
+
+
+def row_values(cursor, table, row_id):
+    """Значения строки таблицы в виде словаря (без секретных полей) или None"""
+    cursor.execute(f"SELECT * FROM {table} WHERE id = ?", (row_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    values = dict(zip((column[0] for column in cursor.description), row))
+    for field in REDACTED_FIELDS:
+        values.pop(field, None)
+    return values
+
+
+def changed_values(before, after):
+    """Оставить в before/after только изменившиеся поля"""
+    if before is None or after is None:
+        return before, after
+    keys = [key for key in after if before.get(key) != after[key]]
+    return {key: before.get(key) for key in keys}, {key: after[key] for key in keys}
+
+
+def encode_segment(records):
+    """Упаковать записи (JSON-строки) в сжатый сегмент"""
+    return zlib.compress("\n".join(records).encode("utf-8"), 6)
+
+
+def decode_segment(data):
+    """Распаковать сегмент в список записей"""
+    return [json.loads(line) for line in zlib.decompress(data).decode("utf-8").split("\n")]
+
+
+class AuditLog:
+    """Журнал изменений поверх соединения с БД
+
+    record() не делает commit: запись фиксируется вместе с изменением.
+    actor_id - пользователь, от имени которого выполняются изменения
+    (None - система или командная строка).
+    """
+
+    def __init__(self, connection, batch_size=AUDIT_BATCH_SIZE):
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.batch_size = batch_size
+        self.actor_id = None
+        self.cursor.execute("SELECT COUNT(*) FROM audit_pending")
+        self.staged = self.cursor.fetchone()[0]
+
+    def resync(self):
+        """Счётчик накопленных записей устарел (транзакция откачена)
+
+        Пересчёт откладывается до следующей записи: сразу после отката
+        база может быть ещё занята другим клиентом.
+        """
+        self.staged = None
+
+    def record(self, action, entity, entity_id, before=None, after=None):
+        """Добавить запись; при накоплении batch_size записей упаковать сегмент"""
+        before, after = changed_values(before, after)
+        if action == 'update' and not after:
+            return
+        record = {
+            'ts': datetime.now().isoformat(timespec='seconds'),
+            'actor': self.actor_id,
+            'action': action,
+            'entity': entity,
+            'id': entity_id,
+            'before': before,
+            'after': after,
+        }
+        self.cursor.execute(
+            "INSERT INTO audit_pending (entity, entity_id, record) VALUES (?, ?, ?)",
+            (entity, entity_id, json.dumps(record, ensure_ascii=False, separators=(',', ':')))
+        )
+        if self.staged is None:
+            self.cursor.execute("SELECT COUNT(*) FROM audit_pending")
+            self.staged = self.cursor.fetchone()[0]
+        else:
+            self.staged += 1
+        if self.staged >= self.batch_size:
+            self.compact()
+
+    def compact(self):
+        """Упаковать накопленные записи в один сегмент (в текущей транзакции)"""
+        self.cursor.execute("SELECT id, entity, entity_id, record FROM audit_pending ORDER BY id")
+        rows = self.cursor.fetchall()
+        if not rows:
+            self.staged = 0
+            return None
+        records = [row[3] for row in rows]
+        self.cursor.execute(
+            "INSERT INTO audit_segments (first_at, last_at, count, data) VALUES (?, ?, ?, ?)",
+            (json.loads(records[0])['ts'], json.loads(records[-1])['ts'], len(records),
+             encode_segment(records))
+        )
+        segment_id = self.cursor.lastrowid
+        self.cursor.executemany(
+            "INSERT OR IGNORE INTO audit_index (entity, entity_id, segment_id) VALUES (?, ?, ?)",
+            sorted({(entity, entity_id, segment_id) for _, entity, entity_id, _ in rows})
+        )
+        self.cursor.execute("DELETE FROM audit_pending WHERE id <= ?", (rows[-1][0],))
+        self.staged = 0
+        return segment_id
+
+    def history(self, entity, entity_id):
+        """История объекта в хронологическом порядке"""
+        self.cursor.execute(
+            "SELECT s.data FROM audit_index i JOIN audit_segments s ON s.id = i.segment_id "
+            "WHERE i.entity = ? AND i.entity_id = ? ORDER BY i.segment_id",
+            (entity, entity_id)
+        )
+        records = [record for (data,) in self.cursor.fetchall() for record in decode_segment(data)
+                   if record['entity'] == entity and record['id'] == entity_id]
+        self.cursor.execute(
+            "SELECT record FROM audit_pending WHERE entity = ? AND entity_id = ? ORDER BY id",
+            (entity, entity_id)
+        )
+        records.extend(json.loads(record) for (record,) in self.cursor.fetchall())
+        return records
@@ -0,0 +1,206 @@
+"""
+Резервное копирование базы без остановки клиентов
+
+Копия снимается через backup API SQLite отдельным соединением, шагами по
+BACKUP_PAGES страниц с паузой между шагами, поэтому открытые окна
+администратора и преподавателей продолжают читать и писать во время
+копирования. Снимок - каталог в <база>_snapshots с копиями всех файлов
+базы: основного, архива, баз кампусов и их архивов, - чтобы заявка,
+перенесённая в архив или в другой файл, не потерялась и не удвоилась при
+восстановлении. Снимок делается, только если какой-то из файлов изменился
+с прошлого снимка (счётчики изменений в заголовках файлов); старые снимки
+сверх SNAPSHOT_KEEP удаляются. Восстановление сначала проверяет
+целостность всех файлов снимка.
+"""
+import os
+import re
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+# Страниц за один шаг копирования и пауза между шагами (с)
+BACKUP_PAGES = 64
+BACKUP_PAUSE = 0.005
+
+# Сколько снимков хранить и как часто снимать их из окна приложения (с)
+SNAPSHOT_KEEP = 14
+SNAPSHOT_INTERVAL = 60 * 60
+
+# Сколько раз переснимать набор файлов, если он менялся во время копирования
+SNAPSHOT_ATTEMPTS = 3
+
+
+def change_counter(path):
+    """Счётчик изменений файла базы (смещение 24 заголовка SQLite)"""
+    with open(path, "rb") as file:
+        header = file.read(28)
+    return int.from_bytes(header[24:28], "big") if len(header) == 28 else 0
+
+
+def database_files(db_path):
+    """Существующие файлы базы db_path: она сама, архив, базы кампусов и их архивы
+
+    Имена - как у DatabaseManager: <база>_archive, <база>_campusN и
+    <база>_campusN_archive с тем же расширением. Основной файл - первый.
+    """
+    directory = os.path.dirname(os.path.abspath(db_path))
+    base, ext = os.path.splitext(os.path.basename(db_path))
+    pattern = re.compile(rf"{re.escape(base)}(_campus\d+)?(_archive)?{re.escape(ext)}")
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if pattern.fullmatch(name)]
+
+
+def online_backup(source_path, target_path, pages=BACKUP_PAGES, pause=BACKUP_PAUSE,
+                  progress=None):
+    """Скопировать базу source_path в target_path шагами по pages страниц
+
+    Копия пишется во временный файл и подменяет target_path только
+    после успешного завершения. progress(осталось, всего) вызывается
+    после каждого шага.
+    """
+    def step(status, remaining, total):
+        if progress:
+            progress(remaining, total)
+        # Между шагами блокировка базы снята - даём поработать клиентам
+        time.sleep(pause)
+
+    partial = target_path + ".part"
+    source = sqlite3.connect(source_path, timeout=30)
+    try:
+        target = sqlite3.connect(partial)
+        try:
+            source.backup(target, pages=pages, progress=step)
+        finally:
+            target.close()
+    finally:
+        source.close()
+    os.replace(partial, target_path)
+    return target_path
+
+
+def check_integrity(path):
+    """Проверить целостность файла базы; список ошибок (пустой - всё в порядке)"""
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = [row[0] for row in connection.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    finally:
+        connection.close()
+    return [] if rows == ["ok"] else rows
+
+
+def snapshot_files(snapshot_path):
+    """Файлы снимка: каталог набора или (старый формат) один файл основной базы"""
+    if os.path.isdir(snapshot_path):
+        return [os.path.join(snapshot_path, name) for name in sorted(os.listdir(snapshot_path))]
+    return [snapshot_path]
+
+
+class SnapshotManager:
+    """Снимки базы в отдельном каталоге с ограничением их числа"""
+
+    def __init__(self, db_path, directory=None, keep=SNAPSHOT_KEEP):
+        self.db_path = os.path.abspath(db_path)
+        base = os.path.splitext(self.db_path)[0]
+        self.directory = directory or base + "_snapshots"
+        self.prefix = os.path.basename(base) + "-"
+        self.keep = keep
+
+    def list(self):
+        """Пути снимков от старых к новым (каталоги наборов и старые одиночные файлы)"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory)
+            if name.startswith(self.prefix) and not name.endswith(".part")
+        )
+
+    def counter(self):
+        """Сумма счётчиков изменений всех файлов базы: растёт при изменении любого"""
+        return sum(change_counter(path) for path in database_files(self.db_path))
+
+    def last_counter(self):
+        """Счётчик изменений базы на момент последнего снимка (или None)"""
+        snapshots = self.list()
+        if not snapshots:
+            return None
+        name = os.path.basename(snapshots[-1])
+        tail = name.removesuffix(".db").rsplit("-c", 1)
+        return int(tail[1]) if len(tail) == 2 and tail[1].isdigit() else None
+
+    def take(self, force=False, progress=None):
+        """Снять снимок, если база изменилась (или force); путь снимка или None
+
+        Файлы копируются по очереди. Если за это время какой-то из них
+        изменился (например, заявки перенесли в архив между копиями),
+        набор снимается заново, не более SNAPSHOT_ATTEMPTS раз.
+        """
+        counter = self.counter()
+        if not force and counter == self.last_counter():
+            return None
+        os.makedirs(self.directory, exist_ok=True)
+        # Микросекунды: снимки, снятые в одну секунду, не затирают друг друга
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        path = os.path.join(self.directory, f"{self.prefix}{stamp}-c{counter}")
+        partial = path + ".part"
+        os.makedirs(partial)
+        for attempt in range(SNAPSHOT_ATTEMPTS):
+            files = database_files(self.db_path)
+            before = [change_counter(source) for source in files]
+            for source in files:
+                online_backup(source, os.path.join(partial, os.path.basename(source)),
+                              progress=progress)
+            if [change_counter(source) for source in files] == before:
+                break
+        os.replace(partial, path)
+        self.prune()
+        return path
+
+    def prune(self):
+        """Удалить снимки сверх self.keep самых новых"""
+        snapshots = self.list()
+        for path in snapshots[:max(len(snapshots) - self.keep, 0)]:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+
+def restore(snapshot_path, db_path):
+    """Восстановить базу со всеми её файлами из снимка (клиенты должны быть закрыты)
+
+    Все файлы снимка проверяются PRAGMA integrity_check. Каждый текущий файл
+    базы сохраняется рядом с суффиксом .before-restore; файлы, которых нет
+    в снимке (архив или кампус, появившиеся позже), после этого убираются,
+    чтобы их заявки не удвоились. Файл снимка копируется во временный .tmp
+    и подменяет базу через os.replace. Возвращает путь копии основной базы.
+    """
+    sources = snapshot_files(snapshot_path)
+    for source in sources:
+        errors = check_integrity(source)
+        if errors:
+            raise ValueError(f"Снимок повреждён ({os.path.basename(source)}): "
+                             + "; ".join(errors[:5]))
+    directory = os.path.dirname(os.path.abspath(db_path))
+    if os.path.isdir(snapshot_path):
+        targets = [os.path.join(directory, os.path.basename(source)) for source in sources]
+    else:
+        targets = [os.path.abspath(db_path)]
+
+    for current in database_files(db_path):
+        online_backup(current, current + ".before-restore")
+        if current not in targets:
+            os.remove(current)
+    for source, target in zip(sources, targets):
+        copy = target + ".tmp"
+        online_backup(source, copy)
+        # Журнал прежней базы не должен примениться к восстановленному файлу
+        for suffix in ("-journal", "-wal", "-shm"):
+            if os.path.exists(target + suffix):
+                os.remove(target + suffix)
+        os.replace(copy, target)
+    return db_path + ".before-restore"
@@ -0,0 +1,2005 @@
+"""
+Слой данных LabEquipment Manager
+
+Схема SQLite и её миграции, DatabaseManager (запросы, кэши, квоты, лист
+ожидания, обслуживание, журнал, резервные копии) и ShardedDatabase для
+нескольких кампусов. Пакет общий для всех версий интерфейса: версии
+различаются только окнами, а хранилище и все его оптимизации одни.
+"""
+import hashlib
+import heapq
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from .analytics import RequestColumns, UtilizationReport
+from .approval import (
+    default_rules, evaluate_pending, first_approvable, PendingRequest, TEACHER_MONTHLY_QUOTA,
+)
+from .audit import AuditLog, create_schema as create_audit_schema, row_values
+from .retry import LockStats, RetryPolicy, retry_on_lock
+from .backup import SnapshotManager
+from .startup import STARTUP
+from .statements import REQUEST_STATUS_ORDER, STATEMENTS, STATEMENT_CACHE_SIZE
+
+# Версия схемы БД (PRAGMA user_version); при совпадении создание таблиц пропускается
+SCHEMA_VERSION = 12
+
+# Столбцы таблицы заявок (общие для основной таблицы и архива)
+REQUEST_COLUMNS = ("id, teacher_id, equipment_id, student_group, purpose, desired_date, "
+                   "desired_time_slot, status, admin_notes, created_at, version")
+
+# Таблицы с номером версии строки (оптимистическая блокировка правок)
+VERSIONED_TABLES = ('users', 'equipment', 'requests')
+
+# Таблицы со ссылками (FOREIGN KEY) на таблицы той же базы: по этим
+# описаниям создаются новые базы и перестраиваются старые (см. add_foreign_keys).
+# Ссылки teacher_id на users нет: в базах кампусов пользователи берутся из
+# основной базы (attach_home), а внешний ключ SQLite не видит другую базу.
+REFERENCING_TABLES = {
+    'requests': """(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        teacher_id INTEGER NOT NULL,
+        equipment_id INTEGER NOT NULL REFERENCES equipment (id),
+        student_group TEXT NOT NULL,
+        purpose TEXT NOT NULL,
+        desired_date TEXT NOT NULL,
+        desired_time_slot TEXT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        admin_notes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        version INTEGER NOT NULL DEFAULT 0
+    )""",
+    'recurring_requests': """(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        teacher_id INTEGER NOT NULL,
+        equipment_id INTEGER NOT NULL REFERENCES equipment (id),
+        student_group TEXT NOT NULL,
+        purpose TEXT NOT NULL,
+        start_date TEXT NOT NULL,
+        end_date TEXT NOT NULL,
+        interval_days INTEGER NOT NULL DEFAULT 7,
+        time_slot TEXT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        admin_notes TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    # Место в листе ожидания исчезает вместе с заявкой
+    'waitlist': """(
+        request_id INTEGER PRIMARY KEY REFERENCES requests (id) ON DELETE CASCADE,
+        equipment_id INTEGER NOT NULL,
+        desired_date TEXT NOT NULL,
+        time_slot TEXT NOT NULL,
+        priority INTEGER NOT NULL DEFAULT 0,
+        queued_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    # state: scheduled - ещё не началось, active - статус оборудования
+    # переведён в 'maintenance', done - завершено. Окна удаляются вместе с оборудованием
+    'maintenance_windows': """(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        equipment_id INTEGER NOT NULL REFERENCES equipment (id) ON DELETE CASCADE,
+        start_date TEXT NOT NULL,
+        end_date TEXT NOT NULL,
+        reason TEXT,
+        state TEXT NOT NULL DEFAULT 'scheduled',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+}
+
+# Статусы закрытых заявок, которые переносятся в архив
+ARCHIVE_STATUSES = ('completed', 'rejected', 'cancelled')
+
+# Параметры scrypt: ~16 МБ памяти и ~50 мс на одну проверку пароля
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_PREFIX = "scrypt"
+
+# Время жизни сессионного токена (секунды)
+SESSION_TTL = 7 * 24 * 3600
+
+# Каталог профиля пользователя для сохранённых сессий (внутри %APPDATA% или ~)
+SESSION_DIR = "LabEquipment" if os.name == "nt" else ".labequipment"
+
+
+def session_path(db_name):
+    """Файл сохранённой сессии в профиле текущего пользователя
+
+    Токен не хранится рядом с базой: её каталог обычно общий. Имя файла
+    зависит от пути к базе, чтобы сессии разных баз не смешивались.
+    """
+    root = os.environ.get("APPDATA") if os.name == "nt" else None
+    directory = os.path.join(root or os.path.expanduser("~"), SESSION_DIR)
+    digest = hashlib.sha256(os.path.abspath(db_name).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory, digest + ".session")
+
+
+def hash_password(password):
+    """Получить солёный scrypt-хеш пароля в формате scrypt$n$r$p$salt$hash"""
+    salt = secrets.token_bytes(16)
+    digest = hashlib.scrypt(
+        password.encode("utf-8"), salt=salt,
+        n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, maxmem=64 * 1024 * 1024
+    )
+    return f"{SCRYPT_PREFIX}${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${salt.hex()}${digest.hex()}"
+
+
+def is_password_hash(value):
+    """Проверить, что значение из БД уже является хешем, а не открытым паролем"""
+    return bool(value) and value.startswith(SCRYPT_PREFIX + "$")
+
+
+def verify_password(password, stored):
+    """Сравнить пароль с сохранённым хешем (медленная операция, вызывать вне потока Tk)"""
+    if not is_password_hash(stored):
+        # Старые записи с открытым паролем
+        return hmac.compare_digest(password.encode("utf-8"), (stored or "").encode("utf-8"))
+    try:
+        _, n, r, p, salt_hex, digest_hex = stored.split("$")
+        digest = hashlib.scrypt(
+            password.encode("utf-8"), salt=bytes.fromhex(salt_hex),
+            n=int(n), r=int(r), p=int(p), maxmem=64 * 1024 * 1024
+        )
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest.hex(), digest_hex)
+
+
+class AuthCache:
+    """Кэш успешных проверок пароля в памяти процесса.
+
+    Хранит не пароль, а HMAC от него на случайном ключе процесса, поэтому
+    повторный вход того же пользователя не требует повторного вычисления scrypt.
+    Запись действительна, пока хеш пароля в БД не изменился.
+    """
+
+    def __init__(self):
+        self._key = secrets.token_bytes(32)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _fingerprint(self, password):
+        return hmac.new(self._key, password.encode("utf-8"), hashlib.sha256).digest()
+
+    def check(self, username, password, stored):
+        """True, если пара логин/пароль уже проверялась для этого хеша"""
+        with self._lock:
+            entry = self._entries.get(username)
+        if entry is None or entry[0] != stored:
+            return False
+        return hmac.compare_digest(entry[1], self._fingerprint(password))
+
+    def remember(self, username, password, stored):
+        """Запомнить успешную проверку"""
+        with self._lock:
+            self._entries[username] = (stored, self._fingerprint(password))
+
+    def forget(self, username=None):
+        """Сбросить кэш пользователя (или весь кэш)"""
+        with self._lock:
+            if username is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(username, None)
+
+
+class SessionManager:
+    """Подписанные сессионные токены с кэшем проверок.
+
+    Токен имеет вид "user_id.role.expires.nonce.signature", подпись - HMAC-SHA256
+    на секретном ключе из таблицы settings. Проверенные токены кэшируются до
+    истечения срока, так что повторная проверка сводится к поиску в словаре.
+
+    Отозванные токены хранятся только в памяти процесса: после выхода файл
+    сессии удаляется, но копия токена, снятая до выхода, действует в другом
+    процессе до истечения срока. Поэтому файл доступен только владельцу (0600).
+    """
+
+    def __init__(self, secret, ttl=SESSION_TTL, path=None):
+        self.secret = secret
+        self.ttl = ttl
+        self.path = path
+        self.current = None
+        self._verified = {}
+        self._revoked = set()
+        self._lock = threading.Lock()
+
+    def _sign(self, payload):
+        return hmac.new(self.secret, payload.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def issue(self, user_id, role):
+        """Выдать токен для пользователя"""
+        expires = int(time.time()) + self.ttl
+        payload = f"{user_id}.{role}.{expires}.{secrets.token_hex(8)}"
+        token = f"{payload}.{self._sign(payload)}"
+        with self._lock:
+            self._verified[token] = (user_id, role, expires)
+        return token
+
+    def verify(self, token):
+        """Проверить токен; возвращает (user_id, role) или None"""
+        if not token:
+            return None
+        now = time.time()
+        with self._lock:
+            if token in self._revoked:
+                return None
+            cached = self._verified.get(token)
+        if cached is not None:
+            if cached[2] > now:
+                return cached[0], cached[1]
+            self.revoke(token)
+            return None
+
+        try:
+            payload, signature = token.rsplit(".", 1)
+            user_id, role, expires, _ = payload.split(".")
+            user_id, expires = int(user_id), int(expires)
+        except ValueError:
+            return None
+        if not hmac.compare_digest(self._sign(payload), signature) or expires <= now:
+            return None
+        with self._lock:
+            self._verified[token] = (user_id, role, expires)
+        return user_id, role
+
+    def revoke(self, token):
+        """Отозвать токен (выход из системы)"""
+        with self._lock:
+            self._verified.pop(token, None)
+            self._revoked.add(token)
+
+    def save(self, token):
+        """Сохранить токен на диск для входа без пароля при следующем запуске"""
+        self.current = token
+        if self.path:
+            os.makedirs(os.path.dirname(self.path), mode=0o700, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            # Права файла, созданного раньше, тоже сужаются
+            os.chmod(self.path, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(token)
+
+    def load(self):
+        """Прочитать сохранённый токен (или None)"""
+        if not self.path or not os.path.exists(self.path):
+            return None
+        with open(self.path, encoding="utf-8") as f:
+            return f.read().strip() or None
+
+    def end(self):
+        """Завершить текущую сессию и удалить сохранённый токен"""
+        if self.current:
+            self.revoke(self.current)
+            self.current = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class QueryCache:
+    """Кэш результатов запросов на чтение.
+
+    Запись действительна, пока соединение не выполнило ни одного изменения
+    (connection.total_changes) и не истёк ttl - последнее нужно, чтобы видеть
+    изменения других клиентов той же базы.
+    """
+
+    def __init__(self, connection, ttl=5.0, max_entries=64):
+        self.connection = connection
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Вернуть закэшированные строки или None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        changes, stamp, rows = entry
+        if changes != self.connection.total_changes or time.monotonic() - stamp > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return rows
+
+    def put(self, key, rows):
+        """Сохранить результат запроса"""
+        self._entries[key] = (self.connection.total_changes, time.monotonic(), rows)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Очистить кэш"""
+        self._entries.clear()
+
+
+def like_pattern(text):
+    """Шаблон LIKE '%текст%' с экранированием спецсимволов (ESCAPE '\\')"""
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def series_dates(start_date, end_date, interval_days=7):
+    """Лениво перечислить даты занятий серии (строки YYYY-MM-DD)"""
+    current = date.fromisoformat(start_date)
+    last = date.fromisoformat(end_date)
+    step = timedelta(days=interval_days)
+    while current <= last:
+        yield current.isoformat()
+        current += step
+
+
+def validate_series(start_date, end_date, interval_days=7):
+    """Проверить даты и шаг серии до записи; список дат занятий
+    
+    Неверная дата или шаг вызывают ValueError: в базу попадают только
+    серии, которые потом можно развернуть в занятия.
+    """
+    try:
+        first = date.fromisoformat(start_date)
+        last = date.fromisoformat(end_date)
+    except (TypeError, ValueError):
+        raise ValueError("Неверная дата серии: ожидается ГГГГ-ММ-ДД") from None
+    if isinstance(interval_days, bool) or not isinstance(interval_days, int) or interval_days < 1:
+        raise ValueError("Шаг серии должен быть целым числом дней, не меньше 1")
+    if last < first:
+        raise ValueError("Дата окончания серии раньше даты начала")
+    return list(series_dates(first.isoformat(), last.isoformat(), interval_days))
+
+
+# Квота учебной группы на месяц (для преподавателя - TEACHER_MONTHLY_QUOTA)
+GROUP_MONTHLY_QUOTA = 12
+
+# Статусы заявок, занимающих квоту
+QUOTA_STATUSES = ('pending', 'approved')
+
+
+class QuotaExceededError(ValueError):
+    """Заявка превышает квоту преподавателя или группы"""
+
+
+class MaintenanceConflictError(ValueError):
+    """Оборудование на обслуживании в желаемую дату"""
+
+
+class StaleRecordError(ValueError):
+    """Запись изменена или удалена другим пользователем после чтения
+
+    current - свежая запись из базы (None, если её больше нет), чтобы
+    окно показало актуальные данные без повторного запроса.
+    """
+
+    def __init__(self, message, current=None):
+        super().__init__(message)
+        self.current = current
+
+
+# Как часто окно приложения применяет расписание обслуживания (мс)
+MAINTENANCE_SYNC_MS = 15 * 60 * 1000
+
+
+# Статусы, при переходе в которые из 'approved' слот освобождается
+RELEASE_STATUSES = ('rejected', 'cancelled')
+
+
+class WaitlistView:
+    """Листы ожидания в памяти: куча (приоритет, время постановки) на каждый слот.
+
+    Строится из таблицы waitlist одним запросом и отвечает на вопросы
+    "кто следующий" и "какая позиция у заявки" без обращения к БД.
+    """
+
+    def __init__(self, rows=()):
+        self._heaps = {}
+        self._positions = None
+        for request_id, equipment_id, day, time_slot, priority, queued_at in rows:
+            self.push(request_id, equipment_id, day, time_slot, priority, queued_at)
+
+    def push(self, request_id, equipment_id, day, time_slot, priority=0, queued_at=""):
+        """Поставить заявку в очередь слота"""
+        heap = self._heaps.setdefault((equipment_id, day, time_slot), [])
+        heapq.heappush(heap, (-priority, queued_at, request_id))
+        self._positions = None
+
+    def peek(self, equipment_id, day, time_slot):
+        """Первая заявка в очереди слота (или None)"""
+        heap = self._heaps.get((equipment_id, day, time_slot))
+        return heap[0][2] if heap else None
+
+    def pop(self, equipment_id, day, time_slot):
+        """Извлечь первую заявку из очереди слота (или None)"""
+        heap = self._heaps.get((equipment_id, day, time_slot))
+        if not heap:
+            return None
+        self._positions = None
+        return heapq.heappop(heap)[2]
+
+    def position(self, request_id):
+        """Позиция заявки в очереди (с 1) или None"""
+        if self._positions is None:
+            self._positions = {}
+            for heap in self._heaps.values():
+                for index, entry in enumerate(sorted(heap), 1):
+                    self._positions[entry[2]] = index
+        return self._positions.get(request_id)
+
+
+class DatabaseManager:
+    """Менеджер базы данных"""
+    
+    def __init__(self, db_name="lab_equipment.db", fast_start=True, seed=True, home=True):
+        self.db_name = db_name
+        self.archive_path = None
+        self.seed = seed
+        # Все базы кампусов (квоты общие для всех кампусов, см. ShardedDatabase)
+        self.shards = [self]
+        # Ожидание и повторы при блокировке базы другим клиентом (см. retry.py)
+        self.retry_policy = RetryPolicy()
+        self.lock_stats = LockStats()
+        with STARTUP.phase("Открытие БД"):
+            # Соединение используется и из потоков параллельных запросов по кампусам
+            self.connection = sqlite3.connect(
+                db_name, timeout=self.retry_policy.busy_timeout_ms / 1000,
+                check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE
+            )
+            self.cursor = self.connection.cursor()
+            # Ссылки между таблицами проверяются (по умолчанию в SQLite выключено)
+            self.cursor.execute("PRAGMA foreign_keys = ON")
+        # Профиль запросов реестра: имя -> [число вызовов, суммарное время]
+        self.statement_stats = defaultdict(lambda: [0, 0.0])
+        self.auth_cache = AuthCache()
+        self.query_cache = QueryCache(self.connection)
+        with STARTUP.phase("Схема БД"):
+            # Быстрый запуск: схема актуальна - CREATE и проверки пропускаются
+            version = self.get_schema_version()
+            if not (fast_start and version == SCHEMA_VERSION):
+                self.init_database()
+                self.migrate(version)
+                self.set_schema_version(SCHEMA_VERSION)
+        self.configure_locking()
+        # Сессии ведёт только основная база (home); у баз кампусов их нет
+        self.sessions = SessionManager(
+            self.get_secret_key(), path=session_path(db_name)
+        ) if home else None
+        # Прежние версии сохраняли токен рядом с общей базой
+        legacy_session = os.path.splitext(db_name)[0] + ".session"
+        if home and os.path.exists(legacy_session):
+            os.remove(legacy_session)
+        self.audit = AuditLog(self.connection)
+        self.snapshots = SnapshotManager(db_name)
+        with STARTUP.phase("Расписание обслуживания"):
+            self.sync_maintenance()
+        print("База данных инициализирована")
+    
+    def init_database(self):
+        """Создание таблиц и тестовых данных"""
+        # Таблица пользователей
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                full_name TEXT NOT NULL,
+                role TEXT NOT NULL,
+                password TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
+                deleted_at TIMESTAMP
+            )
+        """)
+        
+        # Таблица оборудования
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS equipment (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE,
+                description TEXT,
+                status TEXT DEFAULT 'available',
+                version INTEGER NOT NULL DEFAULT 0,
+                deleted_at TIMESTAMP
+            )
+        """)
+        
+        # Таблица заявок
+        self.cursor.execute(f"CREATE TABLE IF NOT EXISTS requests {REFERENCING_TABLES['requests']}")
+        
+        # Версии строк: столбец в старых базах и увеличение при любом изменении
+        self.create_row_versions()
+        
+        # Удалённые пользователи и оборудование с историей заявок остаются с отметкой
+        self.ensure_column('users', 'deleted_at', "TIMESTAMP")
+        self.ensure_column('equipment', 'deleted_at', "TIMESTAMP")
+        
+        # Индексы для фильтрации заявок
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_requests_status_date ON requests (status, desired_date)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_requests_date ON requests (desired_date)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_requests_equipment ON requests (equipment_id, desired_date)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_requests_teacher ON requests (teacher_id, desired_date)")
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_equipment_status ON equipment (status)")
+        
+        # Ежедневные агрегаты заявок (обновляются триггерами)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS request_daily_stats (
+                day TEXT NOT NULL,
+                equipment_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, equipment_id, status)
+            ) WITHOUT ROWID
+        """)
+        self.cursor.executescript("""
+            CREATE TRIGGER IF NOT EXISTS trg_requests_rollup_insert
+            AFTER INSERT ON requests
+            BEGIN
+                INSERT INTO request_daily_stats (day, equipment_id, status, count)
+                VALUES (NEW.desired_date, NEW.equipment_id, COALESCE(NEW.status, ''), 1)
+                ON CONFLICT (day, equipment_id, status) DO UPDATE SET count = count + 1;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS trg_requests_rollup_delete
+            AFTER DELETE ON requests
+            BEGIN
+                UPDATE request_daily_stats SET count = count - 1
+                WHERE day = OLD.desired_date AND equipment_id = OLD.equipment_id
+                  AND status = COALESCE(OLD.status, '');
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS trg_requests_rollup_update
+            AFTER UPDATE OF status, desired_date, equipment_id ON requests
+            WHEN OLD.status IS NOT NEW.status
+              OR OLD.desired_date IS NOT NEW.desired_date
+              OR OLD.equipment_id IS NOT NEW.equipment_id
+            BEGIN
+                UPDATE request_daily_stats SET count = count - 1
+                WHERE day = OLD.desired_date AND equipment_id = OLD.equipment_id
+                  AND status = COALESCE(OLD.status, '');
+                INSERT INTO request_daily_stats (day, equipment_id, status, count)
+                VALUES (NEW.desired_date, NEW.equipment_id, COALESCE(NEW.status, ''), 1)
+                ON CONFLICT (day, equipment_id, status) DO UPDATE SET count = count + 1;
+            END;
+        """)
+        
+        # Счётчики квот: активные заявки преподавателя и группы за месяц
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS quota_usage (
+                scope TEXT NOT NULL,
+                key TEXT NOT NULL,
+                period TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (scope, key, period)
+            ) WITHOUT ROWID
+        """)
+        self.cursor.executescript("""
+            CREATE TRIGGER IF NOT EXISTS trg_requests_quota_insert
+            AFTER INSERT ON requests
+            WHEN NEW.status IN ('pending', 'approved')
+            BEGIN
+                INSERT INTO quota_usage (scope, key, period, count)
+                VALUES ('teacher', CAST(NEW.teacher_id AS TEXT), substr(NEW.desired_date, 1, 7), 1),
+                       ('group', NEW.student_group, substr(NEW.desired_date, 1, 7), 1)
+                ON CONFLICT (scope, key, period) DO UPDATE SET count = count + 1;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS trg_requests_quota_delete
+            AFTER DELETE ON requests
+            WHEN OLD.status IN ('pending', 'approved')
+            BEGIN
+                UPDATE quota_usage SET count = count - 1
+                WHERE period = substr(OLD.desired_date, 1, 7)
+                  AND ((scope = 'teacher' AND key = CAST(OLD.teacher_id AS TEXT))
+                    OR (scope = 'group' AND key = OLD.student_group));
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS trg_requests_quota_update
+            AFTER UPDATE OF status, desired_date, teacher_id, student_group ON requests
+            BEGIN
+                UPDATE quota_usage SET count = count - 1
+                WHERE OLD.status IN ('pending', 'approved')
+                  AND period = substr(OLD.desired_date, 1, 7)
+                  AND ((scope = 'teacher' AND key = CAST(OLD.teacher_id AS TEXT))
+                    OR (scope = 'group' AND key = OLD.student_group));
+                INSERT INTO quota_usage (scope, key, period, count)
+                SELECT 'teacher', CAST(NEW.teacher_id AS TEXT), substr(NEW.desired_date, 1, 7), 1
+                WHERE NEW.status IN ('pending', 'approved')
+                UNION ALL
+                SELECT 'group', NEW.student_group, substr(NEW.desired_date, 1, 7), 1
+                WHERE NEW.status IN ('pending', 'approved')
+                ON CONFLICT (scope, key, period) DO UPDATE SET count = count + 1;
+            END;
+        """)
+        
+        # Повторяющиеся заявки: одна строка на серию, занятия вычисляются по правилу
+        self.cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS recurring_requests {REFERENCING_TABLES['recurring_requests']}"
+        )
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_recurring_equipment ON recurring_requests "
+            "(equipment_id, time_slot, start_date)"
+        )
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_recurring_teacher ON recurring_requests (teacher_id)"
+        )
+        
+        # Отдельные занятия серии, статус которых отличается от статуса серии
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS recurring_overrides (
+                series_id INTEGER NOT NULL,
+                occurrence_date TEXT NOT NULL,
+                status TEXT NOT NULL,
+                admin_notes TEXT,
+                PRIMARY KEY (series_id, occurrence_date)
+            ) WITHOUT ROWID
+        """)
+        
+        # Лист ожидания на занятые слоты
+        self.cursor.execute(f"CREATE TABLE IF NOT EXISTS waitlist {REFERENCING_TABLES['waitlist']}")
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_waitlist_slot ON waitlist "
+            "(equipment_id, desired_date, time_slot, priority DESC, queued_at)"
+        )
+        
+        # Окна обслуживания оборудования (даты включительно)
+        self.cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS maintenance_windows {REFERENCING_TABLES['maintenance_windows']}"
+        )
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_maintenance_equipment ON maintenance_windows "
+            "(equipment_id, start_date, end_date)"
+        )
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_maintenance_state ON maintenance_windows "
+            "(state, start_date, end_date)"
+        )
+        
+        # Журнал изменений (см. audit.py)
+        create_audit_schema(self.cursor)
+        
+        # Решения правил автоматического рассмотрения
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rule_decisions (
+                request_id INTEGER PRIMARY KEY,
+                rule TEXT NOT NULL,
+                action TEXT NOT NULL,
+                decided_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Таблица настроек (секретный ключ сессий и т.п.)
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+        
+        # Проверяем наличие тестовых данных (базы кампусов не заполняются)
+        self.cursor.execute("SELECT COUNT(*) FROM users")
+        if self.seed and self.cursor.fetchone()[0] == 0:
+            # Тестовые пользователи
+            users = [
+                ('admin', 'Администратор Системы', 'admin', hash_password('admin123')),
+                ('teacher1', 'Петров Иван Сергеевич', 'teacher', hash_password('teacher1')),
+                ('teacher2', 'Сидорова Мария Константиновна', 'teacher', hash_password('teacher2'))
+            ]
+            self.cursor.executemany(
+                "INSERT INTO users (username, full_name, role, password) VALUES (?, ?, ?, ?)",
+                users
+            )
+            
+            # Тестовое оборудование
+            equipment = [
+                ('Микроскоп биологический', 'Увеличение 1000x, с иммерсионным маслом', 'available'),
+                ('Осциллограф цифровой', '4 канала, 100 МГц, с памятью', 'available'),
+                ('3D-принтер Creality', 'Область печати 220x220x250 мм', 'maintenance'),
+                ('Спектрометр USB2000+', 'Диапазон 200-850 нм', 'available'),
+                ('Центрифуга лабораторная', 'Макс. 10000 об/мин, 8 мест', 'in_use'),
+                ('Термостат суховоздушный', 'Темп. диапазон +30..+300°C', 'available')
+            ]
+            self.cursor.executemany(
+                "INSERT INTO equipment (name, description, status) VALUES (?, ?, ?)",
+                equipment
+            )
+            
+            # Тестовые заявки
+            requests = [
+                (2, 1, 'Био-21', 'Лабораторная работа по цитологии', '2024-12-15', '9:00-11:00', 'approved', 'Занятие подтверждено'),
+                (2, 4, 'Физ-22', 'Исследование спектров поглощения', '2024-12-16', '13:00-15:00', 'pending', None),
+                (3, 2, 'Радио-23', 'Изучение сигналов', '2024-12-17', '11:00-13:00', 'rejected', 'Оборудование на калибровке')
+            ]
+            self.cursor.executemany(
+                """INSERT INTO requests 
+                   (teacher_id, equipment_id, student_group, purpose, desired_date, 
+                    desired_time_slot, status, admin_notes) 
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                requests
+            )
+            
+            self.connection.commit()
+            print("Тестовые данные добавлены")
+        
+        self.migrate_plaintext_passwords()
+    
+    def migrate(self, from_version):
+        """Перенос данных при обновлении схемы с версии from_version"""
+        if from_version < 3:
+            self.rebuild_daily_stats()
+        if from_version < 12:
+            # С версии 12 в счётчиках квот учитываются и занятия серий
+            self.rebuild_quota_usage()
+        if from_version < 11 and self.add_foreign_keys():
+            # Индексы и триггеры перестроенных таблиц удалены вместе со старыми
+            self.init_database()
+    
+    def add_foreign_keys(self):
+        """Перестроить таблицы старой базы, созданные без FOREIGN KEY
+        
+        ALTER TABLE не добавляет ссылки, поэтому таблица пересоздаётся по
+        REFERENCING_TABLES и данные копируются (ссылки на время перестройки
+        отключены). Счётчик AUTOINCREMENT сохраняется: у баз кампусов он
+        задаёт диапазон id. Возвращает список перестроенных таблиц.
+        """
+        rebuilt = [table for table in REFERENCING_TABLES
+                   if not self.cursor.execute(f"PRAGMA foreign_key_list({table})").fetchall()]
+        if not rebuilt:
+            return rebuilt
+        self.connection.commit()
+        self.cursor.execute("PRAGMA foreign_keys = OFF")
+        try:
+            for table in rebuilt:
+                columns = ", ".join(row[1] for row in self.cursor.execute(f"PRAGMA table_info({table})"))
+                sequence = self.cursor.execute(
+                    "SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)
+                ).fetchone()
+                self.cursor.execute(f"CREATE TABLE {table}_rebuilt {REFERENCING_TABLES[table]}")
+                self.cursor.execute(
+                    f"INSERT INTO {table}_rebuilt ({columns}) SELECT {columns} FROM {table}"
+                )
+                self.cursor.execute(f"DROP TABLE {table}")
+                self.cursor.execute(f"ALTER TABLE {table}_rebuilt RENAME TO {table}")
+                if sequence:
+                    self.cursor.execute(
+                        "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?",
+                        (sequence[0], table)
+                    )
+                    if not self.cursor.rowcount:
+                        self.cursor.execute(
+                            "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                            (table, sequence[0])
+                        )
+            orphans = self.cursor.execute("PRAGMA foreign_key_check").fetchall()
+            self.connection.commit()
+        finally:
+            self.cursor.execute("PRAGMA foreign_keys = ON")
+        if orphans:
+            print(f"Записей со ссылками на несуществующие строки: {len(orphans)}")
+        return rebuilt
+    
+    def create_row_versions(self):
+        """Номер версии строки в VERSIONED_TABLES
+        
+        Правки из окон сравнивают версию (compare-and-swap) и сами её
+        увеличивают; остальные изменения (автообработка, лист ожидания,
+        обслуживание) увеличивают её триггером.
+        """
+        for table in VERSIONED_TABLES:
+            self.ensure_column(table, 'version', "INTEGER NOT NULL DEFAULT 0")
+            self.cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_version
+                AFTER UPDATE ON {table}
+                WHEN NEW.version = OLD.version
+                BEGIN
+                    UPDATE {table} SET version = OLD.version + 1 WHERE id = NEW.id;
+                END
+            """)
+    
+    def ensure_column(self, table, column, definition, schema="main"):
+        """Добавить столбец в таблицу старой базы, если его ещё нет"""
+        columns = {row[1] for row in self.cursor.execute(f"PRAGMA {schema}.table_info({table})")}
+        if column not in columns:
+            self.cursor.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {column} {definition}")
+    
+    def rebuild_quota_usage(self):
+        """Пересчитать счётчики квот по таблице заявок и сериям"""
+        placeholders = ", ".join("?" * len(QUOTA_STATUSES))
+        self.cursor.execute("DELETE FROM quota_usage")
+        self.cursor.execute(f"""
+            INSERT INTO quota_usage (scope, key, period, count)
+            SELECT 'teacher', CAST(teacher_id AS TEXT), substr(desired_date, 1, 7), COUNT(*)
+            FROM requests WHERE status IN ({placeholders})
+            GROUP BY teacher_id, substr(desired_date, 1, 7)
+            UNION ALL
+            SELECT 'group', student_group, substr(desired_date, 1, 7), COUNT(*)
+            FROM requests WHERE status IN ({placeholders})
+            GROUP BY student_group, substr(desired_date, 1, 7)
+        """, QUOTA_STATUSES * 2)
+        for (series_id,) in self.cursor.execute("SELECT id FROM recurring_requests").fetchall():
+            self.count_series_quota(series_id, 1)
+        self.connection.commit()
+    
+    def rebuild_daily_stats(self):
+        """Пересчитать ежедневные агрегаты по всем заявкам (backfill)
+        
+        Архивные заявки тоже учитываются: агрегаты хранят историю, которой
+        уже нет в основной таблице.
+        """
+        source = self.requests_source(include_archive=self.archive_exists())
+        self.cursor.execute("DELETE FROM request_daily_stats")
+        self.cursor.execute(f"""
+            INSERT INTO request_daily_stats (day, equipment_id, status, count)
+            SELECT desired_date, equipment_id, COALESCE(status, ''), COUNT(*)
+            FROM {source}
+            GROUP BY desired_date, equipment_id, COALESCE(status, '')
+        """)
+        self.connection.commit()
+        self.cursor.execute("SELECT COUNT(*) FROM request_daily_stats")
+        return self.cursor.fetchone()[0]
+    
+    def get_schema_version(self):
+        """Текущая версия схемы из PRAGMA user_version"""
+        return self.cursor.execute("PRAGMA user_version").fetchone()[0]
+    
+    def set_schema_version(self, version):
+        """Записать версию схемы"""
+        self.cursor.execute(f"PRAGMA user_version = {int(version)}")
+        self.connection.commit()
+    
+    def migrate_plaintext_passwords(self):
+        """Заменить открытые пароли старых баз на scrypt-хеши (однократно)"""
+        self.cursor.execute(
+            "SELECT id, password FROM users WHERE password NOT LIKE ?",
+            (SCRYPT_PREFIX + "$%",)
+        )
+        rows = self.cursor.fetchall()
+        if not rows:
+            return
+        self.cursor.executemany(
+            "UPDATE users SET password = ? WHERE id = ?",
+            [(hash_password(password), user_id) for user_id, password in rows]
+        )
+        self.connection.commit()
+        print(f"Пароли переведены на хеши: {len(rows)}")
+    
+    def execute(self, name, params=(), **parts):
+        """Выполнить запрос реестра STATEMENTS по имени
+        
+        parts подставляются в шаблон запроса (условия WHERE, источник заявок).
+        """
+        sql = STATEMENTS[name][0]
+        if parts:
+            sql = sql.format(**parts)
+        started = time.perf_counter()
+        self.cursor.execute(sql, params)
+        self.profile(name, started)
+        return self.cursor
+    
+    def execute_many(self, name, rows):
+        """Выполнить запрос реестра для каждого набора параметров из rows"""
+        started = time.perf_counter()
+        self.cursor.executemany(STATEMENTS[name][0], rows)
+        self.profile(name, started)
+        return self.cursor
+    
+    # Время выполнения учтено в execute(), здесь добавляется только чтение строк
+    def fetch_all(self, name, params=(), **parts):
+        """Все строки запроса реестра (именованными записями, если тип задан)"""
+        record = STATEMENTS[name][1]
+        cursor = self.execute(name, params, **parts)
+        started = time.perf_counter()
+        rows = cursor.fetchall()
+        self.profile(name, started, calls=0)
+        return list(map(record._make, rows)) if record else rows
+    
+    def fetch_one(self, name, params=(), **parts):
+        """Первая строка запроса реестра или None"""
+        record = STATEMENTS[name][1]
+        cursor = self.execute(name, params, **parts)
+        started = time.perf_counter()
+        row = cursor.fetchone()
+        self.profile(name, started, calls=0)
+        return record._make(row) if record and row else row
+    
+    def fetch_value(self, name, params=(), default=None, **parts):
+        """Первое значение первой строки запроса реестра"""
+        cursor = self.execute(name, params, **parts)
+        started = time.perf_counter()
+        row = cursor.fetchone()
+        self.profile(name, started, calls=0)
+        return row[0] if row else default
+    
+    def profile(self, name, started, calls=1):
+        """Учесть вызов запроса в профиле"""
+        stats = self.statement_stats[name]
+        stats[0] += calls
+        stats[1] += time.perf_counter() - started
+    
+    def statement_profile(self):
+        """Профиль запросов: [(имя, вызовов, секунд)] по убыванию времени"""
+        return sorted(((name, calls, total) for name, (calls, total) in self.statement_stats.items()),
+                      key=lambda item: item[2], reverse=True)
+    
+    def snapshot(self, table, row_id):
+        """Текущие значения строки для журнала аудита"""
+        return row_values(self.cursor, table, row_id)
+    
+    def get_history(self, entity, entity_id):
+        """История изменений объекта из журнала аудита"""
+        return self.audit.history(entity, entity_id)
+    
+    def configure_locking(self):
+        """Таймаут блокировки и число повторов из настроек busy_timeout_ms и lock_retries"""
+        self.retry_policy.busy_timeout_ms = int(
+            self.get_setting('busy_timeout_ms', self.retry_policy.busy_timeout_ms)
+        )
+        self.retry_policy.retries = int(self.get_setting('lock_retries', self.retry_policy.retries))
+        self.cursor.execute(f"PRAGMA busy_timeout = {self.retry_policy.busy_timeout_ms}")
+    
+    def rolled_back(self):
+        """Привести состояние в памяти к базе после отката транзакции"""
+        if hasattr(self, 'audit'):
+            self.audit.resync()
+    
+    def lock_statistics(self):
+        """Счётчики блокировок: ошибки, повторы, неудачи, суммарная пауза"""
+        return self.lock_stats.as_dict()
+    
+    def stale(self, statement, record_id, title):
+        """Правка не применилась: вызвать StaleRecordError со свежей записью
+        
+        Ничего не записано, поэтому блокировки не держатся: транзакция
+        откатывается, свежая строка читается одним запросом по id.
+        """
+        self.connection.rollback()
+        current = self.fetch_one(statement, (record_id,))
+        if current is None:
+            raise StaleRecordError(f"{title} #{record_id}: запись удалена другим пользователем")
+        raise StaleRecordError(f"{title} #{record_id}: запись изменена другим пользователем",
+                               current)
+    
+    def get_setting(self, key, default=None):
+        """Прочитать настройку из таблицы settings"""
+        return self.fetch_value('settings.get', (key,), default)
+    
+    @retry_on_lock
+    def set_setting(self, key, value):
+        """Сохранить настройку в таблице settings"""
+        self.execute('settings.set', (key, str(value)))
+        self.connection.commit()
+    
+    def get_secret_key(self):
+        """Получить (или создать) секретный ключ для подписи сессий"""
+        value = self.get_setting('session_secret')
+        if value:
+            return bytes.fromhex(value)
+        secret = secrets.token_bytes(32)
+        self.set_setting('session_secret', secret.hex())
+        return secret
+    
+    def get_credentials(self, username):
+        """Получить id, ФИО, роль и хеш пароля пользователя по логину"""
+        return self.fetch_one('users.credentials', (username,))
+    
+    def check_password(self, username, password, stored):
+        """Проверить пароль по хешу с учетом кэша (можно вызывать из рабочего потока)"""
+        if self.auth_cache.check(username, password, stored):
+            return True
+        if verify_password(password, stored):
+            self.auth_cache.remember(username, password, stored)
+            return True
+        return False
+    
+    def authenticate(self, username, password):
+        """Аутентификация пользователя"""
+        credentials = self.get_credentials(username)
+        if credentials and self.check_password(username, password, credentials.password):
+            return credentials[:3]
+        return None
+    
+    def get_available_equipment(self):
+        """Получить доступное оборудование"""
+        return self.fetch_all('equipment.available')
+    
+    def get_all_equipment(self, filters=None, cached=False):
+        """Получить всё оборудование (filters: status, text)"""
+        filters = filters or {}
+        key = ('equipment', tuple(sorted(filters.items())))
+        if cached:
+            rows = self.query_cache.get(key)
+            if rows is not None:
+                return rows
+        
+        clauses, params = ["deleted_at IS NULL"], []
+        if filters.get('status'):
+            clauses.append("status = ?")
+            params.append(filters['status'])
+        if filters.get('text'):
+            clauses.append("(name LIKE ? ESCAPE '\\' OR description LIKE ? ESCAPE '\\')")
+            params += [like_pattern(filters['text'])] * 2
+        where = " WHERE " + " AND ".join(clauses)
+        
+        rows = self.fetch_all('equipment.list', params, where=where)
+        self.query_cache.put(key, rows)
+        return rows
+    
+    def get_equipment_by_id(self, equipment_id):
+        """Получить оборудование по ID"""
+        return self.fetch_one('equipment.get', (equipment_id,))
+    
+    @retry_on_lock
+    def add_equipment(self, name, description, status):
+        """Добавить новое оборудование"""
+        try:
+            equipment_id = self.execute(
+                'equipment.insert', (name, description, status)
+            ).lastrowid
+            self.audit.record('insert', 'equipment', equipment_id,
+                              after=self.snapshot('equipment', equipment_id))
+            self.connection.commit()
+            return True
+        except sqlite3.IntegrityError:
+            # Неудачная вставка открыла транзакцию - не держать блокировку записи
+            self.connection.rollback()
+            return False
+    
+    @retry_on_lock
+    def update_equipment(self, equipment_id, name, description, status, expected_version=None):
+        """Обновить данные оборудования
+        
+        expected_version - версия, прочитанная окном: если запись с тех пор
+        изменили, вызывается StaleRecordError со свежей записью.
+        """
+        before = self.snapshot('equipment', equipment_id)
+        try:
+            if not self.execute('equipment.update', (name, description, status, equipment_id,
+                                                     expected_version)).rowcount:
+                self.stale('equipment.get', equipment_id, "Оборудование")
+            self.audit.record('update', 'equipment', equipment_id,
+                              before, self.snapshot('equipment', equipment_id))
+            self.connection.commit()
+            return True
+        except sqlite3.IntegrityError:
+            # Неудачная вставка открыла транзакцию - не держать блокировку записи
+            self.connection.rollback()
+            return False
+    
+    @retry_on_lock
+    def delete_equipment(self, equipment_id):
+        """Удалить оборудование
+        
+        Активные заявки (на рассмотрении, одобренные, в листе ожидания)
+        и серии (на рассмотрении, одобренные) запрещают удаление. Оборудование без истории удаляется вместе с
+        окнами обслуживания; если на него ссылаются заявки или серии
+        (FOREIGN KEY) либо архив, оно списывается: отметка deleted_at
+        убирает его из списков, а история и отчёты сохраняют название.
+        """
+        if self.fetch_value('equipment.has_active_requests', (equipment_id, equipment_id)):
+            return False, "На это оборудование есть активные заявки или серии. Сначала рассмотрите их."
+        
+        before = self.snapshot('equipment', equipment_id)
+        if before is None or before['deleted_at']:
+            return False, "Оборудование не найдено"
+        retire = self.has_archived_references('equipment_id', equipment_id)
+        if not retire:
+            try:
+                self.execute('equipment.delete', (equipment_id,))
+            except sqlite3.IntegrityError:
+                # На оборудование ссылаются заявки или серии
+                retire = True
+        if retire:
+            self.execute('equipment.retire', (equipment_id,))
+            self.audit.record('update', 'equipment', equipment_id,
+                              before, self.snapshot('equipment', equipment_id))
+        else:
+            self.audit.record('delete', 'equipment', equipment_id, before)
+        self.connection.commit()
+        if retire:
+            return True, "Оборудование списано: в истории заявок и отчётах оно сохранится"
+        return True, "Оборудование успешно удалено"
+    
+    @retry_on_lock
+    def add_maintenance_window(self, equipment_id, start_date, end_date, reason=""):
+        """Запланировать обслуживание оборудования на даты [start_date, end_date]
+        
+        Возвращает (id окна, заявки на рассмотрении и одобренные, попавшие в окно).
+        """
+        if date.fromisoformat(end_date) < date.fromisoformat(start_date):
+            raise ValueError("Дата окончания раньше даты начала")
+        window_id = self.execute(
+            'maintenance.insert', (equipment_id, start_date, end_date, reason)
+        ).lastrowid
+        self.audit.record('insert', 'maintenance_windows', window_id,
+                          after=self.snapshot('maintenance_windows', window_id))
+        self.connection.commit()
+        self.sync_maintenance()
+        
+        return window_id, self.fetch_all(
+            'maintenance.affected_requests', (equipment_id, start_date, end_date)
+        )
+    
+    @retry_on_lock
+    def delete_maintenance_window(self, window_id):
+        """Отменить окно обслуживания (активное окно возвращает оборудование в работу)"""
+        row = self.fetch_one('maintenance.state', (window_id,))
+        before = self.snapshot('maintenance_windows', window_id)
+        self.execute('maintenance.delete', (window_id,))
+        self.audit.record('delete', 'maintenance_windows', window_id, before)
+        if row and row[1] == 'active':
+            self.release_maintenance([row[0]])
+        self.connection.commit()
+    
+    def get_maintenance_windows(self, equipment_id=None, include_done=False):
+        """Окна обслуживания (по оборудованию), отсортированные по дате начала"""
+        clauses, params = [], []
+        if equipment_id is not None:
+            clauses.append("m.equipment_id = ?")
+            params.append(equipment_id)
+        if not include_done:
+            clauses.append("m.state != 'done'")
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        return self.fetch_all('maintenance.list', params, where=where)
+    
+    def find_maintenance(self, equipment_id, day):
+        """Окно обслуживания оборудования, покрывающее дату, или None"""
+        return self.fetch_one('maintenance.find', (equipment_id, day, day))
+    
+    @retry_on_lock
+    def sync_maintenance(self, today=None):
+        """Применить расписание обслуживания на дату today
+        
+        Просматриваются только окна, у которых сменилось состояние
+        (по индексу state + даты): начавшиеся переводят оборудование в
+        'maintenance', завершившиеся возвращают его в 'available', если
+        других активных окон нет. Возвращает (начато, завершено).
+        """
+        today = today or date.today().isoformat()
+        started = self.fetch_all('maintenance.starting', (today, today))
+        finished = self.fetch_all('maintenance.finished', (today,))
+        if not started and not finished:
+            return 0, 0
+        
+        self.execute_many('maintenance.set_state',
+                          [('active', window_id) for window_id, _ in started])
+        self.execute_many('equipment.start_maintenance',
+                          [(equipment_id,) for _, equipment_id in started])
+        self.execute_many('maintenance.set_state',
+                          [('done', window_id) for window_id, _, _ in finished])
+        for window_id, _ in started:
+            self.audit.record('update', 'maintenance_windows', window_id,
+                              {'state': 'scheduled'}, {'state': 'active'})
+        for window_id, _, state in finished:
+            self.audit.record('update', 'maintenance_windows', window_id,
+                              {'state': state}, {'state': 'done'})
+        # Статус, выставленный вручную, окно, которое так и не началось, не меняет
+        self.release_maintenance(
+            {equipment_id for _, equipment_id, state in finished if state == 'active'}
+        )
+        self.connection.commit()
+        return len(started), len(finished)
+    
+    def release_maintenance(self, equipment_ids):
+        """Вернуть в работу оборудование без активных окон обслуживания"""
+        self.execute_many('equipment.release_maintenance',
+                          [(equipment_id,) for equipment_id in equipment_ids])
+    
+    @retry_on_lock
+    def create_request(self, teacher_id, equipment_id, student_group, purpose, date, time_slot):
+        """Создать новую заявку
+        
+        Превышение квоты в режиме 'reject' вызывает QuotaExceededError,
+        в режиме 'flag' заявка создаётся с пометкой для администратора.
+        Дата в окне обслуживания оборудования вызывает MaintenanceConflictError.
+        """
+        window = self.find_maintenance(equipment_id, date)
+        if window:
+            raise MaintenanceConflictError(
+                f"оборудование на обслуживании с {window.start_date} по {window.end_date}"
+                + (f" ({window.reason})" if window.reason else "")
+            )
+        
+        violations = self.check_quota(teacher_id, student_group, date)
+        notes = None
+        if violations:
+            if self.shards[0].get_setting('quota_mode', 'reject') == 'reject':
+                raise QuotaExceededError("; ".join(violations))
+            notes = "Превышена квота: " + "; ".join(violations)
+        
+        request_id = self.execute(
+            'requests.insert',
+            (teacher_id, equipment_id, student_group, purpose, date, time_slot, notes)
+        ).lastrowid
+        self.audit.record('insert', 'requests', request_id,
+                          after=self.snapshot('requests', request_id))
+        self.connection.commit()
+        return request_id
+    
+    def get_quota_usage(self, scope, key, date):
+        """Число активных заявок преподавателя/группы в месяце даты по всем кампусам"""
+        return sum(shard.local_quota_usage(scope, key, date) for shard in self.shards)
+    
+    def local_quota_usage(self, scope, key, date):
+        """Число активных заявок в этой базе (поиск по ключу)"""
+        return self.fetch_value('quota.get', (scope, str(key), date[:7]), 0)
+    
+    def get_quota_limits(self):
+        """Квоты преподавателя и группы на месяц (настройки основной базы)"""
+        home = self.shards[0]
+        return (int(home.get_setting('quota_teacher', TEACHER_MONTHLY_QUOTA)),
+                int(home.get_setting('quota_group', GROUP_MONTHLY_QUOTA)))
+    
+    def check_quota(self, teacher_id, student_group, date, count=1):
+        """Проверить, помещаются ли ещё count заявок месяца даты в квоты; список нарушений"""
+        teacher_limit, group_limit = self.get_quota_limits()
+        added = f", серия добавит {count}" if count > 1 else ""
+        violations = []
+        used = self.get_quota_usage('teacher', teacher_id, date)
+        if used + count > teacher_limit:
+            violations.append(
+                f"у преподавателя {used} из {teacher_limit} заявок за {date[:7]}{added}"
+            )
+        used = self.get_quota_usage('group', student_group, date)
+        if used + count > group_limit:
+            violations.append(
+                f"у группы {student_group} {used} из {group_limit} заявок за {date[:7]}{added}"
+            )
+        return violations
+    
+    def check_series_quota(self, teacher_id, student_group, dates):
+        """Проверить квоты для занятий серии: каждое занятие считается заявкой своего месяца"""
+        per_month = Counter(day[:7] for day in dates)
+        return [violation for period, count in sorted(per_month.items())
+                for violation in self.check_quota(teacher_id, student_group, period, count)]
+    
+    def count_series_quota(self, series_id, sign):
+        """Прибавить (sign=1) или вычесть (sign=-1) занятия серии в счётчиках квот
+        
+        Триггеры quota_usage видят только таблицу requests, а занятия серии
+        разворачиваются из одной строки, поэтому изменения серии (создание,
+        статус, переопределение занятия) учитываются здесь: счётчики
+        вычитаются до изменения и прибавляются после него.
+        """
+        series = self.fetch_one('series.owner', (series_id,))
+        if not series:
+            return
+        teacher_id, student_group = series
+        per_month = Counter(day[:7] for day, status, _ in self.get_series_occurrences(series_id)
+                            if status in QUOTA_STATUSES)
+        self.execute_many('quota.add', [
+            (scope, key, period, sign * count)
+            for period, count in per_month.items()
+            for scope, key in (('teacher', str(teacher_id)), ('group', student_group))
+        ])
+    
+    @retry_on_lock
+    def create_recurring_request(self, teacher_id, equipment_id, student_group, purpose,
+                                 start_date, end_date, time_slot, interval_days=7):
+        """Создать серию повторяющихся заявок (одна запись, один commit)
+        
+        Даты и шаг проверяются до записи (validate_series); даты хранятся
+        в виде ГГГГ-ММ-ДД. Занятие в окне обслуживания оборудования вызывает
+        MaintenanceConflictError. Каждое занятие занимает квоту своего месяца:
+        превышение в режиме 'reject' вызывает QuotaExceededError, в режиме
+        'flag' серия создаётся с пометкой для администратора.
+        """
+        dates = validate_series(start_date, end_date, interval_days)
+        start_date, end_date = dates[0], date.fromisoformat(end_date).isoformat()
+        # Как и разовая заявка, занятие не может попасть на обслуживание
+        blocked = sorted(self.maintenance_dates(equipment_id, dates))
+        if blocked:
+            raise MaintenanceConflictError(
+                "оборудование на обслуживании в даты серии: " + ", ".join(blocked)
+            )
+        
+        violations = self.check_series_quota(teacher_id, student_group, dates)
+        notes = None
+        if violations:
+            if self.shards[0].get_setting('quota_mode', 'reject') == 'reject':
+                raise QuotaExceededError("; ".join(violations))
+            notes = "Превышена квота: " + "; ".join(violations)
+        
+        series_id = self.execute('series.insert', (
+            teacher_id, equipment_id, student_group, purpose,
+            start_date, end_date, interval_days, time_slot, notes
+        )).lastrowid
+        self.count_series_quota(series_id, 1)
+        self.audit.record('insert', 'recurring_requests', series_id,
+                          after=self.snapshot('recurring_requests', series_id))
+        self.connection.commit()
+        return series_id
+    
+    def get_all_series(self, teacher_id=None):
+        """Получить серии заявок (всех или одного преподавателя)"""
+        where = "WHERE s.teacher_id = ?" if teacher_id is not None else ""
+        params = (teacher_id,) if teacher_id is not None else ()
+        return self.fetch_all('series.list', params, where=where)
+    
+    def get_series_occurrences(self, series_id):
+        """Занятия серии: [(дата, статус, комментарий)] с учетом переопределений"""
+        series = self.fetch_one('series.schedule', (series_id,))
+        if not series:
+            return []
+        start_date, end_date, interval_days, status, notes = series
+        overrides = {row[0]: row[1:] for row in self.fetch_all('series.overrides', (series_id,))}
+        return [(day, *overrides.get(day, (status, notes)))
+                for day in series_dates(start_date, end_date, interval_days)]
+    
+    def maintenance_dates(self, equipment_id, dates):
+        """Даты из dates, попадающие в окна обслуживания оборудования (один запрос)"""
+        if not dates:
+            return set()
+        windows = self.fetch_all('maintenance.overlapping', (equipment_id, max(dates), min(dates)))
+        return {day for window_start, window_end in windows
+                for day in dates if window_start <= day <= window_end}
+    
+    def find_series_conflicts(self, series_id):
+        """Даты серии, на которые слот уже занят одобренными заявками или сериями
+        либо оборудование на обслуживании
+        
+        Все даты проверяются одним запросом к requests (по индексу оборудования),
+        одним запросом к пересекающимся одобренным сериям и одним - к окнам
+        обслуживания.
+        """
+        series = self.fetch_one('series.slot', (series_id,))
+        if not series:
+            return []
+        equipment_id, time_slot, start_date, end_date, interval_days = series
+        dates = set(series_dates(start_date, end_date, interval_days))
+        
+        conflicts = {row[0] for row in self.fetch_all(
+            'requests.approved_on_dates', (equipment_id, time_slot, json.dumps(sorted(dates)))
+        )}
+        
+        conflicts.update(self.maintenance_dates(equipment_id, dates))
+        
+        others = self.fetch_all('series.approved_overlapping',
+                                (equipment_id, time_slot, series_id, end_date, start_date))
+        for other_id, other_start, other_end, other_interval in others:
+            released = {row[0] for row in self.fetch_all('series.released', (other_id,))}
+            conflicts.update(
+                day for day in series_dates(other_start, other_end, other_interval)
+                if day in dates and day not in released
+            )
+        return sorted(conflicts)
+    
+    @retry_on_lock
+    def update_series_status(self, series_id, status, notes=None):
+        """Изменить статус всей серии одной транзакцией
+        
+        При одобрении занятия, пересекающиеся с занятым слотом, отклоняются
+        по отдельности. Возвращает список таких дат.
+        """
+        conflicts = self.find_series_conflicts(series_id) if status == 'approved' else []
+        before = self.snapshot('recurring_requests', series_id)
+        self.count_series_quota(series_id, -1)
+        self.execute('series.set_status', (status, notes, series_id))
+        self.audit.record('update', 'recurring_requests', series_id,
+                          before, self.snapshot('recurring_requests', series_id))
+        self.execute_many('series.override', [
+            (series_id, day, 'rejected', 'Слот занят или оборудование на обслуживании')
+            for day in conflicts
+        ])
+        self.count_series_quota(series_id, 1)
+        self.connection.commit()
+        return conflicts
+    
+    @retry_on_lock
+    def override_occurrence(self, series_id, occurrence_date, status, notes=None):
+        """Изменить статус одного занятия серии"""
+        self.audit.record('override', 'recurring_requests', series_id, after={
+            'occurrence_date': occurrence_date, 'status': status, 'admin_notes': notes
+        })
+        self.count_series_quota(series_id, -1)
+        self.execute('series.override', (series_id, occurrence_date, status, notes))
+        self.count_series_quota(series_id, 1)
+        self.connection.commit()
+    
+    def get_teacher_requests(self, teacher_id):
+        """Получить заявки преподавателя"""
+        return self.fetch_all('requests.by_teacher', (teacher_id,))
+    
+    def get_all_requests(self, filters=None, cached=False, include_archive=False):
+        """Получить все заявки (для администратора)
+        
+        filters: status, equipment_id, teacher_id, date_from, date_to, text.
+        При cached=True повторный запрос с теми же фильтрами берётся из кэша,
+        include_archive=True добавляет заявки из архива.
+        """
+        filters = filters or {}
+        key = ('requests', include_archive, tuple(sorted(filters.items())))
+        if cached:
+            rows = self.query_cache.get(key)
+            if rows is not None:
+                return rows
+        
+        clauses, params = [], []
+        if filters.get('status'):
+            clauses.append("r.status = ?")
+            params.append(filters['status'])
+        if filters.get('equipment_id'):
+            clauses.append("r.equipment_id = ?")
+            params.append(filters['equipment_id'])
+        if filters.get('teacher_id'):
+            clauses.append("r.teacher_id = ?")
+            params.append(filters['teacher_id'])
+        if filters.get('date_from'):
+            clauses.append("r.desired_date >= ?")
+            params.append(filters['date_from'])
+        if filters.get('date_to'):
+            clauses.append("r.desired_date <= ?")
+            params.append(filters['date_to'])
+        if filters.get('text'):
+            clauses.append("""(r.purpose LIKE ? ESCAPE '\\' OR r.student_group LIKE ? ESCAPE '\\'
+                 OR r.admin_notes LIKE ? ESCAPE '\\' OR u.full_name LIKE ? ESCAPE '\\'
+                 OR e.name LIKE ? ESCAPE '\\')""")
+            params += [like_pattern(filters['text'])] * 5
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        
+        rows = self.fetch_all(
+            'requests.list', params, source=self.requests_source(include_archive), where=where
+        )
+        self.query_cache.put(key, rows)
+        return rows
+    
+    def attach_archive(self):
+        """Подключить файл архива (создаётся при первом обращении)"""
+        if self.archive_path:
+            return
+        self.archive_path = os.path.splitext(self.db_name)[0] + "_archive.db"
+        self.cursor.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS archive.requests (
+                id INTEGER PRIMARY KEY,
+                teacher_id INTEGER NOT NULL,
+                equipment_id INTEGER NOT NULL,
+                student_group TEXT NOT NULL,
+                purpose TEXT NOT NULL,
+                desired_date TEXT NOT NULL,
+                desired_time_slot TEXT NOT NULL,
+                status TEXT,
+                admin_notes TEXT,
+                created_at TIMESTAMP,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.ensure_column('requests', 'version', "INTEGER NOT NULL DEFAULT 0", schema="archive")
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS archive.idx_archive_date ON requests (desired_date)"
+        )
+        # Проверка ссылок при удалении пользователя или оборудования
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS archive.idx_archive_teacher ON requests (teacher_id)"
+        )
+        self.cursor.execute(
+            "CREATE INDEX IF NOT EXISTS archive.idx_archive_equipment ON requests (equipment_id)"
+        )
+        self.connection.commit()
+    
+    def archive_exists(self):
+        """Есть ли файл архива (attach_archive создал бы пустой)"""
+        return bool(self.archive_path) or os.path.exists(
+            os.path.splitext(self.db_name)[0] + "_archive.db"
+        )
+    
+    def requests_source(self, include_archive=False):
+        """SQL-источник заявок для FROM: основная таблица или она же вместе с архивом"""
+        if not include_archive:
+            return "requests"
+        self.attach_archive()
+        return (f"(SELECT {REQUEST_COLUMNS} FROM main.requests "
+                f"UNION ALL SELECT {REQUEST_COLUMNS} FROM archive.requests)")
+    
+    @retry_on_lock
+    def archive_requests(self, older_than_days=180, batch_size=500):
+        """Перенести закрытые заявки старше срока в архив порциями
+        
+        Каждая порция переносится отдельной транзакцией, чтобы не блокировать
+        других клиентов надолго. Ежедневные агрегаты сохраняют архивные заявки.
+        Возвращает число перенесённых заявок.
+        """
+        self.attach_archive()
+        cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime("%Y-%m-%d")
+        moved = 0
+        while True:
+            ids = [row[0] for row in self.fetch_all(
+                'archive.candidates', (*ARCHIVE_STATUSES, cutoff, batch_size)
+            )]
+            if not ids:
+                break
+            
+            id_list = json.dumps(ids)
+            self.execute('archive.copy', (id_list,), columns=REQUEST_COLUMNS)
+            self.execute('archive.keep_daily_stats', (id_list,))
+            self.execute('archive.remove', (id_list,))
+            self.connection.commit()
+            moved += len(ids)
+        return moved
+    
+    @retry_on_lock
+    def update_request_status(self, request_id, status, notes=None, priority=0,
+                              expected_version=None):
+        """Обновить статус заявки
+        
+        'waitlisted' ставит заявку в лист ожидания слота. Если одобренная
+        заявка отклоняется или отменяется, первая заявка из листа ожидания
+        одобряется в той же транзакции; её id возвращается (иначе None).
+        Если заявку изменили после чтения версии expected_version -
+        StaleRecordError со свежей заявкой.
+        """
+        previous = self.fetch_one('requests.slot', (request_id,))
+        before = self.snapshot('requests', request_id)
+        
+        if not self.execute('requests.set_status',
+                            (status, notes, request_id, expected_version)).rowcount:
+            self.stale('requests.get', request_id, "Заявка")
+        self.audit.record('update', 'requests', request_id,
+                          before, self.snapshot('requests', request_id))
+        
+        promoted = None
+        if previous:
+            slot = (previous.equipment_id, previous.desired_date, previous.time_slot)
+            if status == 'waitlisted':
+                self.execute('waitlist.add', (request_id, *slot, priority))
+            elif previous.status == 'waitlisted':
+                self.execute('waitlist.remove', (request_id,))
+            
+            if previous.status == 'approved' and status in RELEASE_STATUSES:
+                promoted = self.promote_waitlist(*slot)
+        
+        self.connection.commit()
+        return promoted
+    
+    def promote_waitlist(self, equipment_id, desired_date, time_slot):
+        """Одобрить первую подходящую заявку из листа ожидания слота (без commit)
+        
+        Кандидат проверяется теми же правилами, что и автоматическое
+        рассмотрение (обслуживание, доступность оборудования, квота
+        преподавателя); неподходящие остаются в очереди.
+        """
+        queue = [PendingRequest(*row) for row in
+                 self.fetch_all('waitlist.queue', (equipment_id, desired_date, time_slot))]
+        candidate = first_approvable(self.connection, queue,
+                                     default_rules(self.get_quota_limits()[0]))
+        if candidate is None:
+            return None
+        request_id = candidate.id
+        self.execute('waitlist.remove', (request_id,))
+        before = self.snapshot('requests', request_id)
+        self.execute('waitlist.promote', (request_id,))
+        self.audit.record('update', 'requests', request_id,
+                          before, self.snapshot('requests', request_id))
+        return request_id
+    
+    @retry_on_lock
+    def auto_process_requests(self, batch_size=200, teacher_quota=None):
+        """Рассмотреть заявки на рассмотрении по правилам (см. approval.py)
+        
+        teacher_quota передаётся, когда кампусы рассматриваются параллельно:
+        настройки основной базы нельзя читать из нескольких потоков сразу.
+        """
+        # Квота преподавателя берётся из настроек, а не из значения по умолчанию
+        if teacher_quota is None:
+            teacher_quota = self.get_quota_limits()[0]
+        rules = default_rules(teacher_quota)
+        return evaluate_pending(self.connection, rules, batch_size=batch_size, audit=self.audit)
+    
+    def get_slot_holder(self, request_id):
+        """id другой одобренной заявки на тот же слот (или None)"""
+        return self.fetch_value('requests.slot_holder', (request_id,))
+    
+    def get_slot_series(self, request_id):
+        """id одобренной серии, занятие которой приходится на слот заявки (или None)"""
+        return self.fetch_value('series.slot_holder', (request_id,))
+    
+    def get_waitlist(self):
+        """Лист ожидания в виде WaitlistView"""
+        return WaitlistView(self.get_waitlist_rows())
+    
+    def get_waitlist_rows(self):
+        """Строки таблицы waitlist"""
+        return self.fetch_all('waitlist.all')
+    
+    def get_all_users(self, exclude_admin=True):
+        """Получить всех пользователей"""
+        return self.fetch_all('users.list', (bool(exclude_admin),))
+    
+    @retry_on_lock
+    def add_user(self, username, full_name, role, password):
+        """Добавить нового пользователя"""
+        try:
+            user_id = self.execute(
+                'users.insert', (username, full_name, role, hash_password(password))
+            ).lastrowid
+            self.audit.record('insert', 'users', user_id, after=self.snapshot('users', user_id))
+            self.connection.commit()
+            return True
+        except sqlite3.IntegrityError:
+            # Неудачная вставка открыла транзакцию - не держать блокировку записи
+            self.connection.rollback()
+            return False
+    
+    @retry_on_lock
+    def update_user(self, user_id, username, full_name, role, password=None,
+                    expected_version=None):
+        """Обновить данные пользователя (StaleRecordError, если версия устарела)"""
+        before = self.snapshot('users', user_id)
+        if not self.execute('users.update', (
+            username, full_name, role, hash_password(password) if password else None, user_id,
+            expected_version
+        )).rowcount:
+            self.stale('users.get', user_id, "Пользователь")
+        after = self.snapshot('users', user_id)
+        if password and after is not None:
+            # Сам хеш в журнал не пишется - только факт смены пароля
+            before['password_changed'], after['password_changed'] = False, True
+        self.audit.record('update', 'users', user_id, before, after)
+        self.connection.commit()
+    
+    @retry_on_lock
+    def delete_user(self, user_id, references=None):
+        """Удалить пользователя
+        
+        Активные заявки и серии запрещают удаление. Пользователь без истории
+        удаляется из таблицы, с историей - помечается deleted_at: войти
+        он больше не может, а его заявки сохраняют ФИО. references -
+        ссылки, уже найденные во всех кампусах (см. user_references).
+        """
+        if references is None:
+            references = self.user_references(user_id)
+        if references == 'active':
+            return False, "У пользователя есть активные заявки или серии. Сначала рассмотрите их."
+        
+        before = self.snapshot('users', user_id)
+        if before is None or before['deleted_at']:
+            return False, "Пользователь не найден"
+        if references == 'history':
+            if self.execute('users.retire', (user_id,)).rowcount:
+                self.audit.record('update', 'users', user_id, before, self.snapshot('users', user_id))
+            self.connection.commit()
+            return True, "Пользователь удален: вход закрыт, его заявки сохранены в истории"
+        if self.execute('users.delete', (user_id,)).rowcount:
+            self.audit.record('delete', 'users', user_id, before)
+        self.connection.commit()
+        return True, "Пользователь успешно удален"
+    
+    def user_references(self, user_id):
+        """Ссылки на пользователя в этой базе: 'active', 'history' или None
+        
+        Ссылку teacher_id на users нельзя объявить внешним ключом (базы
+        кампусов), поэтому она проверяется здесь - по индексам преподавателя.
+        """
+        if self.fetch_value('users.has_active_requests', (user_id, user_id)):
+            return 'active'
+        if (self.fetch_value('users.has_history', (user_id, user_id))
+                or self.has_archived_references('teacher_id', user_id)):
+            return 'history'
+        return None
+    
+    def is_retired_name(self, table, name):
+        """Занято ли имя (логин пользователя, название оборудования) списанной записью
+        
+        Списанная строка сохраняет уникальное имя, чтобы история и отчёты
+        показывали его, поэтому новую запись с таким именем создать нельзя.
+        """
+        return bool(self.fetch_value(f'{table}.retired_name', (name,)))
+    
+    def has_archived_references(self, column, value):
+        """Есть ли в архиве заявки с column = value (файла архива нет - нет и ссылок)"""
+        if not self.archive_exists():
+            return False
+        self.attach_archive()
+        return bool(self.fetch_value('archive.has_references', (value,), column=column))
+    
+    def get_user_by_id(self, user_id):
+        """Получить пользователя по ID"""
+        return self.fetch_one('users.get', (user_id,))
+    
+    def get_equipment_status_stats(self):
+        """Получить статистику по статусам оборудования"""
+        return self.fetch_all('equipment.status_stats')
+    
+    def get_request_status_stats(self):
+        """Получить статистику по статусам заявок (по ежедневным агрегатам)"""
+        return self.fetch_all('requests.status_stats')
+    
+    def get_request_trend(self, period='month', limit=12):
+        """Число заявок по месяцам ('month') или годам ('year') и статусам
+        
+        Возвращает [(период, статус, число)] за последние limit периодов.
+        """
+        return self.fetch_all('requests.trend', (limit,), width=7 if period == 'month' else 4)
+    
+    def get_usage_report(self, equipment_ids=(), first_day=None, last_day=None):
+        """Отчёт о загрузке оборудования за год (с учётом архива)"""
+        columns = RequestColumns.load(
+            self.connection, first_day, last_day, self.requests_source(include_archive=True)
+        )
+        return UtilizationReport(columns, equipment_ids)
+    
+    def campuses(self):
+        """Названия кампусов (одна база - один кампус)"""
+        return [self.get_setting('campus_name', DEFAULT_CAMPUS)]
+    
+    def set_actor(self, user_id):
+        """Пользователь, от имени которого записываются изменения в журнал"""
+        self.audit.actor_id = user_id
+    
+    def backup(self, force=False):
+        """Снять снимок базы; список путей созданных снимков"""
+        path = self.snapshots.take(force=force)
+        return [path] if path else []
+    
+    def attach_home(self, home_path):
+        """Подключить основную базу: пользователи берутся из неё
+        
+        Временное представление users перекрывает пустую таблицу users
+        этой базы (схема temp просматривается первой).
+        """
+        self.cursor.execute("ATTACH DATABASE ? AS home", (home_path,))
+        self.cursor.execute("CREATE TEMP VIEW IF NOT EXISTS users AS SELECT * FROM home.users")
+    
+    def reserve_ids(self, index):
+        """Начать нумерацию записей кампуса index с index * SHARD_ID_RANGE"""
+        for table in SHARDED_TABLES:
+            self.cursor.execute(
+                "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?",
+                (index * SHARD_ID_RANGE, table)
+            )
+            if not self.cursor.rowcount:
+                self.cursor.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                    (table, index * SHARD_ID_RANGE)
+                )
+        self.connection.commit()
+    
+    def close(self):
+        """Закрыть соединение с БД"""
+        self.connection.close()
+
+
+# Кампус основной базы, если кампусы не настроены
+DEFAULT_CAMPUS = "Основной кампус"
+
+# Диапазон id записей на кампус: по id сразу видно, в какой базе запись
+SHARD_ID_RANGE = 10_000_000
+
+# Таблицы, записи которых хранятся в базе кампуса
+SHARDED_TABLES = ('equipment', 'requests', 'recurring_requests', 'maintenance_windows')
+
+
+def request_order(row):
+    """Ключ сортировки заявки, как statements.REQUEST_ORDER в запросе списка заявок"""
+    return REQUEST_STATUS_ORDER.get(row.status, len(REQUEST_STATUS_ORDER) + 1), row.desired_date
+
+
+def shard_path(db_name, index):
+    """Файл базы кампуса index (0 - основная база)"""
+    return db_name if index == 0 else f"{os.path.splitext(db_name)[0]}_campus{index}.db"
+
+
+def open_database(db_name="lab_equipment.db", fast_start=True):
+    """Открыть базу; если настроено несколько кампусов - ShardedDatabase"""
+    home = DatabaseManager(db_name, fast_start)
+    campuses = json.loads(home.get_setting('campuses', '[]'))
+    if len(campuses) < 2:
+        return home
+    return ShardedDatabase(home, campuses, fast_start)
+
+
+def add_campus(home, name):
+    """Добавить кампус: создать его базу и записать в настройки основной базы"""
+    campuses = json.loads(home.get_setting('campuses', '[]')) or home.campuses()
+    if name in campuses:
+        raise ValueError(f"Кампус '{name}' уже существует")
+    campuses.append(name)
+    shard = DatabaseManager(shard_path(home.db_name, len(campuses) - 1), seed=False, home=False)
+    shard.reserve_ids(len(campuses) - 1)
+    shard.close()
+    home.set_setting('campuses', json.dumps(campuses, ensure_ascii=False))
+    return len(campuses) - 1
+
+
+class ShardedDatabase:
+    """Данные кампусов в отдельных файлах SQLite с тем же интерфейсом, что DatabaseManager
+
+    Кампус 0 - основная база: в ней пользователи, сессии и настройки.
+    Оборудование и всё, что к нему относится (заявки, серии, окна
+    обслуживания), хранится в базе своего кампуса; кампус определяется по
+    id записи (id // SHARD_ID_RANGE). Запросы по всем кампусам выполняются
+    параллельно, отсортированные результаты сливаются heapq.merge.
+    """
+    
+    # Методы, которые выполняются в базе кампуса записи: имя -> номер аргумента с id
+    ROUTED = {
+        'get_equipment_by_id': 0, 'update_equipment': 0, 'delete_equipment': 0,
+        'add_maintenance_window': 0, 'find_maintenance': 0, 'delete_maintenance_window': 0,
+        'create_request': 1, 'create_recurring_request': 1,
+        'update_request_status': 0, 'get_slot_holder': 0, 'get_slot_series': 0,
+        'get_series_occurrences': 0, 'find_series_conflicts': 0,
+        'update_series_status': 0, 'override_occurrence': 0,
+    }
+    
+    def __init__(self, home, campuses, fast_start=True):
+        self.home = home
+        self.names = list(campuses)
+        self.shards = [home]
+        for index in range(1, len(campuses)):
+            with STARTUP.phase(f"Кампус {campuses[index]}"):
+                shard = DatabaseManager(shard_path(home.db_name, index), fast_start, seed=False,
+                                        home=False)
+                shard.attach_home(home.db_name)
+                shard.reserve_ids(index)
+            self.shards.append(shard)
+        for shard in self.shards:
+            shard.shards = self.shards
+        self.executor = ThreadPoolExecutor(max_workers=len(self.shards))
+    
+    def __getattr__(self, name):
+        """Методы по id записи - в базу её кампуса, остальное - в основную базу"""
+        if name in self.ROUTED:
+            position = self.ROUTED[name]
+            
+            def routed(*args, **kwargs):
+                return getattr(self.shard_for(args[position]), name)(*args, **kwargs)
+            return routed
+        return getattr(self.home, name)
+    
+    def shard_for(self, record_id):
+        """База кампуса, которому принадлежит запись"""
+        return self.shards[int(record_id) // SHARD_ID_RANGE]
+    
+    def fan_out(self, call):
+        """Выполнить call(база) во всех кампусах параллельно; результаты по кампусам"""
+        return list(self.executor.map(call, self.shards))
+    
+    def campuses(self):
+        return list(self.names)
+    
+    def add_equipment(self, name, description, status, campus=None):
+        """Добавить оборудование в базу кампуса (по умолчанию - основного)"""
+        index = self.names.index(campus) if campus else 0
+        return self.shards[index].add_equipment(name, description, status)
+    
+    def get_all_equipment(self, filters=None, cached=False):
+        return list(heapq.merge(
+            *self.fan_out(lambda shard: shard.get_all_equipment(filters, cached)),
+            key=lambda row: row.name
+        ))
+    
+    def get_available_equipment(self):
+        return list(heapq.merge(
+            *self.fan_out(lambda shard: shard.get_available_equipment()), key=lambda row: row.name
+        ))
+    
+    def get_all_requests(self, filters=None, cached=False, include_archive=False):
+        return list(heapq.merge(
+            *self.fan_out(lambda shard: shard.get_all_requests(filters, cached, include_archive)),
+            key=request_order
+        ))
+    
+    def get_teacher_requests(self, teacher_id):
+        return list(heapq.merge(
+            *self.fan_out(lambda shard: shard.get_teacher_requests(teacher_id)),
+            key=lambda row: row.desired_date, reverse=True
+        ))
+    
+    def get_all_series(self, teacher_id=None):
+        return list(heapq.merge(
+            *self.fan_out(lambda shard: shard.get_all_series(teacher_id)),
+            key=lambda row: (1 if row.status == 'pending' else 2, row.start_date)
+        ))
+    
+    def get_maintenance_windows(self, equipment_id=None, include_done=False):
+        if equipment_id is not None:
+            return self.shard_for(equipment_id).get_maintenance_windows(equipment_id, include_done)
+        return list(heapq.merge(
+            *self.fan_out(lambda shard: shard.get_maintenance_windows(None, include_done)),
+            key=lambda row: row.start_date
+        ))
+    
+    def get_waitlist(self):
+        return WaitlistView(
+            row for rows in self.fan_out(lambda shard: shard.get_waitlist_rows()) for row in rows
+        )
+    
+    def get_history(self, entity, entity_id):
+        if entity == 'users':
+            return self.home.get_history(entity, entity_id)
+        return self.shard_for(entity_id).get_history(entity, entity_id)
+    
+    def sum_counts(self, call):
+        """Сложить [(ключ, число)] из всех кампусов, сохранив порядок ключей"""
+        totals = Counter()
+        for rows in self.fan_out(call):
+            for key, count in rows:
+                totals[key] += count
+        return list(totals.items())
+    
+    def get_equipment_status_stats(self):
+        return self.sum_counts(lambda shard: shard.get_equipment_status_stats())
+    
+    def get_request_status_stats(self):
+        return self.sum_counts(lambda shard: shard.get_request_status_stats())
+    
+    def get_request_trend(self, period='month', limit=12):
+        totals = self.sum_counts(lambda shard: [
+            ((row_period, status), count)
+            for row_period, status, count in shard.get_request_trend(period, limit)
+        ])
+        periods = sorted({row_period for (row_period, _), _ in totals})[-limit:]
+        return sorted((row_period, status, count) for (row_period, status), count in totals
+                      if row_period in periods)
+    
+    def get_usage_report(self, equipment_ids=(), first_day=None, last_day=None):
+        """Отчёт о загрузке по всем кампусам за общий период"""
+        if last_day is None:
+            latest = [day for day in self.fan_out(lambda shard: RequestColumns.latest_day(
+                shard.connection, shard.requests_source(include_archive=True))) if day]
+            last_day = max(latest) if latest else date.today()
+        first_day = first_day or last_day - timedelta(days=364)
+        parts = self.fan_out(lambda shard: RequestColumns.load(
+            shard.connection, first_day, last_day, shard.requests_source(include_archive=True)
+        ))
+        return UtilizationReport(RequestColumns.concat(parts, first_day, last_day), equipment_ids)
+    
+    def auto_process_requests(self, batch_size=200):
+        teacher_quota = self.home.get_quota_limits()[0]
+        return sum(self.fan_out(
+            lambda shard: shard.auto_process_requests(batch_size, teacher_quota)
+        ), Counter())
+    
+    def archive_requests(self, older_than_days=180, batch_size=500):
+        return sum(self.fan_out(lambda shard: shard.archive_requests(older_than_days, batch_size)))
+    
+    def rebuild_daily_stats(self):
+        return sum(self.fan_out(lambda shard: shard.rebuild_daily_stats()))
+    
+    def sync_maintenance(self, today=None):
+        results = self.fan_out(lambda shard: shard.sync_maintenance(today))
+        return tuple(map(sum, zip(*results)))
+    
+    def delete_user(self, user_id):
+        """Удалить пользователя с учётом его заявок во всех кампусах"""
+        found = set(self.fan_out(lambda shard: shard.user_references(user_id)))
+        references = 'active' if 'active' in found else 'history' if 'history' in found else None
+        return self.home.delete_user(user_id, references)
+    
+    def is_retired_name(self, table, name):
+        """Пользователи хранятся в основной базе, оборудование - во всех кампусах"""
+        if table != 'equipment':
+            return self.home.is_retired_name(table, name)
+        return any(self.fan_out(lambda shard: shard.is_retired_name(table, name)))
+    
+    def statement_profile(self):
+        """Профиль запросов, сложенный по всем кампусам"""
+        totals = defaultdict(lambda: [0, 0.0])
+        for shard in self.shards:
+            for name, calls, seconds in shard.statement_profile():
+                totals[name][0] += calls
+                totals[name][1] += seconds
+        return sorted(((name, calls, seconds) for name, (calls, seconds) in totals.items()),
+                      key=lambda item: item[2], reverse=True)
+    
+    def lock_statistics(self):
+        """Счётчики блокировок, сложенные по всем кампусам"""
+        totals = Counter()
+        for shard in self.shards:
+            totals.update(shard.lock_statistics())
+        return dict(totals)
+    
+    def set_actor(self, user_id):
+        for shard in self.shards:
+            shard.set_actor(user_id)
+    
+    def backup(self, force=False):
+        """Один снимок основной базы вместе с базами кампусов и архивами"""
+        return self.home.backup(force)
+    
+    def close(self):
+        self.executor.shutdown()
+        for shard in self.shards:
+            shard.close()
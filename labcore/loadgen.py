@@ -0,0 +1,340 @@
+"""
+Нагрузочный тест слоя данных (день регистрации)
+
+Сотни преподавателей подают заявки (create_request) и смотрят свои
+заявки, а администраторы листают общий список (get_all_requests) и
+меняют статусы (update_request_status). Каждый клиент - отдельный поток
+со своим DatabaseManager, как отдельное окно приложения; клиенты можно
+разнести по нескольким процессам. В конце печатаются пропускная
+способность, перцентили задержек, число ошибок 'database is locked' и
+повторов (и самого клиента, и слоя данных, см. retry.py) - для сравнения
+режимов хранения (journal_mode, synchronous, busy_timeout) на одних и
+тех же числах.
+
+Запуск из корня репозитория:
+    python -m labcore.loadgen --teachers 200 --admins 5 --duration 30 --journal-mode wal
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from .database import DatabaseManager, MaintenanceConflictError, QuotaExceededError, hash_password
+from .retry import BUSY_TIMEOUT_MS, LOCK_RETRIES, is_locked
+
+# Операции: имя -> роль клиента, который её выполняет
+OPERATIONS = {
+    'create': 'teacher',
+    'my_requests': 'teacher',
+    'list': 'admin',
+    'update': 'admin',
+}
+
+DEFAULT_MIX = "create=70,my_requests=30,list=40,update=60"
+
+TIME_SLOTS = ('9:00-11:00', '11:00-13:00', '13:00-15:00', '15:00-17:00')
+NEW_STATUSES = ('approved', 'rejected', 'completed')
+
+
+def parse_mix(text):
+    """'create=70,list=30' -> {операция: вес}"""
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"Неизвестная операция: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values, share):
+    """Перцентиль отсортированного списка (share от 0 до 1)"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+class Stats:
+    """Счётчики и задержки по операциям одного процесса"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.counters = defaultdict(lambda: defaultdict(int))
+        # Счётчики блокировок слоя данных (LockStats всех клиентов)
+        self.layer = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def add(self, name, seconds, **counters):
+        with self.lock:
+            if seconds is not None:
+                self.latencies[name].append(seconds)
+            for key, value in counters.items():
+                self.counters[name][key] += value
+
+    def add_layer(self, lock_statistics):
+        with self.lock:
+            for key, value in lock_statistics.items():
+                self.layer[key] += value
+
+    def export(self):
+        """Данные для передачи из процесса (без блокировки и defaultdict)"""
+        return ({name: list(values) for name, values in self.latencies.items()},
+                {name: dict(values) for name, values in self.counters.items()},
+                dict(self.layer))
+
+
+def prepare(path, teachers, equipment, quota_mode, journal_mode, busy_timeout, lock_retries):
+    """Создать базу теста: преподаватели load_teacherN и оборудование load_eqN"""
+    db = DatabaseManager(path)
+    db.connection.execute(f"PRAGMA journal_mode = {journal_mode}")
+    # Один хеш на всех: пароли в тесте не проверяются, а scrypt на каждого - секунды
+    password = hash_password("load")
+    db.cursor.executemany(
+        "INSERT OR IGNORE INTO users (username, full_name, role, password) VALUES (?, ?, 'teacher', ?)",
+        [(f"load_teacher{i}", f"Нагрузочный преподаватель {i}", password) for i in range(teachers)]
+    )
+    db.cursor.executemany(
+        "INSERT OR IGNORE INTO equipment (name, description, status) VALUES (?, ?, 'available')",
+        [(f"load_eq{i}", "Оборудование нагрузочного теста") for i in range(equipment)]
+    )
+    db.connection.commit()
+    db.set_setting('quota_mode', quota_mode)
+    # Таймаут и повторы слоя данных читаются клиентами из настроек при открытии
+    db.set_setting('busy_timeout_ms', busy_timeout)
+    db.set_setting('lock_retries', lock_retries)
+    teacher_ids = [row[0] for row in db.cursor.execute(
+        "SELECT id FROM users WHERE username LIKE 'load_teacher%' ORDER BY id LIMIT ?", (teachers,))]
+    equipment_ids = [row[0] for row in db.cursor.execute(
+        "SELECT id FROM equipment WHERE status = 'available' ORDER BY id")]
+    admin_id = db.cursor.execute("SELECT id FROM users WHERE role = 'admin' LIMIT 1").fetchone()[0]
+    db.close()
+    return teacher_ids, equipment_ids, admin_id
+
+
+class Client(threading.Thread):
+    """Один преподаватель или администратор со своим соединением"""
+
+    def __init__(self, options, role, user_id, equipment_ids, deadline, stats, seed):
+        super().__init__(daemon=True)
+        self.options = options
+        self.role = role
+        self.user_id = user_id
+        self.equipment_ids = equipment_ids
+        self.deadline = deadline
+        self.stats = stats
+        self.random = random.Random(seed)
+        mix = {name: weight for name, weight in options['mix'].items() if OPERATIONS[name] == role}
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.request_ids = []
+        self.db = None
+
+    def open(self):
+        """Открыть базу как окно приложения (со своим соединением)"""
+        db = self.call('open', lambda: DatabaseManager(self.options['path'], seed=False))
+        if db is None:
+            return None
+        db.connection.execute(f"PRAGMA synchronous = {self.options['synchronous']}")
+        db.set_actor(self.user_id)
+        return db
+
+    def call(self, name, operation):
+        """Выполнить операцию с повторами при блокировке; результат или None"""
+        retries = self.options['retries']
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                result = operation()
+            except (QuotaExceededError, MaintenanceConflictError):
+                self.stats.add(name, time.perf_counter() - start, ok=1, refused=1)
+                return None
+            except sqlite3.OperationalError as e:
+                # Незавершённая транзакция не должна держать блокировку до повтора
+                if self.db is not None and self.db.connection.in_transaction:
+                    self.db.connection.rollback()
+                if not is_locked(e):
+                    self.stats.add(name, None, failed=1)
+                    return None
+                self.stats.add(name, None, locked=1)
+                if attempt == retries:
+                    self.stats.add(name, None, failed=1)
+                    return None
+                self.stats.add(name, None, retries=1)
+                continue
+            self.stats.add(name, time.perf_counter() - start, ok=1)
+            return result
+        return None
+
+    def run(self):
+        if not self.names:
+            return
+        db = self.db = self.open()
+        if db is None:
+            return
+        try:
+            while time.time() < self.deadline:
+                name = self.random.choices(self.names, self.weights)[0]
+                getattr(self, "op_" + name)(db)
+                if self.options['think']:
+                    time.sleep(self.random.uniform(0, 2 * self.options['think']))
+        finally:
+            self.stats.add_layer(db.lock_statistics())
+            db.close()
+
+    def op_create(self, db):
+        day = date.today() + timedelta(days=self.random.randrange(self.options['days']))
+        self.call('create', lambda: db.create_request(
+            self.user_id, self.random.choice(self.equipment_ids),
+            f"Load-{self.random.randrange(50)}", "Нагрузочный тест", day.isoformat(),
+            self.random.choice(TIME_SLOTS)
+        ))
+
+    def op_my_requests(self, db):
+        self.call('my_requests', lambda: db.get_teacher_requests(self.user_id))
+
+    def op_list(self, db):
+        requests = self.call('list', db.get_all_requests)
+        if requests:
+            self.request_ids = [request.id for request in requests[:500]]
+
+    def op_update(self, db):
+        if not self.request_ids:
+            self.request_ids = [row[0] for row in db.cursor.execute(
+                "SELECT id FROM requests ORDER BY id DESC LIMIT 500")]
+        if self.request_ids:
+            self.call('update', lambda: db.update_request_status(
+                self.random.choice(self.request_ids), self.random.choice(NEW_STATUSES),
+                "Нагрузочный тест"
+            ))
+
+
+def run_process(options, clients, deadline):
+    """Запустить клиентов (роль, id) потоками одного процесса; статистика процесса"""
+    stats = Stats()
+    threads = [
+        Client(options, role, user_id, options['equipment_ids'], deadline, stats,
+               seed=hash((os.getpid(), index)))
+        for index, (role, user_id) in enumerate(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.export()
+
+
+def run(options):
+    """Подготовить базу, запустить клиентов и собрать статистику"""
+    teacher_ids, equipment_ids, admin_id = prepare(
+        options['path'], options['teachers'], options['equipment'], options['quota_mode'],
+        options['journal_mode'], options['busy_timeout'], options['lock_retries']
+    )
+    options['equipment_ids'] = equipment_ids
+    clients = ([('teacher', teacher_id) for teacher_id in teacher_ids] +
+               [('admin', admin_id)] * options['admins'])
+    processes = max(1, options['processes'])
+    groups = [clients[index::processes] for index in range(processes)]
+
+    # Срок по time.time(): его видят одинаково все процессы
+    started = time.time()
+    deadline = started + options['duration']
+    if processes == 1:
+        results = [run_process(options, groups[0], deadline)]
+    else:
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(processes) as pool:
+            results = pool.starmap(run_process, [(options, group, deadline) for group in groups])
+    elapsed = time.time() - started
+
+    latencies = defaultdict(list)
+    counters = defaultdict(lambda: defaultdict(int))
+    layer = defaultdict(float)
+    for process_latencies, process_counters, process_layer in results:
+        for key, value in process_layer.items():
+            layer[key] += value
+        for name, values in process_latencies.items():
+            latencies[name].extend(values)
+        for name, values in process_counters.items():
+            for key, value in values.items():
+                counters[name][key] += value
+    return elapsed, latencies, counters, layer
+
+
+def report(options, elapsed, latencies, counters, layer):
+    """Напечатать итоговую таблицу"""
+    print(f"Режим: journal_mode={options['journal_mode']}, synchronous={options['synchronous']}, "
+          f"busy_timeout={options['busy_timeout']} мс, повторов слоя данных: {options['lock_retries']}, "
+          f"процессов: {options['processes']}, "
+          f"преподавателей: {options['teachers']}, администраторов: {options['admins']}")
+    print(f"{'операция':<14}{'успешно':>9}{'оп/с':>9}{'p50 мс':>9}{'p95 мс':>9}"
+          f"{'p99 мс':>9}{'max мс':>9}{'locked':>8}{'повторы':>9}{'отказ':>7}{'ошибки':>8}")
+    total_ok = 0
+    total = defaultdict(int)
+    for name in sorted(set(latencies) | set(counters)):
+        values = sorted(latencies.get(name, []))
+        count = counters[name]
+        total_ok += count.get('ok', 0)
+        for key in ('locked', 'retries', 'refused', 'failed'):
+            total[key] += count.get(key, 0)
+        print(f"{name:<14}{count.get('ok', 0):>9}{count.get('ok', 0) / elapsed:>9.1f}"
+              f"{percentile(values, 0.5) * 1000:>9.1f}{percentile(values, 0.95) * 1000:>9.1f}"
+              f"{percentile(values, 0.99) * 1000:>9.1f}{(values[-1] if values else 0) * 1000:>9.1f}"
+              f"{count.get('locked', 0):>8}{count.get('retries', 0):>9}"
+              f"{count.get('refused', 0):>7}{count.get('failed', 0):>8}")
+    print(f"Всего: {total_ok} операций за {elapsed:.1f} с ({total_ok / elapsed:.1f} оп/с), "
+          f"'database is locked': {total['locked']}, повторов: {total['retries']}, "
+          f"отказов по квоте/обслуживанию: {total['refused']}, ошибок: {total['failed']}")
+    print(f"Слой данных: блокировок {int(layer['locked'])}, повторов {int(layer['retries'])}, "
+          f"не помогло {int(layer['failures'])}, пауза перед повторами {layer['waited']:.2f} с")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест слоя данных LabEquipment Manager")
+    parser.add_argument("--db", default="loadtest.db", help="файл базы теста (не рабочая база!)")
+    parser.add_argument("--teachers", type=int, default=100)
+    parser.add_argument("--admins", type=int, default=3)
+    parser.add_argument("--equipment", type=int, default=30, help="оборудование для заявок")
+    parser.add_argument("--duration", type=float, default=20, help="длительность, с")
+    parser.add_argument("--processes", type=int, default=1, help="процессов (клиенты делятся поровну)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="веса операций, например create=70,list=30")
+    parser.add_argument("--think", type=float, default=0.05, help="средняя пауза между операциями, с")
+    parser.add_argument("--days", type=int, default=120, help="даты заявок: столько дней от сегодня")
+    parser.add_argument("--retries", type=int, default=0,
+                        help="повторов клиента при 'database is locked' (сверх повторов слоя данных)")
+    parser.add_argument("--busy-timeout", type=int, default=BUSY_TIMEOUT_MS, help="busy_timeout, мс")
+    parser.add_argument("--lock-retries", type=int, default=LOCK_RETRIES,
+                        help="повторов метода записи в слое данных")
+    parser.add_argument("--journal-mode", default="delete",
+                        choices=["delete", "truncate", "persist", "wal"])
+    parser.add_argument("--synchronous", default="full", choices=["off", "normal", "full"])
+    parser.add_argument("--quota-mode", default="flag", choices=["flag", "reject"])
+    args = parser.parse_args(argv)
+
+    options = {
+        'path': args.db,
+        'teachers': args.teachers,
+        'admins': args.admins,
+        'equipment': args.equipment,
+        'duration': args.duration,
+        'processes': args.processes,
+        'mix': parse_mix(args.mix),
+        'think': args.think,
+        'days': args.days,
+        'retries': args.retries,
+        'busy_timeout': args.busy_timeout,
+        'lock_retries': args.lock_retries,
+        'journal_mode': args.journal_mode,
+        'synchronous': args.synchronous,
+        'quota_mode': args.quota_mode,
+    }
+    report(options, *run(options))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Подписи и цвета статусов для окон
+
+Словари подписей статусов (и обратные к ним) строятся один раз при
+импорте и общие для всех окон, а не создаются в каждом __init__. Цвета
+строк задаются тегам таблицы один раз при её создании: загрузка данных
+только вставляет строки с тегом-статусом, без повторных tag_configure.
+"""
+
+# Подписи статусов заявок
+REQUEST_STATUS_LABELS = {
+    'pending': 'На рассмотрении',
+    'approved': 'Одобрено',
+    'rejected': 'Отклонено',
+    'completed': 'Завершено',
+    'waitlisted': 'В листе ожидания',
+    'cancelled': 'Отменено'
+}
+
+# Подписи статусов оборудования
+EQUIPMENT_STATUS_LABELS = {
+    'available': 'Доступно',
+    'in_use': 'В использовании',
+    'maintenance': 'На обслуживании'
+}
+
+# Обратные словари: подпись -> статус
+REQUEST_STATUS_BY_LABEL = {label: status for status, label in REQUEST_STATUS_LABELS.items()}
+EQUIPMENT_STATUS_BY_LABEL = {label: status for status, label in EQUIPMENT_STATUS_LABELS.items()}
+
+# Цвет строки таблицы по статусу
+REQUEST_STATUS_COLORS = {
+    'approved': '#d4edda',
+    'rejected': '#f8d7da',
+    'pending': '#fff3cd',
+    'completed': '#e2e3e5',
+    'waitlisted': '#d1ecf1'
+}
+EQUIPMENT_STATUS_COLORS = {
+    'available': '#d4edda',
+    'in_use': '#fff3cd',
+    'maintenance': '#f8d7da'
+}
+
+
+def style_status_tags(tree, colors=REQUEST_STATUS_COLORS):
+    """Настроить теги статусов таблицы (один раз, сразу после её создания)"""
+    for status, background in colors.items():
+        tree.tag_configure(status, background=background)
+    return tree
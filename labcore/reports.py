@@ -0,0 +1,217 @@
+"""
+Отчёты за семестр по истории заявок (HTML для печати)
+
+Отчёт группирует заявки (вместе с архивом) по оборудованию, преподавателю
+или группе. Ключи группировки делятся на части по REPORT_CHUNK, каждая
+часть строится в отдельном процессе пула со своими соединениями только
+для чтения ко всем базам кампусов. Процессы возвращают готовые
+HTML-разделы, которые склеиваются в один документ в порядке ключей.
+ReportJob сообщает прогресс по частям и может быть отменён.
+"""
+import html
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import date, datetime
+
+from .presentation import REQUEST_STATUS_LABELS
+
+# Вид отчёта -> (столбец группировки, заголовок раздела, подпись в списке)
+REPORT_KINDS = {
+    'equipment': ('r.equipment_id', "Оборудование", "По оборудованию"),
+    'teacher': ('r.teacher_id', "Преподаватель", "По преподавателям"),
+    'group': ('r.student_group', "Группа", "По группам"),
+}
+
+# Ключей (разделов) в одной части и число процессов пула
+REPORT_CHUNK = 25
+REPORT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Как часто проверять готовность частей и отмену (с)
+REPORT_POLL = 0.1
+
+STYLE = """
+    body { font-family: Arial, sans-serif; font-size: 11pt; margin: 2em; }
+    h1 { font-size: 16pt; }
+    h2 { font-size: 13pt; margin-top: 2em; border-bottom: 1px solid #999; }
+    table { border-collapse: collapse; width: 100%; }
+    th, td { border: 1px solid #ccc; padding: 3px 6px; text-align: left; }
+    th { background: #eee; }
+    .summary { color: #444; }
+    @media print { h2 { page-break-before: always; } h2:first-of-type { page-break-before: auto; } }
+"""
+
+
+def term_bounds(today=None):
+    """Границы текущего семестра: осенний 1 сентября - 31 января, весенний 1 февраля - 30 июня"""
+    today = today or date.today()
+    if today.month >= 9:
+        return date(today.year, 9, 1).isoformat(), date(today.year + 1, 1, 31).isoformat()
+    if today.month == 1:
+        return date(today.year - 1, 9, 1).isoformat(), date(today.year, 1, 31).isoformat()
+    return date(today.year, 2, 1).isoformat(), date(today.year, 6, 30).isoformat()
+
+
+def open_readonly(path):
+    """Соединение только для чтения и источник заявок (с архивом, если он есть)"""
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    archive = os.path.splitext(path)[0] + "_archive.db"
+    if not os.path.exists(archive):
+        return connection, "requests"
+    connection.execute("ATTACH DATABASE ? AS archive", (f"file:{archive}?mode=ro",))
+    columns = ("teacher_id, equipment_id, student_group, purpose, desired_date, "
+               "desired_time_slot, status")
+    return connection, (f"(SELECT {columns} FROM main.requests "
+                        f"UNION ALL SELECT {columns} FROM archive.requests)")
+
+
+def report_keys(kind, sources, date_from, date_to):
+    """Ключи разделов отчёта с заголовками {ключ: заголовок}, по алфавиту заголовков"""
+    column = REPORT_KINDS[kind][0]
+    titles = {}
+    for path in sources:
+        connection, source = open_readonly(path)
+        try:
+            title = "e.name" if kind == 'equipment' else column
+            titles.update(connection.execute(
+                f"""SELECT DISTINCT {column}, {title}
+                    FROM {source} r JOIN equipment e ON e.id = r.equipment_id
+                    WHERE r.desired_date BETWEEN ? AND ?""",
+                (date_from, date_to)
+            ).fetchall())
+        finally:
+            connection.close()
+    if kind == 'teacher':
+        names = user_names(sources[0])
+        titles = {key: names.get(key, f"#{key}") for key in titles}
+    return dict(sorted(titles.items(), key=lambda item: str(item[1])))
+
+
+def user_names(home_path):
+    """Имена пользователей основной базы {id: ФИО}"""
+    connection = sqlite3.connect(f"file:{home_path}?mode=ro", uri=True)
+    try:
+        return dict(connection.execute("SELECT id, full_name FROM users"))
+    finally:
+        connection.close()
+
+
+def render_part(kind, titles, sources, teacher_names, date_from, date_to):
+    """HTML-разделы отчёта для ключей titles (выполняется в процессе пула)"""
+    column = REPORT_KINDS[kind][0]
+    rows = defaultdict(list)
+    for path in sources:
+        connection, source = open_readonly(path)
+        try:
+            rows_found = connection.execute(
+                f"""SELECT {column}, r.desired_date, r.desired_time_slot, e.name, r.teacher_id,
+                           r.student_group, r.purpose, r.status
+                    FROM {source} r JOIN equipment e ON e.id = r.equipment_id
+                    WHERE {column} IN (SELECT value FROM json_each(?))
+                      AND r.desired_date BETWEEN ? AND ?""",
+                (json.dumps(list(titles)), date_from, date_to)
+            )
+            for key, *row in rows_found:
+                rows[key].append(row)
+        finally:
+            connection.close()
+    return [render_section(kind, title, sorted(rows[key]), teacher_names)
+            for key, title in titles.items() if rows[key]]
+
+
+def render_section(kind, title, rows, teacher_names):
+    """Раздел отчёта: заголовок, итоги по статусам и таблица заявок"""
+    headers = ["Дата", "Время", "Оборудование", "Преподаватель", "Группа", "Цель", "Статус"]
+    # Столбец группировки в таблице раздела не повторяется
+    skip = {'equipment': 2, 'teacher': 3, 'group': 4}[kind]
+    counts = Counter(row[-1] for row in rows)
+    summary = ", ".join(f"{REQUEST_STATUS_LABELS.get(status, status)}: {count}"
+                        for status, count in counts.most_common())
+    lines = [
+        f"<h2>{html.escape(REPORT_KINDS[kind][1])}: {html.escape(str(title))}</h2>",
+        f"<p class=\"summary\">Заявок: {len(rows)} ({html.escape(summary)})</p>",
+        "<table><tr>" + "".join(f"<th>{name}</th>" for index, name in enumerate(headers)
+                                if index != skip) + "</tr>",
+    ]
+    for day, slot, equipment, teacher_id, group, purpose, status in rows:
+        cells = [day, slot, equipment, teacher_names.get(teacher_id, f"#{teacher_id}"), group,
+                 purpose, REQUEST_STATUS_LABELS.get(status, status)]
+        lines.append("<tr>" + "".join(f"<td>{html.escape(str(cell))}</td>"
+                                      for index, cell in enumerate(cells) if index != skip) + "</tr>")
+    lines.append("</table>")
+    return "\n".join(lines)
+
+
+def render_document(kind, date_from, date_to, sections):
+    """Собрать разделы в HTML-документ"""
+    title = f"Отчёт за период {date_from} - {date_to}: {REPORT_KINDS[kind][2].lower()}"
+    return "\n".join([
+        "<!DOCTYPE html>",
+        "<html lang=\"ru\"><head><meta charset=\"utf-8\">",
+        f"<title>{html.escape(title)}</title><style>{STYLE}</style></head><body>",
+        f"<h1>{html.escape(title)}</h1>",
+        f"<p class=\"summary\">Сформирован {datetime.now():%Y-%m-%d %H:%M}, разделов: {len(sections)}</p>",
+        *sections,
+        "</body></html>",
+    ])
+
+
+class ReportJob:
+    """Построение отчёта в пуле процессов с прогрессом и отменой
+
+    run() блокирует вызывающий поток (окно запускает его в фоновом
+    потоке и читает done/total); cancel() можно вызвать из любого потока.
+    """
+
+    def __init__(self, kind, sources, date_from, date_to, workers=REPORT_WORKERS,
+                 chunk=REPORT_CHUNK):
+        if kind not in REPORT_KINDS:
+            raise ValueError(f"Неизвестный вид отчёта: {kind}")
+        self.kind = kind
+        self.sources = list(sources)
+        self.date_from = date_from
+        self.date_to = date_to
+        self.workers = workers
+        self.chunk = chunk
+        self.done = 0
+        self.total = 0
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        """HTML-документ отчёта или None, если построение отменено"""
+        titles = report_keys(self.kind, self.sources, self.date_from, self.date_to)
+        teacher_names = user_names(self.sources[0])
+        keys = list(titles)
+        parts = [{key: titles[key] for key in keys[start:start + self.chunk]}
+                 for start in range(0, len(keys), self.chunk)]
+        self.total = len(parts)
+        results = [None] * len(parts)
+
+        # spawn: дочерние процессы не наследуют потоки и Tk родителя
+        executor = ProcessPoolExecutor(max_workers=self.workers,
+                                       mp_context=multiprocessing.get_context("spawn"))
+        try:
+            pending = {
+                executor.submit(render_part, self.kind, part, self.sources, teacher_names,
+                                self.date_from, self.date_to): index
+                for index, part in enumerate(parts)
+            }
+            while pending:
+                if self.cancelled.is_set():
+                    return None
+                finished, _ = wait(pending, timeout=REPORT_POLL, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    results[pending.pop(future)] = future.result()
+                    self.done += 1
+        finally:
+            executor.shutdown(wait=not self.cancelled.is_set(), cancel_futures=True)
+
+        sections = [section for part in results for section in part]
+        return render_document(self.kind, self.date_from, self.date_to, sections)
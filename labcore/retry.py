@@ -0,0 +1,99 @@
+"""
+Ожидание и повтор при блокировке базы ('database is locked')
+
+Сначала SQLite сам ждёт освобождения блокировки до busy_timeout. Если
+блокировка не освободилась (или SQLite отказал сразу, чтобы избежать
+взаимной блокировки двух пишущих транзакций), метод записи целиком
+повторяется: транзакция откатывается, выдерживается пауза с
+экспоненциальным ростом и случайным разбросом (jitter), чтобы клиенты
+не повторяли одновременно. Повторяется только метод, начавший свою
+транзакцию: вложенный вызов отдаёт ошибку внешнему, и тот повторяет всё.
+"""
+import functools
+import random
+import sqlite3
+import time
+
+# Ожидание блокировки внутри SQLite (мс) и повторы метода записи
+BUSY_TIMEOUT_MS = 2000
+LOCK_RETRIES = 4
+
+# Пауза перед повтором: base * 2^(попытка-1), не больше max, со случайным разбросом (с)
+RETRY_BASE_DELAY = 0.02
+RETRY_MAX_DELAY = 0.5
+
+
+def is_locked(error):
+    """Ошибка блокировки: база занята другим клиентом"""
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+class RetryPolicy:
+    """Таймаут ожидания блокировки и правила повторов"""
+
+    __slots__ = ('busy_timeout_ms', 'retries', 'base_delay', 'max_delay')
+
+    def __init__(self, busy_timeout_ms=BUSY_TIMEOUT_MS, retries=LOCK_RETRIES,
+                 base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.busy_timeout_ms = busy_timeout_ms
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt):
+        """Пауза перед повтором attempt (с 1): полный разброс в пределах экспоненты"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class LockStats:
+    """Счётчики блокировок одного соединения"""
+
+    __slots__ = ('locked', 'retries', 'failures', 'waited')
+
+    def __init__(self):
+        self.locked = 0      # ошибок блокировки после busy_timeout
+        self.retries = 0     # повторов метода
+        self.failures = 0    # повторы не помогли - ошибка ушла вызывающему
+        self.waited = 0.0    # суммарная пауза перед повторами (с)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def retry_on_lock(method):
+    """Декоратор метода записи DatabaseManager: повтор всего метода при блокировке
+
+    Использует self.connection, self.retry_policy, self.lock_stats и
+    self.rolled_back() (восстановить состояние в памяти после отката).
+    Метод, прерванный любой ошибкой, не оставляет открытой транзакции:
+    иначе соединение держало бы блокировку записи, а все следующие методы
+    считали бы транзакцию чужой и не повторялись.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # Транзакция уже открыта вызывающим - откатывать её здесь нельзя
+        if self.connection.in_transaction:
+            return method(self, *args, **kwargs)
+        attempt = 0
+        while True:
+            try:
+                return method(self, *args, **kwargs)
+            except Exception as e:
+                locked = isinstance(e, sqlite3.OperationalError) and is_locked(e)
+                if locked:
+                    self.lock_stats.locked += 1
+                if locked or self.connection.in_transaction:
+                    self.connection.rollback()
+                    self.rolled_back()
+                if not locked:
+                    raise
+                attempt += 1
+                if attempt > self.retry_policy.retries:
+                    self.lock_stats.failures += 1
+                    raise
+                pause = self.retry_policy.delay(attempt)
+                self.lock_stats.retries += 1
+                self.lock_stats.waited += pause
+                time.sleep(pause)
+    return wrapper
@@ -0,0 +1,45 @@
+"""
+Трассировка запуска (--trace-startup или LAB_TRACE_STARTUP=1)
+
+Общий STARTUP отмечает фазы и слоя данных, и окна; точку отсчёта
+выставляет запускаемый скрипт (момент старта процесса).
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+
+class StartupTrace:
+    """Замер длительности фаз запуска (включается --trace-startup или LAB_TRACE_STARTUP=1)"""
+
+    def __init__(self, enabled=False, origin=None):
+        self.enabled = enabled
+        self.origin = origin if origin is not None else time.perf_counter()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        """Замерить фазу запуска"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, start - self.origin, time.perf_counter() - start))
+
+    def mark(self, name):
+        """Отметить момент времени без длительности"""
+        self.phases.append((name, time.perf_counter() - self.origin, 0.0))
+
+    def report(self):
+        """Вывести трассировку в консоль"""
+        if not self.enabled:
+            return
+        print("--- Трассировка запуска ---")
+        for name, offset, duration in self.phases:
+            print(f"{offset * 1000:8.1f} мс  {name:<32} {duration * 1000:8.1f} мс")
+
+
+STARTUP = StartupTrace(
+    enabled="--trace-startup" in sys.argv or os.environ.get("LAB_TRACE_STARTUP") == "1"
+)
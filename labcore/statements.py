@@ -0,0 +1,478 @@
+"""
+Реестр SQL-запросов DatabaseManager
+
+У каждого запроса постоянное имя: по нему ведётся профилирование
+(число вызовов и время), а текст запроса один и тот же при каждом вызове,
+поэтому подготовленное выражение берётся из кэша соединения. Запросы с
+переменной частью (фильтры, источник заявок) - шаблоны с полями {where}
+и {source}. Строки результатов возвращаются именованными кортежами:
+row.status вместо row[7], позиционный доступ и распаковка по-прежнему
+работают. Заявки и оборудование - компактные записи с __slots__ и
+общими (interned) строками статусов: поля читаются по имени, распаковка
+и перебор работают как у кортежа, а индекс (row[0]) - нет. display()
+даёт значения строки Treeview с подписью статуса без промежуточных списков.
+"""
+import sys
+from collections import namedtuple
+
+# Размер кэша подготовленных выражений соединения (в sqlite3 по умолчанию 128)
+STATEMENT_CACHE_SIZE = 512
+
+Credentials = namedtuple('Credentials', 'id full_name role password')
+User = namedtuple('User', 'id username full_name role version')
+
+
+class Record:
+    """Строка результата с __slots__: поля по имени, распаковка как у кортежа"""
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+        # Статусов немного - одна копия строки на все записи (статус может быть NULL)
+        if self.status is not None:
+            self.status = sys.intern(self.status)
+
+    @classmethod
+    def _make(cls, row):
+        return cls(*row)
+
+    def __iter__(self):
+        return map(self.__getattribute__, self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def display(self, status_label):
+        """Значения для Treeview: поля записи, статус заменён подписью"""
+        return tuple(status_label if name == 'status' else getattr(self, name)
+                     for name in self.__slots__)
+
+
+# Версия строки - последнее поле: в Treeview она лишнее значение сверх столбцов,
+# не отображается, но возвращается item()['values'] для правки с проверкой версии
+class Equipment(Record):
+    __slots__ = ('id', 'name', 'description', 'status', 'version')
+
+
+class Request(Record):
+    __slots__ = ('id', 'teacher_name', 'equipment_name', 'student_group', 'purpose',
+                 'desired_date', 'time_slot', 'status', 'admin_notes', 'version')
+
+
+class TeacherRequest(Record):
+    __slots__ = ('id', 'equipment_name', 'student_group', 'purpose', 'desired_date',
+                 'time_slot', 'status', 'admin_notes')
+
+
+AvailableEquipment = namedtuple('AvailableEquipment', 'id name description')
+RequestSlot = namedtuple('RequestSlot', 'status equipment_id desired_date time_slot')
+Series = namedtuple(
+    'Series',
+    'id teacher_name equipment_name student_group purpose start_date end_date '
+    'interval_days time_slot status admin_notes'
+)
+MaintenanceWindow = namedtuple('MaintenanceWindow', 'id equipment_name start_date end_date reason state')
+MaintenanceSpan = namedtuple('MaintenanceSpan', 'id start_date end_date reason')
+WaitlistEntry = namedtuple(
+    'WaitlistEntry', 'request_id equipment_id desired_date time_slot priority queued_at'
+)
+StatusCount = namedtuple('StatusCount', 'status count')
+
+# Порядок статусов в списке заявок администратора (прочие статусы - в конце)
+REQUEST_STATUS_ORDER = {'pending': 1, 'approved': 2, 'waitlisted': 3, 'rejected': 4, 'completed': 5}
+REQUEST_ORDER = "CASE r.status {} ELSE {} END, r.desired_date".format(
+    " ".join(f"WHEN '{status}' THEN {rank}" for status, rank in REQUEST_STATUS_ORDER.items()),
+    len(REQUEST_STATUS_ORDER) + 1
+)
+
+# Имя запроса -> (SQL, тип строки результата или None)
+STATEMENTS = {
+    # Настройки
+    'settings.get': ("SELECT value FROM settings WHERE key = ?", None),
+    'settings.set': (
+        "INSERT INTO settings (key, value) VALUES (?, ?) "
+        "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+        None
+    ),
+
+    # Пользователи
+    'users.credentials': (
+        "SELECT id, full_name, role, password FROM users WHERE username = ? AND deleted_at IS NULL",
+        Credentials
+    ),
+    'users.list': (
+        "SELECT id, username, full_name, role, version FROM users "
+        "WHERE (NOT ? OR role != 'admin') AND deleted_at IS NULL ORDER BY full_name",
+        User
+    ),
+    'users.get': (
+        "SELECT id, username, full_name, role, version FROM users "
+        "WHERE id = ? AND deleted_at IS NULL",
+        User
+    ),
+    'users.insert': (
+        "INSERT INTO users (username, full_name, role, password) VALUES (?, ?, ?, ?)", None
+    ),
+    # Правки с версией (compare-and-swap): без версии (NULL) - безусловно
+    'users.update': (
+        "UPDATE users SET username = ?, full_name = ?, role = ?, "
+        "password = COALESCE(?, password), version = version + 1 "
+        "WHERE id = ? AND version = COALESCE(?, version)",
+        None
+    ),
+    # Удаление: без истории - из таблицы, с историей - отметка deleted_at
+    'users.delete': ("DELETE FROM users WHERE id = ? AND role != 'admin'", None),
+    'users.retire': (
+        "UPDATE users SET deleted_at = CURRENT_TIMESTAMP "
+        "WHERE id = ? AND role != 'admin' AND deleted_at IS NULL",
+        None
+    ),
+    # Проверки ссылок - поиск первой строки по индексу, без подсчёта. Удаление
+    # запрещают активные заявки и серии (у серии нет листа ожидания)
+    'users.has_active_requests': (
+        """SELECT EXISTS (SELECT 1 FROM requests
+                          WHERE teacher_id = ? AND status IN ('pending', 'approved', 'waitlisted'))
+               OR EXISTS (SELECT 1 FROM recurring_requests
+                          WHERE teacher_id = ? AND status IN ('pending', 'approved'))""",
+        None
+    ),
+    'users.has_history': (
+        """SELECT EXISTS (SELECT 1 FROM requests WHERE teacher_id = ?)
+               OR EXISTS (SELECT 1 FROM recurring_requests WHERE teacher_id = ?)""",
+        None
+    ),
+    # Списанная запись сохраняет уникальный логин (название у оборудования)
+    'users.retired_name': (
+        "SELECT EXISTS (SELECT 1 FROM users WHERE username = ? AND deleted_at IS NOT NULL)", None
+    ),
+
+    # Оборудование
+    'equipment.available': (
+        "SELECT id, name, description FROM equipment "
+        "WHERE status = 'available' AND deleted_at IS NULL ORDER BY name",
+        AvailableEquipment
+    ),
+    'equipment.list': (
+        "SELECT id, name, description, status, version FROM equipment{where} ORDER BY name",
+        Equipment
+    ),
+    'equipment.get': (
+        "SELECT id, name, description, status, version FROM equipment "
+        "WHERE id = ? AND deleted_at IS NULL",
+        Equipment
+    ),
+    'equipment.insert': (
+        "INSERT INTO equipment (name, description, status) VALUES (?, ?, ?)", None
+    ),
+    'equipment.update': (
+        "UPDATE equipment SET name = ?, description = ?, status = ?, version = version + 1 "
+        "WHERE id = ? AND version = COALESCE(?, version)",
+        None
+    ),
+    'equipment.delete': ("DELETE FROM equipment WHERE id = ?", None),
+    'equipment.retire': (
+        "UPDATE equipment SET deleted_at = CURRENT_TIMESTAMP WHERE id = ? AND deleted_at IS NULL",
+        None
+    ),
+    'equipment.has_active_requests': (
+        """SELECT EXISTS (SELECT 1 FROM requests
+                          WHERE equipment_id = ? AND status IN ('pending', 'approved', 'waitlisted'))
+               OR EXISTS (SELECT 1 FROM recurring_requests
+                          WHERE equipment_id = ? AND status IN ('pending', 'approved'))""",
+        None
+    ),
+    'equipment.retired_name': (
+        "SELECT EXISTS (SELECT 1 FROM equipment WHERE name = ? AND deleted_at IS NOT NULL)", None
+    ),
+    # Расписание обслуживания меняет статус оборудования
+    'equipment.start_maintenance': (
+        "UPDATE equipment SET status = 'maintenance' WHERE id = ?", None
+    ),
+    'equipment.release_maintenance': (
+        """UPDATE equipment SET status = 'available'
+           WHERE id = ? AND status = 'maintenance'
+             AND NOT EXISTS (SELECT 1 FROM maintenance_windows
+                             WHERE equipment_id = equipment.id AND state = 'active')""",
+        None
+    ),
+    'equipment.status_stats': (
+        "SELECT status, COUNT(*) AS count FROM equipment WHERE deleted_at IS NULL GROUP BY status",
+        StatusCount
+    ),
+
+    # Заявки
+    'requests.insert': (
+        """INSERT INTO requests
+           (teacher_id, equipment_id, student_group, purpose, desired_date, desired_time_slot,
+            admin_notes)
+           VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        None
+    ),
+    'requests.list': (
+        f"""SELECT r.id, u.full_name, e.name, r.student_group, r.purpose,
+                   r.desired_date, r.desired_time_slot, r.status, r.admin_notes, r.version
+            FROM {{source}} r
+            JOIN users u ON r.teacher_id = u.id
+            JOIN equipment e ON r.equipment_id = e.id
+            {{where}}
+            ORDER BY {REQUEST_ORDER}""",
+        Request
+    ),
+    'requests.get': (
+        """SELECT r.id, u.full_name, e.name, r.student_group, r.purpose,
+                  r.desired_date, r.desired_time_slot, r.status, r.admin_notes, r.version
+           FROM requests r
+           JOIN users u ON r.teacher_id = u.id
+           JOIN equipment e ON r.equipment_id = e.id
+           WHERE r.id = ?""",
+        Request
+    ),
+    'requests.by_teacher': (
+        """SELECT r.id, e.name, r.student_group, r.purpose, r.desired_date,
+                  r.desired_time_slot, r.status, r.admin_notes
+           FROM requests r
+           JOIN equipment e ON r.equipment_id = e.id
+           WHERE r.teacher_id = ?
+           ORDER BY r.desired_date DESC""",
+        TeacherRequest
+    ),
+    'requests.slot': (
+        "SELECT status, equipment_id, desired_date, desired_time_slot FROM requests WHERE id = ?",
+        RequestSlot
+    ),
+    # Пустой комментарий не затирает прежний
+    'requests.set_status': (
+        "UPDATE requests SET status = ?, admin_notes = COALESCE(NULLIF(?, ''), admin_notes), "
+        "version = version + 1 WHERE id = ? AND version = COALESCE(?, version)",
+        None
+    ),
+    'requests.slot_holder': (
+        """SELECT other.id FROM requests r
+           JOIN requests other
+             ON other.equipment_id = r.equipment_id
+            AND other.desired_date = r.desired_date
+            AND other.desired_time_slot = r.desired_time_slot
+           WHERE r.id = ? AND other.id != r.id AND other.status = 'approved'
+           LIMIT 1""",
+        None
+    ),
+    'requests.status_stats': (
+        """SELECT status, SUM(count) AS count FROM request_daily_stats
+           GROUP BY status HAVING SUM(count) > 0""",
+        StatusCount
+    ),
+    # Последние limit периодов ({width}: 7 - месяц, 4 - год) по ежедневным агрегатам
+    'requests.trend': (
+        """SELECT substr(day, 1, {width}) AS period, status, SUM(count)
+           FROM request_daily_stats
+           WHERE substr(day, 1, {width}) IN (
+               SELECT DISTINCT substr(day, 1, {width}) FROM request_daily_stats
+               WHERE count > 0
+               ORDER BY 1 DESC LIMIT ?
+           )
+           GROUP BY period, status
+           HAVING SUM(count) > 0
+           ORDER BY period""",
+        None
+    ),
+    # Ссылки из архива закрытых заявок ({column}: teacher_id или equipment_id)
+    'archive.has_references': (
+        "SELECT EXISTS (SELECT 1 FROM archive.requests WHERE {column} = ?)", None
+    ),
+    # Перенос порции в архив: закрытые статусы - параметрами, id порции - JSON-массивом
+    'archive.candidates': (
+        """SELECT id FROM main.requests
+           WHERE status IN (?, ?, ?) AND desired_date < ?
+           LIMIT ?""",
+        None
+    ),
+    'archive.copy': (
+        """INSERT INTO archive.requests ({columns})
+           SELECT {columns} FROM main.requests WHERE id IN (SELECT value FROM json_each(?))""",
+        None
+    ),
+    # Компенсация: триггер удаления уменьшит агрегаты, а история должна остаться
+    'archive.keep_daily_stats': (
+        """INSERT INTO request_daily_stats (day, equipment_id, status, count)
+           SELECT desired_date, equipment_id, COALESCE(status, ''), COUNT(*)
+           FROM main.requests WHERE id IN (SELECT value FROM json_each(?))
+           GROUP BY desired_date, equipment_id, COALESCE(status, '')
+           ON CONFLICT (day, equipment_id, status)
+           DO UPDATE SET count = count + excluded.count""",
+        None
+    ),
+    'archive.remove': (
+        "DELETE FROM main.requests WHERE id IN (SELECT value FROM json_each(?))", None
+    ),
+    'quota.get': (
+        "SELECT count FROM quota_usage WHERE scope = ? AND key = ? AND period = ?", None
+    ),
+    'quota.add': (
+        """INSERT INTO quota_usage (scope, key, period, count) VALUES (?, ?, ?, ?)
+           ON CONFLICT (scope, key, period) DO UPDATE SET count = count + excluded.count""",
+        None
+    ),
+    # Одобренные заявки слота в перечисленные даты (JSON-массив)
+    'requests.approved_on_dates': (
+        """SELECT desired_date FROM requests
+           WHERE equipment_id = ? AND desired_time_slot = ? AND status = 'approved'
+             AND desired_date IN (SELECT value FROM json_each(?))""",
+        None
+    ),
+
+    # Серии
+    'series.list': (
+        """SELECT s.id, u.full_name, e.name, s.student_group, s.purpose,
+                  s.start_date, s.end_date, s.interval_days, s.time_slot,
+                  s.status, s.admin_notes
+           FROM recurring_requests s
+           JOIN users u ON s.teacher_id = u.id
+           JOIN equipment e ON s.equipment_id = e.id
+           {where}
+           ORDER BY CASE s.status WHEN 'pending' THEN 1 ELSE 2 END, s.start_date""",
+        Series
+    ),
+    'series.insert': (
+        """INSERT INTO recurring_requests
+           (teacher_id, equipment_id, student_group, purpose,
+            start_date, end_date, interval_days, time_slot, admin_notes)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        None
+    ),
+    'series.schedule': (
+        "SELECT start_date, end_date, interval_days, status, admin_notes "
+        "FROM recurring_requests WHERE id = ?",
+        None
+    ),
+    'series.slot': (
+        "SELECT equipment_id, time_slot, start_date, end_date, interval_days "
+        "FROM recurring_requests WHERE id = ?",
+        None
+    ),
+    'series.owner': (
+        "SELECT teacher_id, student_group FROM recurring_requests WHERE id = ?", None
+    ),
+    'series.set_status': (
+        "UPDATE recurring_requests SET status = ?, admin_notes = COALESCE(?, admin_notes) "
+        "WHERE id = ?",
+        None
+    ),
+    # Другие одобренные серии того же слота, пересекающие период
+    'series.approved_overlapping': (
+        """SELECT id, start_date, end_date, interval_days FROM recurring_requests
+           WHERE equipment_id = ? AND time_slot = ? AND status = 'approved'
+             AND id != ? AND start_date <= ? AND end_date >= ?""",
+        None
+    ),
+    # Занятие серии приходится на дату, если от начала прошло кратное шагу число дней
+    'series.slot_holder': (
+        """SELECT s.id FROM requests r
+           JOIN recurring_requests s
+             ON s.equipment_id = r.equipment_id
+            AND s.time_slot = r.desired_time_slot
+            AND s.start_date <= r.desired_date AND s.end_date >= r.desired_date
+            AND CAST(julianday(r.desired_date) - julianday(s.start_date) AS INTEGER)
+                % s.interval_days = 0
+           WHERE r.id = ? AND s.status = 'approved'
+             AND NOT EXISTS (SELECT 1 FROM recurring_overrides o
+                             WHERE o.series_id = s.id AND o.occurrence_date = r.desired_date
+                               AND o.status != 'approved')
+           LIMIT 1""",
+        None
+    ),
+    'series.overrides': (
+        "SELECT occurrence_date, status, admin_notes FROM recurring_overrides WHERE series_id = ?",
+        None
+    ),
+    # Занятия, освободившие слот (переопределены не в 'approved')
+    'series.released': (
+        "SELECT occurrence_date FROM recurring_overrides "
+        "WHERE series_id = ? AND status != 'approved'",
+        None
+    ),
+    'series.override': (
+        """INSERT INTO recurring_overrides (series_id, occurrence_date, status, admin_notes)
+           VALUES (?, ?, ?, ?)
+           ON CONFLICT (series_id, occurrence_date)
+           DO UPDATE SET status = excluded.status, admin_notes = excluded.admin_notes""",
+        None
+    ),
+
+    # Лист ожидания
+    'waitlist.add': (
+        """INSERT OR IGNORE INTO waitlist
+           (request_id, equipment_id, desired_date, time_slot, priority)
+           VALUES (?, ?, ?, ?, ?)""",
+        None
+    ),
+    'waitlist.remove': ("DELETE FROM waitlist WHERE request_id = ?", None),
+    # Очередь слота в порядке одобрения (поля как у approval.PendingRequest)
+    'waitlist.queue': (
+        """SELECT r.id, r.teacher_id, r.equipment_id, r.desired_date, r.desired_time_slot
+           FROM waitlist w JOIN requests r ON r.id = w.request_id
+           WHERE w.equipment_id = ? AND w.desired_date = ? AND w.time_slot = ?
+           ORDER BY w.priority DESC, w.queued_at, w.request_id""",
+        None
+    ),
+    'waitlist.promote': (
+        "UPDATE requests SET status = 'approved', "
+        "admin_notes = 'Одобрено автоматически из листа ожидания' WHERE id = ?",
+        None
+    ),
+    'waitlist.all': (
+        "SELECT request_id, equipment_id, desired_date, time_slot, priority, queued_at FROM waitlist",
+        WaitlistEntry
+    ),
+
+    # Обслуживание
+    'maintenance.list': (
+        """SELECT m.id, e.name, m.start_date, m.end_date, m.reason, m.state
+           FROM maintenance_windows m
+           JOIN equipment e ON m.equipment_id = e.id{where}
+           ORDER BY m.start_date""",
+        MaintenanceWindow
+    ),
+    'maintenance.find': (
+        """SELECT id, start_date, end_date, reason FROM maintenance_windows
+           WHERE equipment_id = ? AND start_date <= ? AND end_date >= ?
+           LIMIT 1""",
+        MaintenanceSpan
+    ),
+    'maintenance.overlapping': (
+        """SELECT start_date, end_date FROM maintenance_windows
+           WHERE equipment_id = ? AND start_date <= ? AND end_date >= ?""",
+        None
+    ),
+    'maintenance.insert': (
+        "INSERT INTO maintenance_windows (equipment_id, start_date, end_date, reason) "
+        "VALUES (?, ?, ?, ?)",
+        None
+    ),
+    'maintenance.state': (
+        "SELECT equipment_id, state FROM maintenance_windows WHERE id = ?", None
+    ),
+    'maintenance.delete': ("DELETE FROM maintenance_windows WHERE id = ?", None),
+    'maintenance.set_state': ("UPDATE maintenance_windows SET state = ? WHERE id = ?", None),
+    # Смена состояния окон на дату - по индексу state + даты
+    'maintenance.starting': (
+        """SELECT id, equipment_id FROM maintenance_windows
+           WHERE state = 'scheduled' AND start_date <= ? AND end_date >= ?""",
+        None
+    ),
+    'maintenance.finished': (
+        """SELECT id, equipment_id, state FROM maintenance_windows
+           WHERE state IN ('scheduled', 'active') AND end_date < ?""",
+        None
+    ),
+    # Заявки на рассмотрении и одобренные, попавшие в окно
+    'maintenance.affected_requests': (
+        """SELECT id, desired_date, desired_time_slot, status FROM requests
+           WHERE equipment_id = ? AND desired_date BETWEEN ? AND ?
+             AND status IN ('pending', 'approved')
+           ORDER BY desired_date""",
+        None
+    ),
+}
@@ -0,0 +1,71 @@
+"""
+Журнал изменений: упаковка в сегменты и история объекта (labcore/audit.py)
+"""
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from labcore import DatabaseManager  # noqa: E402
+from labcore.audit import AuditLog, create_schema  # noqa: E402
+
+
+@pytest.fixture
+def audit():
+    connection = sqlite3.connect(":memory:")
+    create_schema(connection.cursor())
+    yield AuditLog(connection, batch_size=3)
+    connection.close()
+
+
+def count(audit, table):
+    return audit.cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_records_are_packed_into_segments(audit):
+    for index in range(7):
+        audit.record('update', 'equipment', index % 2 + 1, {'name': index}, {'name': index + 1})
+    assert (count(audit, "audit_segments"), count(audit, "audit_pending")) == (2, 1)
+
+    history = audit.history('equipment', 1)
+    assert [record['after']['name'] for record in history] == [1, 3, 5, 7]
+    assert {(record['entity'], record['id']) for record in history} == {('equipment', 1)}
+    assert [record['after']['name'] for record in audit.history('equipment', 2)] == [2, 4, 6]
+    assert audit.history('requests', 1) == []
+
+
+def test_unchanged_update_is_not_recorded(audit):
+    audit.record('update', 'equipment', 1, {'name': "A", 'status': 'available'},
+                 {'name': "A", 'status': 'available'})
+    audit.record('update', 'equipment', 1, {'name': "A", 'status': 'available'},
+                 {'name': "B", 'status': 'available'})
+    history = audit.history('equipment', 1)
+    assert [(record['before'], record['after']) for record in history] == [({'name': "A"}, {'name': "B"})]
+
+
+def test_segments_are_append_only(audit):
+    for index in range(3):
+        audit.record('insert', 'equipment', index, after={'name': index})
+    for statement in ("UPDATE audit_segments SET count = 0", "DELETE FROM audit_index"):
+        with pytest.raises(sqlite3.IntegrityError, match="append-only"):
+            audit.cursor.execute(statement)
+
+
+def test_equipment_history_after_compaction(tmp_path):
+    db = DatabaseManager(str(tmp_path / "lab_equipment.db"))
+    db.set_actor(1)
+    name = db.get_equipment_by_id(1).name
+    db.update_equipment(1, name, "до упаковки", 'available')
+    db.audit.compact()
+    db.connection.commit()
+    db.update_equipment(1, name, "после упаковки", 'available')
+    history = db.get_history('equipment', 1)
+    db.close()
+
+    assert [record['after'] for record in history[-2:]] == [
+        {'description': "до упаковки"}, {'description': "после упаковки"}
+    ]
+    assert all(record['actor'] == 1 and 'version' not in record['after'] for record in history[-2:])
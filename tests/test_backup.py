@@ -0,0 +1,86 @@
+"""
+Снимки базы и восстановление вместе с архивом и кампусами (labcore/backup.py)
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from labcore import DatabaseManager, add_campus, open_database  # noqa: E402
+from labcore.backup import restore  # noqa: E402
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "lab_equipment.db")
+
+
+def close_old_request(db):
+    """Завершённая заявка старше срока хранения - кандидат в архив"""
+    request_id = db.create_request(2, 1, "Био-21", "Практикум", "2020-01-10", "9:00-11:00")
+    db.cursor.execute("UPDATE requests SET status = 'completed' WHERE id = ?", (request_id,))
+    db.connection.commit()
+    return request_id
+
+
+def test_restore_rolls_back_archive_with_main_database(db_path):
+    db = DatabaseManager(db_path)
+    request_id = close_old_request(db)
+    snapshot = db.backup(force=True)[0]
+    moved = db.archive_requests()
+    assert moved >= 1
+    db.close()
+
+    restore(snapshot, db_path)
+    db = DatabaseManager(db_path)
+    ids = [req.id for req in db.get_all_requests(include_archive=True)]
+    assert ids.count(request_id) == 1 and len(ids) == len(set(ids))
+    assert db.archive_requests() == moved
+    assert [req.id for req in db.get_all_requests(include_archive=True)].count(request_id) == 1
+    db.close()
+    assert os.path.exists(db_path + ".before-restore")
+    assert os.path.exists(db_path[:-3] + "_archive.db.before-restore")
+
+
+def test_snapshots_in_one_second_are_kept_apart(db_path):
+    db = DatabaseManager(db_path)
+    first, second = db.backup(force=True)[0], db.backup(force=True)[0]
+    assert first != second
+    assert db.snapshots.list() == [first, second]
+    # Без изменений плановый снимок не делается
+    assert db.backup() == []
+    close_old_request(db)
+    assert len(db.backup()) == 1
+    db.close()
+
+
+def test_snapshot_covers_campus_databases(db_path):
+    home = DatabaseManager(db_path)
+    add_campus(home, "Северный")
+    home.close()
+    db = open_database(db_path)
+    db.add_equipment("Микроскоп Север", "", 'available', "Северный")
+    snapshot = db.backup(force=True)[0]
+    assert sorted(os.listdir(snapshot)) == ["lab_equipment.db", "lab_equipment_campus1.db"]
+    equipment_id = next(eq.id for eq in db.get_all_equipment() if eq.name == "Микроскоп Север")
+    db.update_equipment(equipment_id, "Микроскоп Север", "после снимка", 'available')
+    db.close()
+
+    restore(snapshot, db_path)
+    db = open_database(db_path)
+    assert db.get_equipment_by_id(equipment_id).description == ""
+    db.close()
+
+
+def test_damaged_snapshot_is_refused(db_path, tmp_path):
+    db = DatabaseManager(db_path)
+    snapshot = db.backup(force=True)[0]
+    db.close()
+    with open(os.path.join(snapshot, "lab_equipment.db"), "r+b") as file:
+        file.seek(100)
+        file.write(b"\xff" * 4000)
+    with pytest.raises(ValueError, match="повреждён"):
+        restore(snapshot, db_path)
+    assert not os.path.exists(db_path + ".before-restore")
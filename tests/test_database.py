@@ -0,0 +1,318 @@
+"""
+Слой данных labcore на временной базе
+"""
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from labcore import (  # noqa: E402
+    DatabaseManager, MaintenanceConflictError, QuotaExceededError, StaleRecordError, validate_series,
+)
+from labcore.database import WaitlistView  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = DatabaseManager(str(tmp_path / "lab_equipment.db"))
+    yield database
+    database.close()
+
+
+def series_count(db):
+    return db.cursor.execute("SELECT COUNT(*) FROM recurring_requests").fetchone()[0]
+
+
+@pytest.mark.parametrize("start, end, interval", [
+    ("2030-13-01", "2030-12-31", 7),
+    ("2030-01-01", "2030-02-30", 7),
+    ("2030-02-01", "2030-01-01", 7),
+    ("2030-01-01", "2030-02-01", 0),
+    ("2030-01-01", "2030-02-01", "7"),
+])
+def test_invalid_series_is_not_saved(db, start, end, interval):
+    with pytest.raises(ValueError):
+        db.create_recurring_request(2, 1, "Био-21", "Практикум", start, end, "9:00-11:00", interval)
+    assert series_count(db) == 0
+
+
+def test_series_dates_are_validated_and_expanded(db):
+    assert validate_series("2030-01-07", "2030-01-28") == [
+        "2030-01-07", "2030-01-14", "2030-01-21", "2030-01-28"
+    ]
+    series_id = db.create_recurring_request(
+        2, 1, "Био-21", "Практикум", "2030-01-07", "2030-01-28", "9:00-11:00"
+    )
+    assert [day for day, _, _ in db.get_series_occurrences(series_id)] == validate_series(
+        "2030-01-07", "2030-01-28"
+    )
+
+
+def test_series_through_maintenance_is_refused(db):
+    db.add_maintenance_window(1, "2030-01-10", "2030-01-16", "Калибровка")
+    with pytest.raises(MaintenanceConflictError, match="2030-01-14"):
+        db.create_recurring_request(
+            2, 1, "Био-21", "Практикум", "2030-01-07", "2030-01-28", "9:00-11:00"
+        )
+    assert series_count(db) == 0
+    # Серия, обходящая окно, создаётся
+    db.create_recurring_request(2, 1, "Био-21", "Практикум", "2030-01-17", "2030-01-31", "9:00-11:00")
+    assert series_count(db) == 1
+
+
+def test_auto_approval_uses_configured_teacher_quota(db):
+    db.set_setting('quota_teacher', 3)
+    db.cursor.execute("DELETE FROM requests")
+    db.rebuild_quota_usage()
+    for day in ("2030-03-04", "2030-03-05", "2030-03-06"):
+        db.create_request(2, 1, "Био-21", "Практикум", day, "9:00-11:00")
+    db.auto_process_requests()
+    approved = [req for req in db.get_teacher_requests(2) if req.status == 'approved']
+    assert len(approved) == 3
+
+    db.set_setting('quota_teacher', 4)
+    db.set_setting('quota_mode', 'flag')
+    db.create_request(2, 1, "Био-21", "Практикум", "2030-03-07", "9:00-11:00")
+    db.create_request(2, 1, "Био-21", "Практикум", "2030-03-08", "9:00-11:00")
+    db.set_setting('quota_teacher', 3)
+    db.auto_process_requests()
+    assert {req.status for req in db.get_teacher_requests(2) if req.desired_date >= "2030-03-07"} == {
+        'pending'
+    }
+
+
+def test_waitlisted_request_frees_quota_within_batch(db):
+    db.cursor.execute("DELETE FROM requests")
+    db.rebuild_quota_usage()
+    holder = db.create_request(3, 1, "Хим-31", "Практикум", "2030-03-04", "9:00-11:00")
+    db.update_request_status(holder, 'approved')
+    waiting = db.create_request(2, 1, "Био-21", "Практикум", "2030-03-04", "9:00-11:00")
+    later = [db.create_request(2, 1, "Био-21", "Практикум", day, "9:00-11:00")
+             for day in ("2030-03-05", "2030-03-06")]
+    db.set_setting('quota_teacher', 2)
+
+    db.auto_process_requests()
+    statuses = {req.id: req.status for req in db.get_teacher_requests(2)}
+    assert statuses == {waiting: 'waitlisted', later[0]: 'approved', later[1]: 'approved'}
+
+
+def test_series_occurrences_count_towards_quota(db):
+    db.set_setting('quota_teacher', 5)
+    db.cursor.execute("DELETE FROM requests")
+    db.rebuild_quota_usage()
+    with pytest.raises(QuotaExceededError, match="2030-01"):
+        db.create_recurring_request(2, 1, "Био-21", "Практикум", "2030-01-01", "2030-01-29", "9:00-11:00",
+                                    interval_days=1)
+    assert series_count(db) == 0
+
+    series_id = db.create_recurring_request(
+        2, 1, "Био-21", "Практикум", "2030-01-07", "2030-01-28", "9:00-11:00"
+    )
+    assert db.get_quota_usage('teacher', 2, "2030-01-01") == 4
+    assert db.get_quota_usage('group', "Био-21", "2030-01-01") == 4
+    db.create_request(2, 2, "Био-21", "Практикум", "2030-01-10", "9:00-11:00")
+    with pytest.raises(QuotaExceededError):
+        db.create_request(2, 3, "Био-21", "Практикум", "2030-01-11", "9:00-11:00")
+
+    db.override_occurrence(series_id, "2030-01-14", 'cancelled')
+    assert db.get_quota_usage('teacher', 2, "2030-01-01") == 4
+    db.update_series_status(series_id, 'rejected')
+    assert db.get_quota_usage('teacher', 2, "2030-01-01") == 1
+    db.rebuild_quota_usage()
+    assert db.get_quota_usage('teacher', 2, "2030-01-01") == 1
+
+
+def test_approved_series_occupies_its_slots(db):
+    db.cursor.execute("DELETE FROM requests")
+    db.rebuild_quota_usage()
+    series_id = db.create_recurring_request(
+        3, 1, "Хим-31", "Практикум", "2030-02-04", "2030-02-25", "9:00-11:00"
+    )
+    db.update_series_status(series_id, 'approved')
+    db.override_occurrence(series_id, "2030-02-18", 'cancelled')
+
+    taken = db.create_request(2, 1, "Био-21", "Практикум", "2030-02-11", "9:00-11:00")
+    released = db.create_request(2, 1, "Био-21", "Практикум", "2030-02-18", "9:00-11:00")
+    between = db.create_request(2, 1, "Био-21", "Практикум", "2030-02-12", "9:00-11:00")
+    assert db.get_slot_series(taken) == series_id
+    assert db.get_slot_series(released) is None
+    assert db.get_slot_series(between) is None
+
+    db.auto_process_requests()
+    statuses = {req.id: req.status for req in db.get_teacher_requests(2)}
+    assert statuses == {taken: 'waitlisted', released: 'approved', between: 'approved'}
+
+
+def test_active_series_blocks_deletion(db):
+    series_id = db.create_recurring_request(
+        3, 5, "Хим-31", "Практикум", "2030-02-04", "2030-02-25", "9:00-11:00"
+    )
+    assert db.user_references(3) == 'active'
+    assert db.delete_user(3)[0] is False
+    assert db.delete_equipment(5)[0] is False
+
+    db.update_series_status(series_id, 'rejected')
+    assert db.delete_user(3)[0] is True
+    assert db.delete_equipment(5)[0] is True
+    # Серия осталась в истории - пользователь списан, логин занят им
+    assert db.add_user("teacher2", "Повтор", 'teacher', "secret") is False
+    assert db.is_retired_name('users', "teacher2")
+
+
+def test_retired_names_are_reported(db):
+    assert db.add_equipment("Спектрометр Тест", "", 'available')
+    equipment_id = db.cursor.execute(
+        "SELECT id FROM equipment WHERE name = 'Спектрометр Тест'"
+    ).fetchone()[0]
+    db.create_request(2, equipment_id, "Био-21", "Практикум", "2030-02-05", "9:00-11:00")
+    db.cursor.execute("UPDATE requests SET status = 'completed' WHERE equipment_id = ?",
+                      (equipment_id,))
+    assert db.delete_equipment(equipment_id) == (
+        True, "Оборудование списано: в истории заявок и отчётах оно сохранится"
+    )
+    assert db.add_equipment("Спектрометр Тест", "", 'available') is False
+    assert db.is_retired_name('equipment', "Спектрометр Тест")
+    assert not db.is_retired_name('equipment', db.get_all_equipment()[0].name)
+
+    assert db.add_user("teacher1", "Повтор", 'teacher', "secret") is False
+    assert not db.is_retired_name('users', "teacher1")
+
+
+def test_rebuilt_daily_stats_keep_archived_history(db):
+    request_id = db.create_request(2, 1, "Био-21", "Практикум", "2020-01-10", "9:00-11:00")
+    db.cursor.execute("UPDATE requests SET status = 'completed' WHERE id = ?", (request_id,))
+    db.connection.commit()
+    before = sorted(db.get_request_status_stats())
+    daily_stats = "SELECT * FROM request_daily_stats WHERE count > 0 ORDER BY 1, 2, 3"
+    daily = db.cursor.execute(daily_stats).fetchall()
+
+    assert db.archive_requests() >= 1
+    assert sorted(db.get_request_status_stats()) == before
+    db.rebuild_daily_stats()
+    assert sorted(db.get_request_status_stats()) == before
+    assert db.cursor.execute(daily_stats).fetchall() == daily
+
+
+def test_request_after_active_maintenance_is_approved(db):
+    # Порция из одной заявки: её даты не пересекают активное окно
+    db.cursor.execute("DELETE FROM requests")
+    db.rebuild_quota_usage()
+    today = date.today()
+    db.add_maintenance_window(1, today.isoformat(), (today + timedelta(days=3)).isoformat(), "Ремонт")
+    db.sync_maintenance(today.isoformat())
+    assert db.get_equipment_by_id(1).status == 'maintenance'
+
+    later = (today + timedelta(days=30)).isoformat()
+    request_id = db.create_request(2, 1, "Био-21", "Практикум", later, "9:00-11:00")
+    db.auto_process_requests()
+    statuses = {req.id: req.status for req in db.get_teacher_requests(2)}
+    assert statuses[request_id] == 'approved'
+
+
+def test_request_without_status_is_listed(db):
+    request_id = db.create_request(2, 1, "Био-21", "Практикум", "2030-04-01", "9:00-11:00")
+    db.cursor.execute("UPDATE requests SET status = NULL WHERE id = ?", (request_id,))
+    db.connection.commit()
+    row = next(req for req in db.get_all_requests() if req.id == request_id)
+    assert row.status is None
+    assert row.display("-")[row.__slots__.index('status')] == "-"
+    assert [req.status for req in db.get_teacher_requests(2) if req.id == request_id] == [None]
+
+
+def test_fetch_is_profiled_as_one_call(db):
+    db.statement_stats.clear()
+    db.get_all_equipment()
+    db.get_request_trend()
+    profile = {name: calls for name, calls, _ in db.statement_profile()}
+    assert profile['requests.trend'] == 1
+    assert all(calls == 1 for calls in profile.values())
+
+
+def waitlisted_slot(db, day="2030-05-06"):
+    """Одобренная заявка преподавателя 2 и две заявки в листе ожидания её слота"""
+    db.cursor.execute("DELETE FROM requests")
+    db.rebuild_quota_usage()
+    holder = db.create_request(2, 1, "Био-21", "Практикум", day, "9:00-11:00")
+    first = db.create_request(3, 1, "Хим-31", "Практикум", day, "9:00-11:00")
+    second = db.create_request(2, 1, "Био-22", "Практикум", day, "9:00-11:00")
+    db.update_request_status(holder, 'approved')
+    db.update_request_status(first, 'waitlisted', priority=5)
+    db.update_request_status(second, 'waitlisted')
+    return holder, first, second
+
+
+def test_promotion_skips_candidate_over_quota(db):
+    holder, first, second = waitlisted_slot(db)
+    other = db.create_request(3, 2, "Хим-31", "Практикум", "2030-05-07", "9:00-11:00")
+    db.update_request_status(other, 'approved')
+    db.set_setting('quota_teacher', 1)
+
+    assert db.update_request_status(holder, 'cancelled') == second
+    statuses = {req.id: req.status for req in db.get_all_requests()}
+    assert (statuses[first], statuses[second]) == ('waitlisted', 'approved')
+    assert db.get_waitlist().peek(1, "2030-05-06", "9:00-11:00") == first
+
+
+def test_promotion_respects_maintenance_and_equipment_status(db):
+    holder, first, second = waitlisted_slot(db)
+    window_id, _ = db.add_maintenance_window(1, "2030-05-06", "2030-05-06", "Ремонт")
+    assert db.update_request_status(holder, 'cancelled') is None
+
+    db.delete_maintenance_window(window_id)
+    db.cursor.execute("UPDATE equipment SET status = 'retired' WHERE id = 1")
+    assert db.promote_waitlist(1, "2030-05-06", "9:00-11:00") is None
+
+    db.cursor.execute("UPDATE equipment SET status = 'available' WHERE id = 1")
+    assert db.promote_waitlist(1, "2030-05-06", "9:00-11:00") == first
+    assert db.get_waitlist().position(second) == 1
+
+
+def test_waitlist_view_orders_by_priority_then_queue_time():
+    slot = (1, "2030-05-06", "9:00-11:00")
+    view = WaitlistView([
+        (10, *slot, 0, "2030-01-02 10:00"),
+        (11, *slot, 0, "2030-01-01 10:00"),
+        (12, *slot, 3, "2030-01-03 10:00"),
+        (13, 2, "2030-05-06", "9:00-11:00", 0, "2030-01-01 09:00"),
+    ])
+    assert [view.position(request_id) for request_id in (12, 11, 10, 13)] == [1, 2, 3, 1]
+    assert view.peek(*slot) == 12
+    assert [view.pop(*slot) for _ in range(4)] == [12, 11, 10, None]
+    assert view.position(12) is None
+
+
+def test_stale_equipment_edit_returns_fresh_record(db):
+    version = db.get_equipment_by_id(1).version
+    assert db.update_equipment(1, "Микроскоп", "первая правка", 'available', expected_version=version)
+    with pytest.raises(StaleRecordError, match="изменена") as error:
+        db.update_equipment(1, "Микроскоп", "вторая правка", 'available', expected_version=version)
+    assert error.value.current.description == "первая правка"
+    assert error.value.current.version == version + 1
+    assert db.get_equipment_by_id(1).description == "первая правка"
+    assert db.update_equipment(1, "Микроскоп", "вторая правка", 'available',
+                               expected_version=error.value.current.version)
+    # Без версии правка применяется безусловно
+    assert db.update_equipment(1, "Микроскоп", "без версии", 'available')
+    assert not db.connection.in_transaction
+
+
+def test_edit_of_deleted_record_is_reported(db):
+    db.add_equipment("Весы", "", 'available')
+    equipment = next(eq for eq in db.get_all_equipment() if eq.name == "Весы")
+    db.delete_equipment(equipment.id)
+    with pytest.raises(StaleRecordError, match="удалена") as error:
+        db.update_equipment(equipment.id, "Весы", "", 'available', expected_version=equipment.version)
+    assert error.value.current is None
+
+
+def test_stale_request_status_is_not_applied(db):
+    request_id = db.create_request(2, 1, "Био-21", "Практикум", "2030-04-02", "9:00-11:00")
+    version = db.fetch_one('requests.get', (request_id,)).version
+    db.update_request_status(request_id, 'approved', expected_version=version)
+    with pytest.raises(StaleRecordError) as error:
+        db.update_request_status(request_id, 'rejected', expected_version=version)
+    assert error.value.current.status == 'approved'
+    assert db.fetch_one('requests.get', (request_id,)).status == 'approved'
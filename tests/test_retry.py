@@ -0,0 +1,71 @@
+"""
+Повтор записи при блокировке базы двумя соединениями (labcore/retry.py)
+"""
+import os
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from labcore import DatabaseManager, StaleRecordError  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = DatabaseManager(str(tmp_path / "lab_equipment.db"))
+    # Без ожидания внутри SQLite блокировку снимают только повторы
+    database.cursor.execute("PRAGMA busy_timeout = 0")
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def other(db):
+    connection = sqlite3.connect(db.db_name, timeout=0, check_same_thread=False)
+    yield connection
+    connection.close()
+
+
+def test_failed_insert_releases_write_lock(db, other):
+    name = db.get_all_equipment()[0].name
+    assert db.add_equipment(name, "", 'available') is False
+    assert not db.connection.in_transaction
+
+    other.execute("UPDATE equipment SET description = 'Другой клиент' WHERE name = ?", (name,))
+    other.commit()
+    assert db.add_user("new_teacher", "Новый", 'teacher', "secret") is True
+
+
+def test_stale_edit_releases_write_lock(db, other):
+    equipment = db.get_all_equipment()[0]
+    with pytest.raises(StaleRecordError):
+        db.update_equipment(equipment.id, equipment.name, "", equipment.status,
+                            expected_version=equipment.version + 1)
+    assert not db.connection.in_transaction
+    other.execute("UPDATE equipment SET description = '' WHERE id = ?", (equipment.id,))
+    other.commit()
+
+
+def test_locked_write_is_retried(db, other):
+    db.retry_policy.base_delay, db.retry_policy.retries = 0.1, 10
+    other.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.05, other.rollback).start()
+
+    assert db.add_equipment("Центрифуга Тест", "", 'available') is True
+    stats = db.lock_statistics()
+    assert stats['locked'] >= 1 and stats['retries'] >= 1 and stats['failures'] == 0
+
+
+def test_lock_held_too_long_fails_after_retries(db, other):
+    db.retry_policy.base_delay, db.retry_policy.retries = 0.001, 2
+    other.execute("BEGIN IMMEDIATE")
+    with pytest.raises(sqlite3.OperationalError, match="locked"):
+        db.add_equipment("Центрифуга Тест", "", 'available')
+    other.rollback()
+
+    assert db.lock_statistics()['failures'] == 1
+    assert not db.connection.in_transaction
+    assert db.add_equipment("Центрифуга Тест", "", 'available') is True
@@ -0,0 +1,79 @@
+"""
+Сессионные токены и их хранение в профиле пользователя (SessionManager)
+"""
+import os
+import stat
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from labcore import DatabaseManager  # noqa: E402
+from labcore.database import SessionManager  # noqa: E402
+
+
+@pytest.fixture
+def profile(tmp_path, monkeypatch):
+    """Домашний каталог пользователя во временной папке"""
+    home = tmp_path / "home"
+    monkeypatch.setenv("HOME", str(home))
+    monkeypatch.setenv("APPDATA", str(home))
+    return home
+
+
+@pytest.fixture
+def db(tmp_path, profile):
+    database = DatabaseManager(str(tmp_path / "shared" / "lab_equipment.db"))
+    yield database
+    database.close()
+
+
+@pytest.fixture(autouse=True)
+def shared_dir(tmp_path):
+    (tmp_path / "shared").mkdir()
+
+
+def test_token_is_verified_and_revoked():
+    sessions = SessionManager(b"secret")
+    token = sessions.issue(2, 'teacher')
+    assert sessions.verify(token) == (2, 'teacher')
+    # Новый процесс с тем же ключом проверяет подпись без кэша
+    assert SessionManager(b"secret").verify(token) == (2, 'teacher')
+    assert SessionManager(b"other").verify(token) is None
+    assert sessions.verify(token.replace(".teacher.", ".admin.")) is None
+    sessions.revoke(token)
+    assert sessions.verify(token) is None
+
+
+def test_expired_token_is_refused():
+    sessions = SessionManager(b"secret", ttl=-1)
+    assert SessionManager(b"secret").verify(sessions.issue(2, 'teacher')) is None
+    sessions = SessionManager(b"secret", ttl=1)
+    token = sessions.issue(2, 'teacher')
+    sessions._verified[token] = (2, 'teacher', time.time() - 1)
+    assert sessions.verify(token) is None
+
+
+def test_saved_token_lives_in_private_profile_file(db, tmp_path, profile):
+    token = db.sessions.issue(2, 'teacher')
+    db.sessions.save(token)
+    path = db.sessions.path
+    assert path.startswith(str(profile))
+    assert os.listdir(tmp_path / "shared") == ["lab_equipment.db"]
+    if os.name != "nt":
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert db.sessions.load() == token
+
+    db.sessions.end()
+    assert not os.path.exists(path)
+    assert db.sessions.load() is None
+    assert db.sessions.verify(token) is None
+
+
+def test_legacy_session_file_next_to_database_is_removed(tmp_path, profile):
+    legacy = tmp_path / "shared" / "lab_equipment.session"
+    legacy.write_text("2.teacher.0.nonce.signature", encoding="utf-8")
+    DatabaseManager(str(tmp_path / "shared" / "lab_equipment.db")).close()
+    assert not legacy.exists()
@@ -0,0 +1,76 @@
+"""
+Базы кампусов: маршрутизация по id записи и запросы по всем кампусам (ShardedDatabase)
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from labcore import ShardedDatabase, add_campus, open_database  # noqa: E402
+from labcore.database import SHARD_ID_RANGE, DatabaseManager, request_order  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    db_path = str(tmp_path / "lab_equipment.db")
+    home = DatabaseManager(db_path)
+    add_campus(home, "Северный")
+    home.close()
+    database = open_database(db_path)
+    assert isinstance(database, ShardedDatabase)
+    yield database
+    database.close()
+
+
+def test_campus_database_keeps_no_sessions(db, tmp_path):
+    campus = db.shards[1]
+    assert campus.sessions is None
+    assert campus.get_setting('session_secret') is None
+    assert db.sessions is db.home.sessions is not None
+    assert not any(name.endswith(".session") for name in os.listdir(tmp_path))
+
+
+def campus_equipment(db):
+    """Оборудование в базе кампуса "Северный" """
+    db.add_equipment("Микроскоп Север", "", 'available', "Северный")
+    return next(eq.id for eq in db.get_all_equipment() if eq.name == "Микроскоп Север")
+
+
+def test_merged_requests_follow_status_order(db):
+    home_ids = {row.id for row in db.home.get_all_requests()}
+    request_id = db.create_request(2, campus_equipment(db), "Био-21", "Практикум",
+                                   "2030-06-01", "9:00-11:00")
+    db.update_request_status(request_id, 'approved')
+    rows = db.get_all_requests()
+    assert [row.id for row in rows if row.id not in home_ids] == [request_id]
+    assert rows == sorted(rows, key=request_order)
+
+
+def test_records_are_routed_to_their_campus(db):
+    equipment_id = campus_equipment(db)
+    assert equipment_id // SHARD_ID_RANGE == 1
+    assert db.shards[1].get_equipment_by_id(equipment_id) is not None
+    assert db.home.get_equipment_by_id(equipment_id) is None
+
+    db.set_actor(1)
+    db.update_equipment(equipment_id, "Микроскоп Север", "правка", 'available')
+    assert db.get_equipment_by_id(equipment_id).description == "правка"
+    assert db.get_history('equipment', equipment_id)[-1]['after'] == {'description': "правка"}
+
+    request_id = db.create_request(2, equipment_id, "Био-21", "Практикум", "2030-06-02", "9:00-11:00")
+    assert request_id // SHARD_ID_RANGE == 1
+    assert db.shard_for(request_id) is db.shards[1]
+
+
+def test_batch_approval_runs_in_every_campus(db):
+    equipment_id = campus_equipment(db)
+    request_id = db.create_request(2, equipment_id, "Био-21", "Практикум", "2030-06-03", "9:00-11:00")
+    home_pending = [req.id for req in db.home.get_all_requests() if req.status == 'pending']
+
+    decided = db.auto_process_requests()
+    assert sum(decided.values()) == len(home_pending) + 1
+    statuses = {req.id: req.status for req in db.get_all_requests()}
+    assert statuses[request_id] == 'approved'
+    assert 'pending' not in {statuses[request_id] for request_id in home_pending}
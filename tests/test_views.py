@@ -0,0 +1,202 @@
+"""
+Загрузка таблиц окон всех версий на общей базе labcore
+
+Окна Tk без дисплея не создаются, поэтому методы загрузки вызываются у
+объекта без __init__, а таблица заменена записью вставленных строк.
+"""
+import importlib.util
+import os
+import sqlite3
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from labcore import DatabaseManager  # noqa: E402
+from labcore.presentation import EQUIPMENT_STATUS_LABELS, REQUEST_STATUS_LABELS  # noqa: E402
+
+
+class Tree:
+    """Treeview в памяти: строки, которые окно вставило"""
+
+    def __init__(self):
+        self.rows = []
+
+    def get_children(self):
+        return []
+
+    def insert(self, parent, index, values=(), tags=()):
+        self.rows.append((tuple(values), tuple(tags)))
+
+    def tag_configure(self, *args, **kwargs):
+        pass
+
+
+def load_version(folder, name):
+    path = os.path.join(ROOT, folder, f"{folder}.py")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = DatabaseManager(str(tmp_path / "lab_equipment.db"))
+    yield database
+    database.close()
+
+
+def make_window(cls, db, **attributes):
+    window = cls.__new__(cls)
+    window.db = db
+    window.status_translation = dict(REQUEST_STATUS_LABELS)
+    window.equip_status_translation = dict(EQUIPMENT_STATUS_LABELS)
+    window.requests_tree = Tree()
+    window.equipment_tree = Tree()
+    for name, value in attributes.items():
+        setattr(window, name, value)
+    return window
+
+
+@pytest.mark.parametrize("app", ["TeacherApp", "AdminApp", "GuestApp"])
+def test_version2_request_tables(db, app):
+    module = load_version("version2-improved", "version2_improved")
+    window = make_window(getattr(module, app), db, user_id=2)
+    if app == "TeacherApp":
+        window.load_requests()
+        expected = db.get_teacher_requests(2)
+    else:
+        window.load_all_requests()
+        expected = db.get_all_requests()
+
+    assert len(window.requests_tree.rows) == len(expected) > 0
+    for (values, tags), req in zip(window.requests_tree.rows, expected):
+        assert values[0] == req.id
+        assert REQUEST_STATUS_LABELS[req.status] in values
+        assert req.status not in values
+
+
+def test_version2_equipment_table(db):
+    module = load_version("version2-improved", "version2_improved")
+    window = make_window(module.GuestApp, db)
+    window.load_equipment()
+
+    expected = db.get_all_equipment()
+    assert [values for values, _ in window.equipment_tree.rows] == [
+        (eq.id, eq.name, eq.description, EQUIPMENT_STATUS_LABELS[eq.status]) for eq in expected
+    ]
+
+
+class Root:
+    """Корневое окно: запоминает запланированные вызовы"""
+
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay, callback):
+        self.scheduled.append((delay, callback))
+
+
+def test_version3_maintenance_sync_survives_errors(db, monkeypatch):
+    module = load_version("version3-final", "version3_final")
+    shell = module.AppShell.__new__(module.AppShell)
+    shell.db, shell.root = db, Root()
+
+    def locked():
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(db, "sync_maintenance", locked)
+    shell.sync_maintenance()
+    assert shell.root.scheduled == [(module.MAINTENANCE_SYNC_MS, shell.sync_maintenance)]
+
+
+class Frame:
+    """Фрейм вкладки: считает уничтоженные дочерние виджеты"""
+
+    def __init__(self):
+        self.destroyed = 0
+
+    def winfo_children(self):
+        return [self]
+
+    def destroy(self):
+        self.destroyed += 1
+
+
+def make_notebook(module):
+    notebook = module.LazyNotebook.__new__(module.LazyNotebook)
+    notebook.max_loaded, notebook.memory_limit_mb, notebook._unloaded_at_mb = 4, 300, None
+    notebook._tabs = {key: {'frame': Frame(), 'builder': None, 'pinned': key == "pinned",
+                            'built': True} for key in ("pinned", "a", "b", "c", "current")}
+    notebook._usage = ["pinned", "a", "b", "c", "current"]
+    notebook.select = lambda: "current"
+    return notebook
+
+
+def unloaded(notebook):
+    return [key for key, info in notebook._tabs.items() if not info['built']]
+
+
+def test_version3_lazy_tabs_unload_one_at_a_time_under_memory_pressure(monkeypatch):
+    module = load_version("version3-final", "version3_final")
+    notebook = make_notebook(module)
+    memory = {'used': None}
+    monkeypatch.setattr(module, "resident_memory_mb", lambda: memory['used'])
+
+    for used, expected in [
+        (None, []), (100, []),
+        # Порог превышен - одна самая давняя вкладка
+        (400, ["a"]),
+        # Память не вернулась системе - больше ничего не выгружается
+        (400, ["a"]), (420, ["a"]),
+        # Память выросла ещё на шаг - следующая
+        (400 + module.LAZY_TAB_MEMORY_STEP_MB, ["a", "b"]),
+        # Ниже порога выгрузки прекращаются, при новом превышении - снова по одной
+        (200, ["a", "b"]), (350, ["a", "b", "c"]),
+    ]:
+        memory['used'] = used
+        notebook.trim()
+        assert unloaded(notebook) == expected, used
+    assert notebook._tabs["pinned"]['built'] and notebook._tabs["current"]['built']
+
+
+class Var:
+    """StringVar без Tk"""
+
+    def __init__(self, value=""):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+def make_filter_bar(module, window):
+    bar = module.FilterBar.__new__(module.FilterBar)
+    bar._fields, bar._widgets = {}, {}
+    for key, _, choices in window.request_filter_fields():
+        bar._fields[key] = (Var(module.FILTER_ALL if choices is not None else ""), choices)
+        bar._widgets[key] = {}
+    return bar
+
+
+def test_version3_request_filter_choices_follow_new_records(db):
+    module = load_version("version3-final", "version3_final")
+    window = make_window(module.GuestApp, db)
+    window.requests_filter = make_filter_bar(module, window)
+    teacher = next(user for user in db.get_all_users() if user.role == 'teacher')
+    window.requests_filter._fields['teacher_id'][0].set(teacher.full_name)
+
+    db.add_equipment("Центрифуга", "", 'available')
+    db.update_user(teacher.id, teacher.username, "Новое Имя", 'teacher')
+    window.load_all_requests()
+
+    equipment = window.requests_filter._widgets['equipment_id']['values']
+    assert equipment[0] == module.FILTER_ALL and "Центрифуга" in equipment
+    assert "Новое Имя" in window.requests_filter._widgets['teacher_id']['values']
+    # Выбранного преподавателя больше нет в списке - фильтр сброшен
+    assert window.requests_filter.values() == {}
@@ -4,171 +4,16 @@ LabEquipment Manager на Tkinter
 """
 import tkinter as tk
 from tkinter import ttk, messagebox, Toplevel
-import sqlite3
+import os
+import sys
 from datetime import datetime
 
-print("=== Запуск LabEquipment Manager ===")
+# Общий слой данных (пакет labcore в корне репозитория)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-class DatabaseManager:
-    """Менеджер базы данных"""
-    
-    def __init__(self, db_name="lab_equipment.db"):
-        self.connection = sqlite3.connect(db_name)
-        self.cursor = self.connection.cursor()
-        self.init_database()
-        print("База данных инициализирована")
-    
-    def init_database(self):
-        """Создание таблиц и тестовых данных"""
-        # Таблица пользователей
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                full_name TEXT NOT NULL,
-                role TEXT NOT NULL,
-                password TEXT NOT NULL
-            )
-        """)
-        
-        # Таблица оборудования
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS equipment (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                description TEXT,
-                status TEXT DEFAULT 'available'
-            )
-        """)
-        
-        # Таблица заявок
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                teacher_id INTEGER NOT NULL,
-                equipment_id INTEGER NOT NULL,
-                student_group TEXT NOT NULL,
-                purpose TEXT NOT NULL,
-                desired_date TEXT NOT NULL,
-                desired_time_slot TEXT NOT NULL,
-                status TEXT DEFAULT 'pending',
-                admin_notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Проверяем наличие тестовых данных
-        self.cursor.execute("SELECT COUNT(*) FROM users")
-        if self.cursor.fetchone()[0] == 0:
-            # Тестовые пользователи
-            users = [
-                ('admin', 'Администратор Системы', 'admin', 'admin123'),
-                ('teacher1', 'Петров Иван Сергеевич', 'teacher', 'teacher1'),
-                ('teacher2', 'Сидорова Мария Константиновна', 'teacher', 'teacher2')
-            ]
-            self.cursor.executemany(
-                "INSERT INTO users (username, full_name, role, password) VALUES (?, ?, ?, ?)",
-                users
-            )
-            
-            # Тестовое оборудование
-            equipment = [
-                ('Микроскоп биологический', 'Увеличение 1000x, с иммерсионным маслом', 'available'),
-                ('Осциллограф цифровой', '4 канала, 100 МГц, с памятью', 'available'),
-                ('3D-принтер Creality', 'Область печати 220x220x250 мм', 'maintenance'),
-                ('Спектрометр USB2000+', 'Диапазон 200-850 нм', 'available'),
-                ('Центрифуга лабораторная', 'Макс. 10000 об/мин, 8 мест', 'in_use'),
-                ('Термостат суховоздушный', 'Темп. диапазон +30..+300°C', 'available')
-            ]
-            self.cursor.executemany(
-                "INSERT INTO equipment (name, description, status) VALUES (?, ?, ?)",
-                equipment
-            )
-            
-            # Тестовые заявки
-            requests = [
-                (2, 1, 'Био-21', 'Лабораторная работа по цитологии', '2024-12-15', '9:00-11:00', 'approved', 'Занятие подтверждено'),
-                (2, 4, 'Физ-22', 'Исследование спектров поглощения', '2024-12-16', '13:00-15:00', 'pending', None),
-                (3, 2, 'Радио-23', 'Изучение сигналов', '2024-12-17', '11:00-13:00', 'rejected', 'Оборудование на калибровке')
-            ]
-            self.cursor.executemany(
-                """INSERT INTO requests 
-                   (teacher_id, equipment_id, student_group, purpose, desired_date, 
-                    desired_time_slot, status, admin_notes) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                requests
-            )
-            
-            self.connection.commit()
-            print("Тестовые данные добавлены")
-    
-    def authenticate(self, username, password):
-        """Аутентификация пользователя"""
-        self.cursor.execute(
-            "SELECT id, full_name, role FROM users WHERE username = ? AND password = ?",
-            (username, password)
-        )
-        return self.cursor.fetchone()
-    
-    def get_available_equipment(self):
-        """Получить доступное оборудование"""
-        self.cursor.execute(
-            "SELECT id, name, description FROM equipment WHERE status = 'available' ORDER BY name"
-        )
-        return self.cursor.fetchall()
-    
-    def create_request(self, teacher_id, equipment_id, student_group, purpose, date, time_slot):
-        """Создать новую заявку"""
-        self.cursor.execute(
-            """INSERT INTO requests 
-               (teacher_id, equipment_id, student_group, purpose, desired_date, desired_time_slot) 
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (teacher_id, equipment_id, student_group, purpose, date, time_slot)
-        )
-        self.connection.commit()
-        return self.cursor.lastrowid
-    
-    def get_teacher_requests(self, teacher_id):
-        """Получить заявки преподавателя"""
-        self.cursor.execute("""
-            SELECT r.id, e.name, r.student_group, r.purpose, r.desired_date,
-                   r.desired_time_slot, r.status, r.admin_notes
-            FROM requests r
-            JOIN equipment e ON r.equipment_id = e.id
-            WHERE r.teacher_id = ?
-            ORDER BY r.desired_date DESC
-        """, (teacher_id,))
-        return self.cursor.fetchall()
-    
-    def get_all_requests(self):
-        """Получить все заявки (для администратора)"""
-        self.cursor.execute("""
-            SELECT r.id, u.full_name, e.name, r.student_group, r.purpose,
-                   r.desired_date, r.desired_time_slot, r.status, r.admin_notes
-            FROM requests r
-            JOIN users u ON r.teacher_id = u.id
-            JOIN equipment e ON r.equipment_id = e.id
-            ORDER BY r.status, r.desired_date
-        """)
-        return self.cursor.fetchall()
-    
-    def update_request_status(self, request_id, status, notes=None):
-        """Обновить статус заявки"""
-        if notes:
-            self.cursor.execute(
-                "UPDATE requests SET status = ?, admin_notes = ? WHERE id = ?",
-                (status, notes, request_id)
-            )
-        else:
-            self.cursor.execute(
-                "UPDATE requests SET status = ? WHERE id = ?",
-                (status, request_id)
-            )
-        self.connection.commit()
-    
-    def close(self):
-        """Закрыть соединение с БД"""
-        self.connection.close()
+from labcore import open_database
+
+print("=== Запуск LabEquipment Manager ===")
 
 class LoginWindow:
     """Окно входа"""
@@ -454,12 +299,12 @@ class TeacherApp:
         for req in requests:
             # Подсветка статуса
             tags = ()
-            if req[6] == 'approved':
+            if req.status == 'approved':
                 tags = ('approved',)
-            elif req[6] == 'rejected':
+            elif req.status == 'rejected':
                 tags = ('rejected',)
             
-            self.requests_tree.insert("", "end", values=req, tags=tags)
+            self.requests_tree.insert("", "end", values=tuple(req), tags=tags)
         
         # Настройка цветов
         self.requests_tree.tag_configure('approved', background='#d4edda')
@@ -620,14 +465,14 @@ class AdminApp:
         for req in requests:
             # Подсветка статуса
             tags = ()
-            if req[7] == 'approved':
+            if req.status == 'approved':
                 tags = ('approved',)
-            elif req[7] == 'rejected':
+            elif req.status == 'rejected':
                 tags = ('rejected',)
-            elif req[7] == 'pending':
+            elif req.status == 'pending':
                 tags = ('pending',)
             
-            self.requests_tree.insert("", "end", values=req, tags=tags)
+            self.requests_tree.insert("", "end", values=tuple(req), tags=tags)
         
         # Настройка цветов
         self.requests_tree.tag_configure('approved', background='#d4edda')
@@ -664,7 +509,7 @@ def main():
     
     try:
         # Инициализация базы данных
-        db = DatabaseManager()
+        db = open_database()
         
         # Создание главного окна входа
         root = tk.Tk()
@@ -4,259 +4,16 @@ LabEquipment Manager на Tkinter
 """
 import tkinter as tk
 from tkinter import ttk, messagebox, Toplevel, simpledialog
-import sqlite3
+import os
+import sys
 from datetime import datetime
 
-print("=== Запуск LabEquipment Manager ===")
+# Общий слой данных (пакет labcore в корне репозитория)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-class DatabaseManager:
-    """Менеджер базы данных"""
-    
-    def __init__(self, db_name="lab_equipment.db"):
-        self.connection = sqlite3.connect(db_name)
-        self.cursor = self.connection.cursor()
-        self.init_database()
-        print("База данных инициализирована")
-    
-    def init_database(self):
-        """Создание таблиц и тестовых данных"""
-        # Таблица пользователей
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                full_name TEXT NOT NULL,
-                role TEXT NOT NULL,
-                password TEXT NOT NULL
-            )
-        """)
-        
-        # Таблица оборудования
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS equipment (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                description TEXT,
-                status TEXT DEFAULT 'available'
-            )
-        """)
-        
-        # Таблица заявок
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                teacher_id INTEGER NOT NULL,
-                equipment_id INTEGER NOT NULL,
-                student_group TEXT NOT NULL,
-                purpose TEXT NOT NULL,
-                desired_date TEXT NOT NULL,
-                desired_time_slot TEXT NOT NULL,
-                status TEXT DEFAULT 'pending',
-                admin_notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Проверяем наличие тестовых данных
-        self.cursor.execute("SELECT COUNT(*) FROM users")
-        if self.cursor.fetchone()[0] == 0:
-            # Тестовые пользователи
-            users = [
-                ('admin', 'Администратор Системы', 'admin', 'admin123'),
-                ('teacher1', 'Петров Иван Сергеевич', 'teacher', 'teacher1'),
-                ('teacher2', 'Сидорова Мария Константиновна', 'teacher', 'teacher2')
-            ]
-            self.cursor.executemany(
-                "INSERT INTO users (username, full_name, role, password) VALUES (?, ?, ?, ?)",
-                users
-            )
-            
-            # Тестовое оборудование
-            equipment = [
-                ('Микроскоп биологический', 'Увеличение 1000x, с иммерсионным маслом', 'available'),
-                ('Осциллограф цифровой', '4 канала, 100 МГц, с памятью', 'available'),
-                ('3D-принтер Creality', 'Область печати 220x220x250 мм', 'maintenance'),
-                ('Спектрометр USB2000+', 'Диапазон 200-850 нм', 'available'),
-                ('Центрифуга лабораторная', 'Макс. 10000 об/мин, 8 мест', 'in_use'),
-                ('Термостат суховоздушный', 'Темп. диапазон +30..+300°C', 'available')
-            ]
-            self.cursor.executemany(
-                "INSERT INTO equipment (name, description, status) VALUES (?, ?, ?)",
-                equipment
-            )
-            
-            # Тестовые заявки
-            requests = [
-                (2, 1, 'Био-21', 'Лабораторная работа по цитологии', '2024-12-15', '9:00-11:00', 'approved', 'Занятие подтверждено'),
-                (2, 4, 'Физ-22', 'Исследование спектров поглощения', '2024-12-16', '13:00-15:00', 'pending', None),
-                (3, 2, 'Радио-23', 'Изучение сигналов', '2024-12-17', '11:00-13:00', 'rejected', 'Оборудование на калибровке')
-            ]
-            self.cursor.executemany(
-                """INSERT INTO requests 
-                   (teacher_id, equipment_id, student_group, purpose, desired_date, 
-                    desired_time_slot, status, admin_notes) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                requests
-            )
-            
-            self.connection.commit()
-            print("Тестовые данные добавлены")
-    
-    def authenticate(self, username, password):
-        """Аутентификация пользователя"""
-        self.cursor.execute(
-            "SELECT id, full_name, role FROM users WHERE username = ? AND password = ?",
-            (username, password)
-        )
-        return self.cursor.fetchone()
-    
-    def get_available_equipment(self):
-        """Получить доступное оборудование"""
-        self.cursor.execute(
-            "SELECT id, name, description FROM equipment WHERE status = 'available' ORDER BY name"
-        )
-        return self.cursor.fetchall()
-    
-    def get_all_equipment(self):
-        """Получить всё оборудование"""
-        self.cursor.execute(
-            "SELECT id, name, description, status FROM equipment ORDER BY name"
-        )
-        return self.cursor.fetchall()
-    
-    def create_request(self, teacher_id, equipment_id, student_group, purpose, date, time_slot):
-        """Создать новую заявку"""
-        self.cursor.execute(
-            """INSERT INTO requests 
-               (teacher_id, equipment_id, student_group, purpose, desired_date, desired_time_slot) 
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (teacher_id, equipment_id, student_group, purpose, date, time_slot)
-        )
-        self.connection.commit()
-        return self.cursor.lastrowid
-    
-    def get_teacher_requests(self, teacher_id):
-        """Получить заявки преподавателя"""
-        self.cursor.execute("""
-            SELECT r.id, e.name, r.student_group, r.purpose, r.desired_date,
-                   r.desired_time_slot, r.status, r.admin_notes
-            FROM requests r
-            JOIN equipment e ON r.equipment_id = e.id
-            WHERE r.teacher_id = ?
-            ORDER BY r.desired_date DESC
-        """, (teacher_id,))
-        return self.cursor.fetchall()
-    
-    def get_all_requests(self):
-        """Получить все заявки (для администратора)"""
-        self.cursor.execute("""
-            SELECT r.id, u.full_name, e.name, r.student_group, r.purpose,
-                   r.desired_date, r.desired_time_slot, r.status, r.admin_notes
-            FROM requests r
-            JOIN users u ON r.teacher_id = u.id
-            JOIN equipment e ON r.equipment_id = e.id
-            ORDER BY CASE r.status 
-                WHEN 'pending' THEN 1
-                WHEN 'approved' THEN 2
-                WHEN 'rejected' THEN 3
-                WHEN 'completed' THEN 4
-                ELSE 5 END, r.desired_date
-        """)
-        return self.cursor.fetchall()
-    
-    def update_request_status(self, request_id, status, notes=None):
-        """Обновить статус заявки"""
-        if notes:
-            self.cursor.execute(
-                "UPDATE requests SET status = ?, admin_notes = ? WHERE id = ?",
-                (status, notes, request_id)
-            )
-        else:
-            self.cursor.execute(
-                "UPDATE requests SET status = ? WHERE id = ?",
-                (status, request_id)
-            )
-        self.connection.commit()
-    
-    def get_all_users(self, exclude_admin=True):
-        """Получить всех пользователей"""
-        if exclude_admin:
-            self.cursor.execute(
-                "SELECT id, username, full_name, role FROM users WHERE role != 'admin' ORDER BY full_name"
-            )
-        else:
-            self.cursor.execute(
-                "SELECT id, username, full_name, role FROM users ORDER BY full_name"
-            )
-        return self.cursor.fetchall()
-    
-    def add_user(self, username, full_name, role, password):
-        """Добавить нового пользователя"""
-        try:
-            self.cursor.execute(
-                "INSERT INTO users (username, full_name, role, password) VALUES (?, ?, ?, ?)",
-                (username, full_name, role, password)
-            )
-            self.connection.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
-    
-    def update_user(self, user_id, username, full_name, role, password=None):
-        """Обновить данные пользователя"""
-        if password:
-            self.cursor.execute(
-                "UPDATE users SET username = ?, full_name = ?, role = ?, password = ? WHERE id = ?",
-                (username, full_name, role, password, user_id)
-            )
-        else:
-            self.cursor.execute(
-                "UPDATE users SET username = ?, full_name = ?, role = ? WHERE id = ?",
-                (username, full_name, role, user_id)
-            )
-        self.connection.commit()
-    
-    def delete_user(self, user_id):
-        """Удалить пользователя"""
-        # Сначала проверяем, есть ли заявки у пользователя
-        self.cursor.execute("SELECT COUNT(*) FROM requests WHERE teacher_id = ?", (user_id,))
-        count = self.cursor.fetchone()[0]
-        
-        if count > 0:
-            return False, f"У пользователя есть {count} активных заявок. Сначала удалите их."
-        
-        try:
-            self.cursor.execute("DELETE FROM users WHERE id = ? AND role != 'admin'", (user_id,))
-            self.connection.commit()
-            return True, "Пользователь успешно удален"
-        except:
-            return False, "Не удалось удалить пользователя"
-    
-    def get_user_by_id(self, user_id):
-        """Получить пользователя по ID"""
-        self.cursor.execute(
-            "SELECT id, username, full_name, role FROM users WHERE id = ?",
-            (user_id,)
-        )
-        return self.cursor.fetchone()
-    
-    def get_equipment_status_stats(self):
-        """Получить статистику по статусам оборудования"""
-        self.cursor.execute("""
-            SELECT status, COUNT(*) as count FROM equipment GROUP BY status
-        """)
-        return self.cursor.fetchall()
-    
-    def get_request_status_stats(self):
-        """Получить статистику по статусам заявок"""
-        self.cursor.execute("""
-            SELECT status, COUNT(*) as count FROM requests GROUP BY status
-        """)
-        return self.cursor.fetchall()
-    
-    def close(self):
-        """Закрыть соединение с БД"""
-        self.connection.close()
+from labcore import open_database
+
+print("=== Запуск LabEquipment Manager ===")
 
 class LoginWindow:
     """Окно входа"""
@@ -583,12 +340,11 @@ class TeacherApp:
         requests = self.db.get_teacher_requests(self.user_id)
         for req in requests:
             # Преобразование статуса
-            original_status = req[6]
+            original_status = req.status
             translated_status = self.status_translation.get(original_status, original_status)
             
-            # Создание новой строки с переведенным статусом
-            translated_req = list(req)
-            translated_req[6] = translated_status
+            # Строка таблицы с переведенным статусом
+            translated_req = req.display(translated_status)
             
             # Подсветка статуса
             tags = ()
@@ -915,12 +671,11 @@ class AdminApp:
         requests = self.db.get_all_requests()
         for req in requests:
             # Преобразование статуса
-            original_status = req[7]
+            original_status = req.status
             translated_status = self.status_translation.get(original_status, original_status)
             
-            # Создание новой строки с переведенным статусом
-            translated_req = list(req)
-            translated_req[7] = translated_status
+            # Строка таблицы с переведенным статусом
+            translated_req = req.display(translated_status)
             
             # Подсветка статуса
             tags = ()
@@ -1023,6 +778,9 @@ class AdminApp:
                 messagebox.showinfo("Успех", "Пользователь успешно добавлен")
                 self.load_users()
                 dialog.destroy()
+            elif self.db.is_retired_name('users', username):
+                messagebox.showerror("Ошибка", "Логин принадлежит удалённому пользователю: его "
+                                     "заявки сохранены в истории. Выберите другой логин.")
             else:
                 messagebox.showerror("Ошибка", "Пользователь с таким логином уже существует")
         
@@ -1082,12 +840,12 @@ class AdminApp:
         # Поля формы
         tk.Label(dialog, text="Логин:", font=("Arial", 11)).pack(pady=(20, 5))
         username_entry = tk.Entry(dialog, font=("Arial", 11), width=30)
-        username_entry.insert(0, user[1])
+        username_entry.insert(0, user.username)
         username_entry.pack()
         
         tk.Label(dialog, text="ФИО:", font=("Arial", 11)).pack(pady=(10, 5))
         fullname_entry = tk.Entry(dialog, font=("Arial", 11), width=30)
-        fullname_entry.insert(0, user[2])
+        fullname_entry.insert(0, user.full_name)
         fullname_entry.pack()
         
         tk.Label(dialog, text="Новый пароль (оставьте пустым, чтобы не менять):", 
@@ -1097,7 +855,7 @@ class AdminApp:
         
         tk.Label(dialog, text="Роль:", font=("Arial", 11)).pack(pady=(10, 5))
         role_combo = ttk.Combobox(dialog, values=['teacher', 'admin'], width=28)
-        role_combo.set(user[3])
+        role_combo.set(user.role)
         role_combo.pack()
         
         def save_changes():
@@ -1385,12 +1143,11 @@ class GuestApp:
         requests = self.db.get_all_requests()
         for req in requests:
             # Преобразование статуса
-            original_status = req[7]
+            original_status = req.status
             translated_status = self.status_translation.get(original_status, original_status)
             
-            # Создание новой строки с переведенным статусом
-            translated_req = list(req)
-            translated_req[7] = translated_status
+            # Строка таблицы с переведенным статусом
+            translated_req = req.display(translated_status)
             
             # Подсветка статуса
             tags = ()
@@ -1428,7 +1185,7 @@ class GuestApp:
         }
         
         for eq in equipment:
-            eq_id, name, desc, status = eq
+            status = eq.status
             translated_status = equip_status_translation.get(status, status)
             
             # Подсветка статуса
@@ -1441,7 +1198,7 @@ class GuestApp:
                 tags = ('maintenance',)
             
             self.equipment_tree.insert("", "end", 
-                                     values=(eq_id, name, desc, translated_status), 
+                                     values=(eq.id, eq.name, eq.description, translated_status), 
                                      tags=tags)
         
         # Настройка цветов
@@ -1492,7 +1249,7 @@ def main():
     
     try:
         # Инициализация базы данных
-        db = DatabaseManager()
+        db = open_database()
         
         # Создание главного окна входа
         root = tk.Tk()
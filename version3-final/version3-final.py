@@ -4,316 +4,304 @@ LabEquipment Manager на Tkinter
 Улучшенная версия,с управлением пользователями, 
 оборудованием и гостевым доступом
 """
+import time
+_PROCESS_START = time.perf_counter()
+
 import tkinter as tk
-from tkinter import ttk, messagebox, Toplevel, simpledialog
+from tkinter import ttk, messagebox, filedialog, Toplevel
+import ctypes
+import os
 import sqlite3
+import sys
+import threading
 from datetime import datetime
 
-print("=== Запуск LabEquipment Manager ===")
+# Общий слой данных (пакет labcore в корне репозитория)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-class DatabaseManager:
-    """Менеджер базы данных"""
-    
-    def __init__(self, db_name="lab_equipment.db"):
-        self.connection = sqlite3.connect(db_name)
-        self.cursor = self.connection.cursor()
-        self.init_database()
-        print("База данных инициализирована")
-    
-    def init_database(self):
-        """Создание таблиц и тестовых данных"""
-        # Таблица пользователей
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                full_name TEXT NOT NULL,
-                role TEXT NOT NULL,
-                password TEXT NOT NULL
-            )
-        """)
-        
-        # Таблица оборудования
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS equipment (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                description TEXT,
-                status TEXT DEFAULT 'available'
-            )
-        """)
+from labcore import (
+    STARTUP, MAINTENANCE_SYNC_MS, MaintenanceConflictError, QuotaExceededError,
+    StaleRecordError, add_campus, open_database, shard_path, validate_series
+)
+from labcore.analytics import TIME_SLOTS, WEEKDAYS
+from labcore.backup import SNAPSHOT_INTERVAL, restore as restore_snapshot
+from labcore.reports import REPORT_KINDS, ReportJob, term_bounds
+from labcore.presentation import (
+    REQUEST_STATUS_LABELS, REQUEST_STATUS_BY_LABEL, EQUIPMENT_STATUS_LABELS,
+    EQUIPMENT_STATUS_BY_LABEL, EQUIPMENT_STATUS_COLORS, style_status_tags
+)
+
+STARTUP.origin = _PROCESS_START
+STARTUP.mark("Импорт модулей")
+
+# Порог памяти процесса (МБ), выше которого построенные вкладки выгружаются,
+# и рост памяти (МБ) после выгрузки, при котором выгружается следующая
+LAZY_TAB_MEMORY_MB = 300
+LAZY_TAB_MEMORY_STEP_MB = 50
+
+
+class ProcessMemoryCounters(ctypes.Structure):
+    """PROCESS_MEMORY_COUNTERS для GetProcessMemoryInfo (Windows); c_ulong - DWORD"""
+    _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong)] + [
+        (name, ctypes.c_size_t) for name in (
+            "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+            "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage",
+            "PagefileUsage", "PeakPagefileUsage")
+    ]
+
+
+def resident_memory_mb():
+    """Память, занятая процессом сейчас (МБ), или None, если её не узнать
+
+    Linux - /proc/self/statm, Windows - GetProcessMemoryInfo. resource.getrusage
+    не подходит: ru_maxrss - пик за всё время, он не уменьшается после выгрузки.
+    """
+    try:
+        if sys.platform.startswith("linux"):
+            with open("/proc/self/statm") as statm:
+                pages = int(statm.read().split()[1])
+            return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+        if sys.platform == "win32":
+            counters = ProcessMemoryCounters(cb=ctypes.sizeof(ProcessMemoryCounters))
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters),
+                                                        counters.cb):
+                return counters.WorkingSetSize / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+class LazyNotebook(ttk.Notebook):
+    """Панель вкладок с отложенным построением содержимого.
+
+    Вкладка создаётся пустой и строится (вместе с загрузкой данных) только при
+    первом выборе. Если процесс занимает больше memory_limit_mb, выгружается
+    одна давно не открывавшаяся незакреплённая вкладка (кроме текущей); она
+    будет построена заново. Python редко возвращает память системе, поэтому
+    следующая выгружается, только если память выросла ещё на
+    LAZY_TAB_MEMORY_STEP_MB, - иначе каждое переключение перестраивало бы
+    вкладки. Ниже порога выгрузки по памяти прекращаются. max_loaded -
+    верхняя граница числа построенных вкладок, в том числе там, где память
+    процесса не узнать (resident_memory_mb() вернула None).
+    """
+
+    def __init__(self, master, max_loaded=2, memory_limit_mb=LAZY_TAB_MEMORY_MB, **kwargs):
+        super().__init__(master, **kwargs)
+        self.max_loaded = max_loaded
+        self.memory_limit_mb = memory_limit_mb
+        # Память процесса при последней выгрузке по памяти (None - порог не превышен)
+        self._unloaded_at_mb = None
+        self._tabs = {}
+        self._usage = []
+        self.bind("<<NotebookTabChanged>>", self._on_tab_changed)
+
+    def add_lazy(self, text, builder, pinned=False):
+        """Добавить вкладку; builder(frame) вызывается при первом открытии"""
+        frame = tk.Frame(self)
+        self.add(frame, text=text)
+        self._tabs[str(frame)] = {'frame': frame, 'builder': builder,
+                                  'pinned': pinned, 'built': False}
+        return frame
+
+    def ensure_built(self, frame):
+        """Построить вкладку, если она ещё не построена"""
+        key = str(frame)
+        info = self._tabs.get(key)
+        if info is None:
+            return
+        if not info['built']:
+            info['builder'](info['frame'])
+            info['built'] = True
+        if key in self._usage:
+            self._usage.remove(key)
+        self._usage.append(key)
+        self.trim()
+
+    def unload(self, frame):
+        """Выгрузить содержимое вкладки, освободив виджеты и данные"""
+        info = self._tabs[str(frame)]
+        if info['pinned'] or not info['built']:
+            return
+        for child in info['frame'].winfo_children():
+            child.destroy()
+        info['built'] = False
+        if str(frame) in self._usage:
+            self._usage.remove(str(frame))
+
+    def trim(self):
+        """Выгрузить самые давно использованные вкладки сверх лимита,
+        а при нехватке памяти - ещё одну (см. описание класса)"""
+        current = self.select()
+        loaded = [key for key in self._usage if not self._tabs[key]['pinned']]
+        while len(loaded) > self.max_loaded:
+            key = loaded.pop(0)
+            if key != current:
+                self.unload(key)
+        used = resident_memory_mb()
+        if used is None or used <= self.memory_limit_mb:
+            self._unloaded_at_mb = None
+            return
+        if (self._unloaded_at_mb is not None
+                and used < self._unloaded_at_mb + LAZY_TAB_MEMORY_STEP_MB):
+            return
+        for key in loaded:
+            if key != current:
+                self.unload(key)
+                self._unloaded_at_mb = used
+                return
+
+    def _on_tab_changed(self, event):
+        self.ensure_built(self.select())
+
+
+# Подпись пункта "без фильтра" в выпадающих списках
+FILTER_ALL = "Все"
+
+
+class FilterBar(tk.Frame):
+    """Панель фильтров таблицы с отложенным применением (debounce).
+
+    fields - список (ключ, подпись, варианты), где варианты - словарь
+    "подпись -> значение" для выпадающего списка или None для поля ввода.
+    on_change вызывается один раз через delay мс после последнего изменения.
+    """
+
+    def __init__(self, master, fields, on_change, delay=300):
+        super().__init__(master)
+        self.on_change = on_change
+        self.delay = delay
+        self._pending = None
+        self._fields = {}
+        self._widgets = {}
+        
+        for key, label, choices in fields:
+            tk.Label(self, text=label, font=("Arial", 10)).pack(side="left", padx=(8, 3))
+            if choices is None:
+                var = tk.StringVar()
+                widget = tk.Entry(self, textvariable=var, font=("Arial", 10), width=12)
+            else:
+                var = tk.StringVar(value=FILTER_ALL)
+                widget = ttk.Combobox(
+                    self, textvariable=var, values=[FILTER_ALL] + list(choices),
+                    width=18, state="readonly"
+                )
+            widget.pack(side="left")
+            var.trace_add("write", self._schedule)
+            self._fields[key] = (var, choices)
+            self._widgets[key] = widget
         
-        # Таблица заявок
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                teacher_id INTEGER NOT NULL,
-                equipment_id INTEGER NOT NULL,
-                student_group TEXT NOT NULL,
-                purpose TEXT NOT NULL,
-                desired_date TEXT NOT NULL,
-                desired_time_slot TEXT NOT NULL,
-                status TEXT DEFAULT 'pending',
-                admin_notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Проверяем наличие тестовых данных
-        self.cursor.execute("SELECT COUNT(*) FROM users")
-        if self.cursor.fetchone()[0] == 0:
-            # Тестовые пользователи
-            users = [
-                ('admin', 'Администратор Системы', 'admin', 'admin123'),
-                ('teacher1', 'Петров Иван Сергеевич', 'teacher', 'teacher1'),
-                ('teacher2', 'Сидорова Мария Константиновна', 'teacher', 'teacher2')
-            ]
-            self.cursor.executemany(
-                "INSERT INTO users (username, full_name, role, password) VALUES (?, ?, ?, ?)",
-                users
-            )
-            
-            # Тестовое оборудование
-            equipment = [
-                ('Микроскоп биологический', 'Увеличение 1000x, с иммерсионным маслом', 'available'),
-                ('Осциллограф цифровой', '4 канала, 100 МГц, с памятью', 'available'),
-                ('3D-принтер Creality', 'Область печати 220x220x250 мм', 'maintenance'),
-                ('Спектрометр USB2000+', 'Диапазон 200-850 нм', 'available'),
-                ('Центрифуга лабораторная', 'Макс. 10000 об/мин, 8 мест', 'in_use'),
-                ('Термостат суховоздушный', 'Темп. диапазон +30..+300°C', 'available')
-            ]
-            self.cursor.executemany(
-                "INSERT INTO equipment (name, description, status) VALUES (?, ?, ?)",
-                equipment
-            )
-            
-            # Тестовые заявки
-            requests = [
-                (2, 1, 'Био-21', 'Лабораторная работа по цитологии', '2024-12-15', '9:00-11:00', 'approved', 'Занятие подтверждено'),
-                (2, 4, 'Физ-22', 'Исследование спектров поглощения', '2024-12-16', '13:00-15:00', 'pending', None),
-                (3, 2, 'Радио-23', 'Изучение сигналов', '2024-12-17', '11:00-13:00', 'rejected', 'Оборудование на калибровке')
-            ]
-            self.cursor.executemany(
-                """INSERT INTO requests 
-                   (teacher_id, equipment_id, student_group, purpose, desired_date, 
-                    desired_time_slot, status, admin_notes) 
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                requests
-            )
-            
-            self.connection.commit()
-            print("Тестовые данные добавлены")
-    
-    def authenticate(self, username, password):
-        """Аутентификация пользователя"""
-        self.cursor.execute(
-            "SELECT id, full_name, role FROM users WHERE username = ? AND password = ?",
-            (username, password)
-        )
-        return self.cursor.fetchone()
-    
-    def get_available_equipment(self):
-        """Получить доступное оборудование"""
-        self.cursor.execute(
-            "SELECT id, name, description FROM equipment WHERE status = 'available' ORDER BY name"
-        )
-        return self.cursor.fetchall()
+        tk.Button(
+            self, text="Сбросить", font=("Arial", 10), command=self.reset, padx=10
+        ).pack(side="left", padx=10)
+    
+    def _schedule(self, *args):
+        """Перезапустить таймер применения фильтров"""
+        if self._pending is not None:
+            self.after_cancel(self._pending)
+        self._pending = self.after(self.delay, self._apply)
+    
+    def _apply(self):
+        self._pending = None
+        self.on_change()
+    
+    def values(self):
+        """Текущие фильтры в виде словаря (пустые поля не включаются)"""
+        result = {}
+        for key, (var, choices) in self._fields.items():
+            text = var.get().strip()
+            if not text or text == FILTER_ALL:
+                continue
+            result[key] = choices.get(text, text) if choices is not None else text
+        return result
+    
+    def reset(self):
+        """Сбросить все фильтры"""
+        for var, choices in self._fields.values():
+            var.set("" if choices is None else FILTER_ALL)
+    
+    def set_choices(self, key, choices):
+        """Заменить варианты выпадающего списка; исчезнувший выбор сбрасывается"""
+        var, _ = self._fields[key]
+        self._fields[key] = (var, choices)
+        self._widgets[key]["values"] = [FILTER_ALL] + list(choices)
+        if var.get() not in choices and var.get() != FILTER_ALL:
+            var.set(FILTER_ALL)
+
+
+class AppShell:
+    """Оболочка приложения: один интерпретатор Tk на весь сеанс.
+
+    Окно входа и окна ролей - это представления внутри одного корневого окна;
+    при входе и выходе заменяется только фрейм содержимого, а Tcl, шрифты и
+    темы ttk не инициализируются заново.
+    """
     
-    def get_all_equipment(self):
-        """Получить всё оборудование"""
-        self.cursor.execute(
-            "SELECT id, name, description, status FROM equipment ORDER BY name"
-        )
-        return self.cursor.fetchall()
+    def __init__(self, db_manager):
+        self.db = db_manager
+        self.root = tk.Tk()
+        self.view = None
+        self.root.after(MAINTENANCE_SYNC_MS, self.sync_maintenance)
+        self.root.after(SNAPSHOT_INTERVAL * 1000, self.take_snapshot)
     
-    def get_equipment_by_id(self, equipment_id):
-        """Получить оборудование по ID"""
-        self.cursor.execute(
-            "SELECT id, name, description, status FROM equipment WHERE id = ?",
-            (equipment_id,)
-        )
-        return self.cursor.fetchone()
+    def take_snapshot(self):
+        """Периодический снимок базы в фоновом потоке (окна не блокируются)"""
+        threading.Thread(target=self.db.backup, daemon=True).start()
+        self.root.after(SNAPSHOT_INTERVAL * 1000, self.take_snapshot)
     
-    def add_equipment(self, name, description, status):
-        """Добавить новое оборудование"""
-        try:
-            self.cursor.execute(
-                "INSERT INTO equipment (name, description, status) VALUES (?, ?, ?)",
-                (name, description, status)
-            )
-            self.connection.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
-    
-    def update_equipment(self, equipment_id, name, description, status):
-        """Обновить данные оборудования"""
-        try:
-            self.cursor.execute(
-                "UPDATE equipment SET name = ?, description = ?, status = ? WHERE id = ?",
-                (name, description, status, equipment_id)
-            )
-            self.connection.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
-    
-    def delete_equipment(self, equipment_id):
-        """Удалить оборудование"""
-        # Сначала проверяем, есть ли заявки на это оборудование
-        self.cursor.execute("SELECT COUNT(*) FROM requests WHERE equipment_id = ?", (equipment_id,))
-        count = self.cursor.fetchone()[0]
-        
-        if count > 0:
-            return False, f"На это оборудование есть {count} активных заявок. Сначала удалите их."
+    def sync_maintenance(self):
+        """Периодически применять расписание обслуживания, пока открыто окно
         
+        Ошибка одного прохода (например, база занята дольше всех повторов)
+        печатается, а следующий проход всё равно планируется.
+        """
         try:
-            self.cursor.execute("DELETE FROM equipment WHERE id = ?", (equipment_id,))
-            self.connection.commit()
-            return True, "Оборудование успешно удалено"
-        except:
-            return False, "Не удалось удалить оборудование"
-    
-    def create_request(self, teacher_id, equipment_id, student_group, purpose, date, time_slot):
-        """Создать новую заявку"""
-        self.cursor.execute(
-            """INSERT INTO requests 
-               (teacher_id, equipment_id, student_group, purpose, desired_date, desired_time_slot) 
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (teacher_id, equipment_id, student_group, purpose, date, time_slot)
-        )
-        self.connection.commit()
-        return self.cursor.lastrowid
-    
-    def get_teacher_requests(self, teacher_id):
-        """Получить заявки преподавателя"""
-        self.cursor.execute("""
-            SELECT r.id, e.name, r.student_group, r.purpose, r.desired_date,
-                   r.desired_time_slot, r.status, r.admin_notes
-            FROM requests r
-            JOIN equipment e ON r.equipment_id = e.id
-            WHERE r.teacher_id = ?
-            ORDER BY r.desired_date DESC
-        """, (teacher_id,))
-        return self.cursor.fetchall()
-    
-    def get_all_requests(self):
-        """Получить все заявки (для администратора)"""
-        self.cursor.execute("""
-            SELECT r.id, u.full_name, e.name, r.student_group, r.purpose,
-                   r.desired_date, r.desired_time_slot, r.status, r.admin_notes
-            FROM requests r
-            JOIN users u ON r.teacher_id = u.id
-            JOIN equipment e ON r.equipment_id = e.id
-            ORDER BY CASE r.status 
-                WHEN 'pending' THEN 1
-                WHEN 'approved' THEN 2
-                WHEN 'rejected' THEN 3
-                WHEN 'completed' THEN 4
-                ELSE 5 END, r.desired_date
-        """)
-        return self.cursor.fetchall()
-    
-    def update_request_status(self, request_id, status, notes=None):
-        """Обновить статус заявки"""
-        if notes:
-            self.cursor.execute(
-                "UPDATE requests SET status = ?, admin_notes = ? WHERE id = ?",
-                (status, notes, request_id)
-            )
-        else:
-            self.cursor.execute(
-                "UPDATE requests SET status = ? WHERE id = ?",
-                (status, request_id)
-            )
-        self.connection.commit()
-    
-    def get_all_users(self, exclude_admin=True):
-        """Получить всех пользователей"""
-        if exclude_admin:
-            self.cursor.execute(
-                "SELECT id, username, full_name, role FROM users WHERE role != 'admin' ORDER BY full_name"
-            )
+            self.db.sync_maintenance()
+        except Exception as e:
+            print(f"Не удалось применить расписание обслуживания: {e}")
+        finally:
+            self.root.after(MAINTENANCE_SYNC_MS, self.sync_maintenance)
+    
+    def new_view_frame(self):
+        """Удалить текущее представление и вернуть пустой фрейм для нового"""
+        if self.view is not None:
+            self.view.frame.destroy()
+            self.view = None
+        self.root.unbind('<Return>')
+        frame = tk.Frame(self.root)
+        frame.pack(fill="both", expand=True)
+        return frame
+    
+    def show_login(self):
+        """Показать окно входа"""
+        self.db.set_actor(None)
+        self.view = LoginWindow(self)
+    
+    def show_user(self, user_id, full_name, role):
+        """Показать окно пользователя по его роли"""
+        self.db.set_actor(user_id)
+        if role == 'teacher':
+            self.view = TeacherApp(self, user_id, full_name)
         else:
-            self.cursor.execute(
-                "SELECT id, username, full_name, role FROM users ORDER BY full_name"
-            )
-        return self.cursor.fetchall()
+            self.view = AdminApp(self, user_id, full_name)
     
-    def add_user(self, username, full_name, role, password):
-        """Добавить нового пользователя"""
-        try:
-            self.cursor.execute(
-                "INSERT INTO users (username, full_name, role, password) VALUES (?, ?, ?, ?)",
-                (username, full_name, role, password)
-            )
-            self.connection.commit()
-            return True
-        except sqlite3.IntegrityError:
-            return False
-    
-    def update_user(self, user_id, username, full_name, role, password=None):
-        """Обновить данные пользователя"""
-        if password:
-            self.cursor.execute(
-                "UPDATE users SET username = ?, full_name = ?, role = ?, password = ? WHERE id = ?",
-                (username, full_name, role, password, user_id)
-            )
-        else:
-            self.cursor.execute(
-                "UPDATE users SET username = ?, full_name = ?, role = ? WHERE id = ?",
-                (username, full_name, role, user_id)
-            )
-        self.connection.commit()
+    def show_guest(self):
+        """Показать гостевое окно"""
+        self.view = GuestApp(self)
     
-    def delete_user(self, user_id):
-        """Удалить пользователя"""
-        # Сначала проверяем, есть ли заявки у пользователя
-        self.cursor.execute("SELECT COUNT(*) FROM requests WHERE teacher_id = ?", (user_id,))
-        count = self.cursor.fetchone()[0]
-        
-        if count > 0:
-            return False, f"У пользователя есть {count} активных заявок. Сначала удалите их."
-        
-        try:
-            self.cursor.execute("DELETE FROM users WHERE id = ? AND role != 'admin'", (user_id,))
-            self.connection.commit()
-            return True, "Пользователь успешно удален"
-        except:
-            return False, "Не удалось удалить пользователя"
-    
-    def get_user_by_id(self, user_id):
-        """Получить пользователя по ID"""
-        self.cursor.execute(
-            "SELECT id, username, full_name, role FROM users WHERE id = ?",
-            (user_id,)
-        )
-        return self.cursor.fetchone()
-    
-    def get_equipment_status_stats(self):
-        """Получить статистику по статусам оборудования"""
-        self.cursor.execute("""
-            SELECT status, COUNT(*) as count FROM equipment GROUP BY status
-        """)
-        return self.cursor.fetchall()
-    
-    def get_request_status_stats(self):
-        """Получить статистику по статусам заявок"""
-        self.cursor.execute("""
-            SELECT status, COUNT(*) as count FROM requests GROUP BY status
-        """)
-        return self.cursor.fetchall()
-    
-    def close(self):
-        """Закрыть соединение с БД"""
-        self.connection.close()
+    def run(self):
+        """Запуск главного цикла"""
+        self.root.mainloop()
+
 
 class LoginWindow:
     """Окно входа"""
     
-    def __init__(self, root, db_manager):
-        self.root = root
-        self.db = db_manager
+    def __init__(self, shell):
+        self.shell = shell
+        self.root = shell.root
+        self.db = shell.db
+        self.frame = shell.new_view_frame()
         self.root.title("LabEquipment Manager - Вход")
         self.root.geometry("450x350")
         self.root.resizable(True, True)  # Разрешаем изменение размера
@@ -334,7 +322,7 @@ class LoginWindow:
     def create_widgets(self):
         """Создание виджетов окна входа"""
         # Главный фрейм с отступами
-        main_frame = tk.Frame(self.root, padx=20, pady=20)
+        main_frame = tk.Frame(self.frame, padx=20, pady=20)
         main_frame.pack(fill="both", expand=True)
         
         # Заголовок
@@ -375,12 +363,18 @@ class LoginWindow:
         )
         self.password_entry.grid(row=1, column=1, padx=10, pady=10)
         
+        # Запомнить вход
+        self.remember_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            input_frame, text="Запомнить меня", variable=self.remember_var
+        ).grid(row=2, column=1, sticky="w", padx=10)
+        
         # Фрейм для кнопок
         button_frame = tk.Frame(main_frame)
         button_frame.pack(pady=20)
         
         # Кнопка входа
-        login_button = tk.Button(
+        self.login_button = tk.Button(
             button_frame, 
             text="Войти", 
             font=("Arial", 11, "bold"),
@@ -390,7 +384,7 @@ class LoginWindow:
             pady=5,
             command=self.login
         )
-        login_button.pack(side="left", padx=5)
+        self.login_button.pack(side="left", padx=5)
         
         # Кнопка гостевого входа
         guest_button = tk.Button(
@@ -405,11 +399,35 @@ class LoginWindow:
         )
         guest_button.pack(side="left", padx=5)
         
+        # Строка состояния проверки пароля
+        self.status_label = tk.Label(main_frame, text="", font=("Arial", 9), fg="gray")
+        self.status_label.pack()
+        
         # Связываем Enter с кнопкой входа
         self.root.bind('<Return>', lambda event: self.login())
+        
+        # Вход по сохранённому токену
+        self.root.after_idle(self.restore_session)
+    
+    def restore_session(self):
+        """Войти по сохранённому сессионному токену без проверки пароля"""
+        token = self.db.sessions.load()
+        session = self.db.sessions.verify(token)
+        if not session:
+            return
+        user_id, role = session
+        user = self.db.get_user_by_id(user_id)
+        if not user or user.role != role:
+            self.db.sessions.end()
+            return
+        self.db.sessions.current = token
+        self.open_main_window(user_id, user.full_name, role)
     
     def login(self):
         """Обработка входа"""
+        if str(self.login_button['state']) == "disabled":
+            return
+        
         username = self.username_entry.get().strip()
         password = self.password_entry.get().strip()
         
@@ -417,47 +435,72 @@ class LoginWindow:
             messagebox.showwarning("Ошибка", "Заполните все поля")
             return
         
-        user = self.db.authenticate(username, password)
-        if user:
-            user_id, full_name, role = user
-            messagebox.showinfo("Успех", f"Добро пожаловать, {full_name}!")
-            self.root.destroy()  # Закрыть окно входа
-            
-            # Открыть главное окно
-            if role == 'teacher':
-                app = TeacherApp(user_id, full_name, self.db)
-            else:
-                app = AdminApp(user_id, full_name, self.db)
-            app.run()
-        else:
+        credentials = self.db.get_credentials(username)
+        if not credentials:
             messagebox.showerror("Ошибка", "Неверный логин или пароль")
+            return
+        
+        # Проверка хеша в рабочем потоке, чтобы окно не зависало
+        result = {}
+        worker = threading.Thread(
+            target=lambda: result.update(
+                ok=self.db.check_password(username, password, credentials[3])
+            ),
+            daemon=True
+        )
+        self.login_button.config(state="disabled")
+        self.status_label.config(text="Проверка пароля...")
+        worker.start()
+        self.root.after(20, self.finish_login, worker, result, credentials)
+    
+    def finish_login(self, worker, result, credentials):
+        """Дождаться результата проверки пароля и открыть главное окно"""
+        if worker.is_alive():
+            self.root.after(20, self.finish_login, worker, result, credentials)
+            return
+        
+        self.login_button.config(state="normal")
+        self.status_label.config(text="")
+        if not result.get('ok'):
+            messagebox.showerror("Ошибка", "Неверный логин или пароль")
+            return
+        
+        user_id, full_name, role, _ = credentials
+        token = self.db.sessions.issue(user_id, role)
+        if self.remember_var.get():
+            self.db.sessions.save(token)
+        else:
+            self.db.sessions.current = token
+        
+        messagebox.showinfo("Успех", f"Добро пожаловать, {full_name}!")
+        self.open_main_window(user_id, full_name, role)
+    
+    def open_main_window(self, user_id, full_name, role):
+        """Заменить окно входа окном по роли пользователя"""
+        self.shell.show_user(user_id, full_name, role)
     
     def guest_login(self):
         """Гостевой доступ"""
-        self.root.destroy()
-        app = GuestApp(self.db)
-        app.run()
+        self.shell.show_guest()
+
 
 class TeacherApp:
     """Приложение для преподавателя"""
     
-    def __init__(self, user_id, full_name, db_manager):
+    def __init__(self, shell, user_id, full_name):
         self.user_id = user_id
         self.full_name = full_name
-        self.db = db_manager
-        self.root = tk.Tk()
+        self.shell = shell
+        self.db = shell.db
+        self.root = shell.root
+        self.frame = shell.new_view_frame()
         self.root.title(f"LabEquipment Manager - Преподаватель ({full_name})")
         self.root.geometry("1100x750")
         self.root.resizable(True, True)  # Разрешаем изменение размера
         self.center_window(1100, 750)
         
-        # Словарь для перевода статусов
-        self.status_translation = {
-            'pending': 'На рассмотрении',
-            'approved': 'Одобрено',
-            'rejected': 'Отклонено',
-            'completed': 'Завершено'
-        }
+        # Общий словарь подписей статусов
+        self.status_translation = REQUEST_STATUS_LABELS
         
         self.create_widgets()
         self.load_requests()
@@ -473,7 +516,7 @@ class TeacherApp:
     def create_widgets(self):
         """Создание интерфейса преподавателя"""
         # Заголовок
-        header_frame = tk.Frame(self.root, bg="#2196F3")
+        header_frame = tk.Frame(self.frame, bg="#2196F3")
         header_frame.pack(fill="x", pady=(0, 10))
         
         title_label = tk.Label(
@@ -488,7 +531,7 @@ class TeacherApp:
         title_label.pack(side="left")
         
         # Панель вкладок
-        self.notebook = ttk.Notebook(self.root)
+        self.notebook = ttk.Notebook(self.frame)
         self.notebook.pack(fill="both", expand=True, padx=10, pady=(0, 10))
         
         # Вкладка 1: Новая заявка
@@ -499,10 +542,10 @@ class TeacherApp:
         
         # Кнопка выхода
         exit_button = tk.Button(
-            self.root,
+            self.frame,
             text="Выход",
             font=("Arial", 10),
-            command=self.root.destroy,
+            command=self.logout,
             padx=15,
             pady=5
         )
@@ -569,6 +612,15 @@ class TeacherApp:
         self.time_combo.current(0)
         self.time_combo.grid(row=4, column=1, sticky="w", pady=10, padx=(10, 0))
         
+        # Повторение (серия заявок)
+        tk.Label(fields_frame, text="Еженедельно до:", font=("Arial", 11)).grid(
+            row=5, column=0, sticky="w", pady=10
+        )
+        self.repeat_until_entry = tk.Entry(fields_frame, font=("Arial", 11), width=20)
+        self.repeat_until_entry.grid(row=5, column=1, sticky="w", pady=10, padx=(10, 0))
+        tk.Label(fields_frame, text="(оставьте пустым для разовой заявки)",
+                 font=("Arial", 9), fg="gray").grid(row=6, column=1, sticky="w", padx=(10, 0))
+        
         # Кнопка подачи заявки
         submit_button = tk.Button(
             fields_frame,
@@ -580,7 +632,12 @@ class TeacherApp:
             pady=5,
             command=self.submit_request
         )
-        submit_button.grid(row=5, column=1, sticky="w", pady=20, padx=(10, 0))
+        submit_button.grid(row=7, column=1, sticky="w", pady=20, padx=(10, 0))
+        
+        # Использование квоты
+        self.quota_label = tk.Label(fields_frame, text="", font=("Arial", 10), fg="gray")
+        self.quota_label.grid(row=8, column=1, sticky="w", padx=(10, 0))
+        self.load_quota()
         
         # Упаковка канваса и скроллбара
         canvas.pack(side="left", fill="both", expand=True)
@@ -598,6 +655,7 @@ class TeacherApp:
         # Таблица заявок
         columns = ("ID", "Оборудование", "Группа", "Цель", "Дата", "Время", "Статус", "Комментарий")
         self.requests_tree = ttk.Treeview(table_container, columns=columns, show="headings")
+        style_status_tags(self.requests_tree)
         
         # Настройка колонок
         col_widths = [50, 150, 80, 200, 100, 100, 100, 150]
@@ -654,29 +712,26 @@ class TeacherApp:
         # Загрузить данные
         requests = self.db.get_teacher_requests(self.user_id)
         for req in requests:
-            # Преобразование статуса
-            original_status = req[6]
-            translated_status = self.status_translation.get(original_status, original_status)
-            
-            # Создание новой строки с переведенным статусом
-            translated_req = list(req)
-            translated_req[6] = translated_status
-            
-            # Подсветка статуса
-            tags = ()
-            if original_status == 'approved':
-                tags = ('approved',)
-            elif original_status == 'rejected':
-                tags = ('rejected',)
-            elif original_status == 'pending':
-                tags = ('pending',)
-            
-            self.requests_tree.insert("", "end", values=translated_req, tags=tags)
-        
-        # Настройка цветов
-        self.requests_tree.tag_configure('approved', background='#d4edda')
-        self.requests_tree.tag_configure('rejected', background='#f8d7da')
-        self.requests_tree.tag_configure('pending', background='#fff3cd')
+            # Строка с переведенным статусом, подсветка по тегу статуса
+            label = self.status_translation.get(req.status, req.status)
+            self.requests_tree.insert("", "end", values=req.display(label), tags=(req.status,))
+        
+        # Серии заявок (одна строка на серию)
+        for series in self.db.get_all_series(self.user_id):
+            (series_id, _, equipment, group, purpose, start_date, end_date,
+             interval_days, time_slot, status, notes) = series
+            self.requests_tree.insert("", "end", values=(
+                f"С{series_id}", equipment, group, purpose,
+                f"{start_date}..{end_date} / {interval_days} дн.", time_slot,
+                self.status_translation.get(status, status), notes
+            ), tags=(status,))
+    
+    def load_quota(self):
+        """Показать использование квоты преподавателя в текущем месяце"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        teacher_limit, _ = self.db.get_quota_limits()
+        used = self.db.get_quota_usage('teacher', self.user_id, today)
+        self.quota_label.config(text=f"Квота на {today[:7]}: {used} из {teacher_limit} заявок")
     
     def submit_request(self):
         """Подать новую заявку"""
@@ -691,6 +746,7 @@ class TeacherApp:
         purpose = self.purpose_text.get("1.0", "end").strip()
         date = self.date_entry.get().strip()
         time_slot = self.time_combo.get()
+        repeat_until = self.repeat_until_entry.get().strip()
         
         if not all([group, purpose, date]):
             messagebox.showerror("Ошибка", "Заполните все обязательные поля")
@@ -698,55 +754,60 @@ class TeacherApp:
         
         # Создание заявки
         try:
-            request_id = self.db.create_request(
-                self.user_id, equipment_id, group, purpose, date, time_slot
-            )
-            messagebox.showinfo("Успех", f"Заявка #{request_id} успешно создана!")
+            if repeat_until:
+                # Даты занятий проверяются до записи серии
+                count = len(validate_series(date, repeat_until))
+                series_id = self.db.create_recurring_request(
+                    self.user_id, equipment_id, group, purpose, date, repeat_until, time_slot
+                )
+                messagebox.showinfo("Успех", f"Серия #{series_id} ({count} занятий) успешно создана!")
+            else:
+                request_id = self.db.create_request(
+                    self.user_id, equipment_id, group, purpose, date, time_slot
+                )
+                messagebox.showinfo("Успех", f"Заявка #{request_id} успешно создана!")
             
             # Очистка формы
             self.group_entry.delete(0, tk.END)
             self.purpose_text.delete("1.0", tk.END)
+            self.repeat_until_entry.delete(0, tk.END)
             self.load_equipment_list()
             self.load_requests()
+            self.load_quota()
             
+        except QuotaExceededError as e:
+            messagebox.showerror("Квота превышена", f"Заявка не создана: {str(e)}")
+        except MaintenanceConflictError as e:
+            messagebox.showerror("Оборудование недоступно", f"Заявка не создана: {str(e)}")
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось создать заявку: {str(e)}")
     
-    def run(self):
-        """Запуск приложения"""
-        self.root.mainloop()
+    def logout(self):
+        """Выход из учетной записи (сохранённый токен удаляется)"""
+        self.db.sessions.end()
+        self.shell.show_login()
+
 
 class AdminApp:
     """Приложение для администратора"""
     
-    def __init__(self, user_id, full_name, db_manager):
+    def __init__(self, shell, user_id, full_name):
         self.user_id = user_id
         self.full_name = full_name
-        self.db = db_manager
-        self.root = tk.Tk()
+        self.shell = shell
+        self.db = shell.db
+        self.root = shell.root
+        self.frame = shell.new_view_frame()
         self.root.title(f"LabEquipment Manager - Администратор ({full_name})")
         self.root.geometry("1400x900")
         self.root.resizable(True, True)  # Разрешаем изменение размера
         self.center_window(1400, 900)
         
-        # Словарь для перевода статусов
-        self.status_translation = {
-            'pending': 'На рассмотрении',
-            'approved': 'Одобрено',
-            'rejected': 'Отклонено',
-            'completed': 'Завершено'
-        }
-        
-        # Словарь для статусов оборудования
-        self.equip_status_translation = {
-            'available': 'Доступно',
-            'in_use': 'В использовании',
-            'maintenance': 'На обслуживании'
-        }
-        
-        # Обратные словари
-        self.reverse_status_translation = {v: k for k, v in self.status_translation.items()}
-        self.reverse_equip_status_translation = {v: k for k, v in self.equip_status_translation.items()}
+        # Общие словари подписей статусов и обратные к ним
+        self.status_translation = REQUEST_STATUS_LABELS
+        self.equip_status_translation = EQUIPMENT_STATUS_LABELS
+        self.reverse_status_translation = REQUEST_STATUS_BY_LABEL
+        self.reverse_equip_status_translation = EQUIPMENT_STATUS_BY_LABEL
         
         self.create_widgets()
         self.load_all_requests()
@@ -762,7 +823,7 @@ class AdminApp:
     def create_widgets(self):
         """Создание интерфейса администратора"""
         # Заголовок
-        header_frame = tk.Frame(self.root, bg="#9C27B0")
+        header_frame = tk.Frame(self.frame, bg="#9C27B0")
         header_frame.pack(fill="x", pady=(0, 10))
         
         title_label = tk.Label(
@@ -776,26 +837,45 @@ class AdminApp:
         )
         title_label.pack(side="left")
         
-        # Панель вкладок
-        self.notebook = ttk.Notebook(self.root)
+        self.backup_button = tk.Button(
+            header_frame,
+            text="Резервная копия",
+            font=("Arial", 10),
+            command=self.backup_database,
+            padx=10
+        )
+        self.backup_button.pack(side="right", padx=20)
+        
+        # Панель вкладок (вкладки строятся при первом открытии)
+        self.notebook = LazyNotebook(self.frame, max_loaded=2)
         self.notebook.pack(fill="both", expand=True, padx=10, pady=(0, 10))
         
         # Вкладка 1: Управление заявками
-        self.create_requests_tab()
+        requests_tab = self.notebook.add_lazy(
+            "Управление заявками", self.create_requests_tab, pinned=True
+        )
+        
+        # Вкладка 2: Серии заявок
+        self.notebook.add_lazy("Серии заявок", self.create_series_tab)
+        
+        # Вкладка 3: Управление пользователями
+        self.notebook.add_lazy("Управление пользователями", self.create_users_tab)
         
-        # Вкладка 2: Управление пользователями
-        self.create_users_tab()
+        # Вкладка 4: Управление оборудованием
+        self.notebook.add_lazy("Управление оборудованием", self.create_equipment_tab)
         
-        # Вкладка 3: Управление оборудованием
-        self.create_equipment_tab()
+        # Вкладка 5: Статистика
+        self.notebook.add_lazy("Статистика", self.create_stats_tab)
         
-        # Вкладка 4: Статистика
-        self.create_stats_tab()
+        self.notebook.ensure_built(requests_tab)
     
-    def create_requests_tab(self):
+    def create_requests_tab(self, tab):
         """Создать вкладку управления заявками"""
-        tab = tk.Frame(self.notebook)
-        self.notebook.add(tab, text="Управление заявками")
+        # Панель фильтров
+        self.requests_filter = FilterBar(
+            tab, self.request_filter_fields(), lambda: self.load_all_requests(cached=True)
+        )
+        self.requests_filter.pack(fill="x", padx=10, pady=(10, 0))
         
         # Контейнер для таблицы
         table_container = tk.Frame(tab)
@@ -804,6 +884,7 @@ class AdminApp:
         # Таблица всех заявок
         columns = ("ID", "Преподаватель", "Оборудование", "Группа", "Цель", "Дата", "Время", "Статус", "Комментарий")
         self.requests_tree = ttk.Treeview(table_container, columns=columns, show="headings")
+        style_status_tags(self.requests_tree)
         
         # Настройка колонок
         col_widths = [50, 150, 150, 80, 200, 100, 100, 100, 200]
@@ -866,12 +947,208 @@ class AdminApp:
             pady=5
         )
         refresh_button.pack(side="left", padx=5)
+        
+        auto_button = tk.Button(
+            control_frame,
+            text="Автообработка",
+            font=("Arial", 11),
+            command=self.auto_process_requests,
+            padx=15,
+            pady=5
+        )
+        auto_button.pack(side="left", padx=5)
+        
+        # Архив
+        self.include_archive_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            control_frame,
+            text="Включая архив",
+            variable=self.include_archive_var,
+            command=self.load_all_requests
+        ).pack(side="left", padx=5)
+        
+        archive_button = tk.Button(
+            control_frame,
+            text="В архив",
+            font=("Arial", 11),
+            command=self.archive_requests,
+            padx=15,
+            pady=5
+        )
+        archive_button.pack(side="left", padx=5)
+        
+        history_button = tk.Button(
+            control_frame,
+            text="История",
+            font=("Arial", 11),
+            command=self.show_request_history,
+            padx=15,
+            pady=5
+        )
+        history_button.pack(side="left", padx=5)
+    
+    def create_series_tab(self, tab):
+        """Создать вкладку серий повторяющихся заявок"""
+        # Таблица серий
+        series_container = tk.Frame(tab)
+        series_container.pack(fill="both", expand=True, padx=10, pady=(10, 5))
+        
+        columns = ("ID", "Преподаватель", "Оборудование", "Группа", "Слот", "Период", "Шаг", "Статус")
+        self.series_tree = ttk.Treeview(series_container, columns=columns, show="headings", height=8)
+        style_status_tags(self.series_tree)
+        col_widths = [50, 180, 180, 80, 100, 200, 60, 120]
+        for col, width in zip(columns, col_widths):
+            self.series_tree.heading(col, text=col)
+            self.series_tree.column(col, width=width, minwidth=50)
+        
+        v_scrollbar = ttk.Scrollbar(series_container, orient="vertical", command=self.series_tree.yview)
+        self.series_tree.configure(yscrollcommand=v_scrollbar.set)
+        self.series_tree.grid(row=0, column=0, sticky="nsew")
+        v_scrollbar.grid(row=0, column=1, sticky="ns")
+        series_container.grid_rowconfigure(0, weight=1)
+        series_container.grid_columnconfigure(0, weight=1)
+        self.series_tree.bind("<<TreeviewSelect>>", lambda event: self.load_occurrences())
+        
+        # Занятия выбранной серии
+        occurrences_container = tk.Frame(tab)
+        occurrences_container.pack(fill="both", expand=True, padx=10, pady=5)
+        
+        columns = ("Дата", "Статус", "Комментарий")
+        self.occurrences_tree = ttk.Treeview(occurrences_container, columns=columns, show="headings", height=8)
+        style_status_tags(self.occurrences_tree)
+        for col, width in zip(columns, [120, 150, 400]):
+            self.occurrences_tree.heading(col, text=col)
+            self.occurrences_tree.column(col, width=width, minwidth=50)
+        
+        v_scrollbar = ttk.Scrollbar(occurrences_container, orient="vertical", command=self.occurrences_tree.yview)
+        self.occurrences_tree.configure(yscrollcommand=v_scrollbar.set)
+        self.occurrences_tree.grid(row=0, column=0, sticky="nsew")
+        v_scrollbar.grid(row=0, column=1, sticky="ns")
+        occurrences_container.grid_rowconfigure(0, weight=1)
+        occurrences_container.grid_columnconfigure(0, weight=1)
+        
+        # Панель управления
+        control_frame = tk.Frame(tab)
+        control_frame.pack(fill="x", padx=10, pady=10)
+        
+        tk.Label(control_frame, text="Новый статус:", font=("Arial", 11)).pack(side="left", padx=5)
+        self.series_status_combo = ttk.Combobox(
+            control_frame,
+            values=list(self.status_translation.values()),
+            width=15
+        )
+        self.series_status_combo.current(1)
+        self.series_status_combo.pack(side="left", padx=5)
+        
+        tk.Label(control_frame, text="Комментарий:", font=("Arial", 11)).pack(side="left", padx=(20, 5))
+        self.series_notes_entry = tk.Entry(control_frame, width=30, font=("Arial", 11))
+        self.series_notes_entry.pack(side="left", padx=5)
+        
+        tk.Button(
+            control_frame,
+            text="Применить к серии",
+            font=("Arial", 11, "bold"),
+            bg="#2196F3",
+            fg="white",
+            command=self.update_series_status,
+            padx=15,
+            pady=5
+        ).pack(side="left", padx=10)
+        
+        tk.Button(
+            control_frame,
+            text="Применить к занятию",
+            font=("Arial", 11),
+            command=self.override_occurrence,
+            padx=15,
+            pady=5
+        ).pack(side="left", padx=5)
+        
+        tk.Button(
+            control_frame,
+            text="Обновить",
+            font=("Arial", 11),
+            command=self.load_series,
+            padx=15,
+            pady=5
+        ).pack(side="left", padx=5)
+        
+        self.load_series()
+    
+    def load_series(self):
+        """Загрузить серии заявок"""
+        for item in self.series_tree.get_children():
+            self.series_tree.delete(item)
+        for item in self.occurrences_tree.get_children():
+            self.occurrences_tree.delete(item)
+        
+        for series in self.db.get_all_series():
+            (series_id, teacher, equipment, group, _, start_date, end_date,
+             interval_days, time_slot, status, _) = series
+            self.series_tree.insert("", "end", iid=str(series_id), values=(
+                series_id, teacher, equipment, group, time_slot,
+                f"{start_date} - {end_date}", f"{interval_days} дн.",
+                self.status_translation.get(status, status)
+            ), tags=(status,))
+    
+    def load_occurrences(self):
+        """Показать занятия выбранной серии"""
+        for item in self.occurrences_tree.get_children():
+            self.occurrences_tree.delete(item)
+        
+        selection = self.series_tree.selection()
+        if not selection:
+            return
+        for day, status, notes in self.db.get_series_occurrences(int(selection[0])):
+            self.occurrences_tree.insert("", "end", iid=day, values=(
+                day, self.status_translation.get(status, status), notes or ""
+            ), tags=(status,))
+    
+    def update_series_status(self):
+        """Изменить статус всей выбранной серии"""
+        selection = self.series_tree.selection()
+        if not selection:
+            messagebox.showwarning("Внимание", "Выберите серию из таблицы")
+            return
+        
+        series_id = int(selection[0])
+        translated_status = self.series_status_combo.get()
+        status = self.reverse_status_translation.get(translated_status, translated_status)
+        notes = self.series_notes_entry.get().strip() or None
+        
+        try:
+            conflicts = self.db.update_series_status(series_id, status, notes)
+            message = f"Статус серии #{series_id} обновлен"
+            if conflicts:
+                message += f"\nОтклонены занятия с занятым слотом: {', '.join(conflicts)}"
+            messagebox.showinfo("Успех", message)
+            self.series_notes_entry.delete(0, tk.END)
+            self.load_series()
+            self.series_tree.selection_set(str(series_id))
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось обновить серию: {str(e)}")
+    
+    def override_occurrence(self):
+        """Изменить статус одного занятия серии"""
+        series = self.series_tree.selection()
+        occurrence = self.occurrences_tree.selection()
+        if not series or not occurrence:
+            messagebox.showwarning("Внимание", "Выберите серию и занятие")
+            return
+        
+        translated_status = self.series_status_combo.get()
+        status = self.reverse_status_translation.get(translated_status, translated_status)
+        notes = self.series_notes_entry.get().strip() or None
+        
+        try:
+            self.db.override_occurrence(int(series[0]), occurrence[0], status, notes)
+            self.series_notes_entry.delete(0, tk.END)
+            self.load_occurrences()
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось обновить занятие: {str(e)}")
     
-    def create_users_tab(self):
+    def create_users_tab(self, tab):
         """Создать вкладку управления пользователями"""
-        tab = tk.Frame(self.notebook)
-        self.notebook.add(tab, text="Управление пользователями")
-        
         # Контейнер для таблицы
         table_container = tk.Frame(tab)
         table_container.pack(fill="both", expand=True, padx=10, pady=10)
@@ -954,10 +1231,16 @@ class AdminApp:
         # Загрузка пользователей
         self.load_users()
     
-    def create_equipment_tab(self):
+    def create_equipment_tab(self, tab):
         """Создать вкладку управления оборудованием"""
-        tab = tk.Frame(self.notebook)
-        self.notebook.add(tab, text="Управление оборудованием")
+        # Панель фильтров
+        self.equipment_filter = FilterBar(
+            tab,
+            [('status', "Статус:", EQUIPMENT_STATUS_BY_LABEL),
+             ('text', "Поиск:", None)],
+            lambda: self.load_equipment(cached=True)
+        )
+        self.equipment_filter.pack(fill="x", padx=10, pady=(10, 0))
         
         # Контейнер для таблицы
         table_container = tk.Frame(tab)
@@ -966,6 +1249,7 @@ class AdminApp:
         # Таблица оборудования
         columns = ("ID", "Название", "Описание", "Статус")
         self.equipment_tree = ttk.Treeview(table_container, columns=columns, show="headings")
+        style_status_tags(self.equipment_tree, EQUIPMENT_STATUS_COLORS)
         
         # Настройка колонок
         col_widths = [50, 200, 300, 120]
@@ -1028,6 +1312,18 @@ class AdminApp:
         )
         delete_equip_button.pack(side="left", padx=5)
         
+        maintenance_button = tk.Button(
+            equip_control_frame,
+            text="Обслуживание",
+            font=("Arial", 11),
+            bg="#9C27B0",
+            fg="white",
+            command=self.manage_maintenance,
+            padx=15,
+            pady=5
+        )
+        maintenance_button.pack(side="left", padx=5)
+        
         refresh_equip_button = tk.Button(
             equip_control_frame,
             text="Обновить список",
@@ -1041,11 +1337,8 @@ class AdminApp:
         # Загрузка оборудования
         self.load_equipment()
     
-    def create_stats_tab(self):
+    def create_stats_tab(self, tab):
         """Создать вкладку со статистикой"""
-        tab = tk.Frame(self.notebook)
-        self.notebook.add(tab, text="Статистика")
-        
         # Фрейм для статистики с прокруткой
         canvas = tk.Canvas(tab)
         scrollbar = ttk.Scrollbar(tab, orient="vertical", command=canvas.yview)
@@ -1081,6 +1374,81 @@ class AdminApp:
         self.request_stats_text = tk.Text(scrollable_frame, width=50, height=10, font=("Arial", 10))
         self.request_stats_text.grid(row=1, column=1, sticky="w", padx=20, pady=(0, 20))
         
+        # Загрузка оборудования за год
+        usage_label = tk.Label(
+            scrollable_frame,
+            text="Загрузка оборудования за год:",
+            font=("Arial", 12, "bold")
+        )
+        usage_label.grid(row=2, column=0, columnspan=2, sticky="w", pady=(0, 10), padx=20)
+        
+        self.usage_stats_text = tk.Text(scrollable_frame, width=104, height=24, font=("Courier", 10))
+        self.usage_stats_text.grid(row=3, column=0, columnspan=2, sticky="w", padx=20, pady=(0, 20))
+        
+        # Динамика заявок по месяцам и годам
+        trend_label = tk.Label(
+            scrollable_frame,
+            text="Динамика заявок:",
+            font=("Arial", 12, "bold")
+        )
+        trend_label.grid(row=4, column=0, columnspan=2, sticky="w", pady=(0, 10), padx=20)
+        
+        self.trend_stats_text = tk.Text(scrollable_frame, width=104, height=18, font=("Courier", 10))
+        self.trend_stats_text.grid(row=5, column=0, columnspan=2, sticky="w", padx=20, pady=(0, 20))
+        
+        # Отчёт за семестр (HTML для печати), строится в пуле процессов
+        report_label = tk.Label(
+            scrollable_frame,
+            text="Отчёт за семестр:",
+            font=("Arial", 12, "bold")
+        )
+        report_label.grid(row=6, column=0, columnspan=2, sticky="w", pady=(0, 10), padx=20)
+        
+        report_frame = tk.Frame(scrollable_frame)
+        report_frame.grid(row=7, column=0, columnspan=2, sticky="w", padx=20, pady=(0, 20))
+        
+        self.report_kind_combo = ttk.Combobox(
+            report_frame, values=[label for _, _, label in REPORT_KINDS.values()],
+            width=20, state="readonly"
+        )
+        self.report_kind_combo.current(0)
+        self.report_kind_combo.pack(side="left", padx=(0, 10))
+        
+        term_start, term_end = term_bounds()
+        tk.Label(report_frame, text="с", font=("Arial", 10)).pack(side="left")
+        self.report_from_entry = tk.Entry(report_frame, width=12, font=("Arial", 10))
+        self.report_from_entry.insert(0, term_start)
+        self.report_from_entry.pack(side="left", padx=5)
+        tk.Label(report_frame, text="по", font=("Arial", 10)).pack(side="left")
+        self.report_to_entry = tk.Entry(report_frame, width=12, font=("Arial", 10))
+        self.report_to_entry.insert(0, term_end)
+        self.report_to_entry.pack(side="left", padx=5)
+        
+        self.report_button = tk.Button(
+            report_frame,
+            text="Сформировать",
+            font=("Arial", 10),
+            command=self.generate_report,
+            padx=10
+        )
+        self.report_button.pack(side="left", padx=10)
+        
+        self.report_cancel_button = tk.Button(
+            report_frame,
+            text="Отмена",
+            font=("Arial", 10),
+            command=self.cancel_report,
+            state="disabled",
+            padx=10
+        )
+        self.report_cancel_button.pack(side="left")
+        
+        self.report_progress = ttk.Progressbar(report_frame, length=200, mode="determinate")
+        self.report_progress.pack(side="left", padx=10)
+        
+        self.report_status_label = tk.Label(report_frame, text="", font=("Arial", 10))
+        self.report_status_label.pack(side="left")
+        
         # Кнопка обновления статистики
         refresh_stats_button = tk.Button(
             scrollable_frame,
@@ -1090,18 +1458,18 @@ class AdminApp:
             padx=15,
             pady=5
         )
-        refresh_stats_button.grid(row=2, column=0, columnspan=2, pady=20)
+        refresh_stats_button.grid(row=8, column=0, columnspan=2, pady=20)
         
         # Кнопка выхода
         exit_button = tk.Button(
             scrollable_frame,
             text="Выход",
             font=("Arial", 11),
-            command=self.root.destroy,
+            command=self.logout,
             padx=15,
             pady=5
         )
-        exit_button.grid(row=3, column=0, columnspan=2, pady=10)
+        exit_button.grid(row=9, column=0, columnspan=2, pady=10)
         
         # Упаковка канваса и скроллбара
         canvas.pack(side="left", fill="both", expand=True)
@@ -1110,41 +1478,206 @@ class AdminApp:
         # Загрузка статистики
         self.load_stats()
     
-    def load_all_requests(self):
-        """Загрузить все заявки"""
+    def request_filter_fields(self):
+        """Поля панели фильтров заявок"""
+        equipment = {eq.name: eq.id for eq in self.db.get_all_equipment()}
+        teachers = {user.full_name: user.id for user in self.db.get_all_users() if user.role == 'teacher'}
+        return [
+            ('status', "Статус:", REQUEST_STATUS_BY_LABEL),
+            ('equipment_id', "Оборудование:", equipment),
+            ('teacher_id', "Преподаватель:", teachers),
+            ('date_from', "Дата с:", None),
+            ('date_to', "по:", None),
+            ('text', "Поиск:", None),
+        ]
+    
+    def refresh_filter_choices(self):
+        """Обновить списки оборудования и преподавателей в фильтре заявок"""
+        for key, _, choices in self.request_filter_fields():
+            if key in ('equipment_id', 'teacher_id'):
+                self.requests_filter.set_choices(key, choices)
+    
+    def load_all_requests(self, cached=False):
+        """Загрузить все заявки с учетом фильтров"""
+        # Полная перезагрузка (не по фильтру) - обновить и варианты фильтров
+        if not cached:
+            self.refresh_filter_choices()
+        
         # Очистить таблицу
         for item in self.requests_tree.get_children():
             self.requests_tree.delete(item)
         
         # Загрузить данные
-        requests = self.db.get_all_requests()
+        requests = self.db.get_all_requests(
+            self.requests_filter.values(), cached=cached,
+            include_archive=self.include_archive_var.get()
+        )
+        waitlist = self.db.get_waitlist()
         for req in requests:
-            # Преобразование статуса
-            original_status = req[7]
-            translated_status = self.status_translation.get(original_status, original_status)
-            
-            # Создание новой строки с переведенным статусом
-            translated_req = list(req)
-            translated_req[7] = translated_status
-            
-            # Подсветка статуса
-            tags = ()
-            if original_status == 'approved':
-                tags = ('approved',)
-            elif original_status == 'rejected':
-                tags = ('rejected',)
-            elif original_status == 'pending':
-                tags = ('pending',)
-            elif original_status == 'completed':
-                tags = ('completed',)
-            
-            self.requests_tree.insert("", "end", values=translated_req, tags=tags)
+            # Строка с переведенным статусом (и позицией в листе ожидания)
+            label = self.status_translation.get(req.status, req.status)
+            if req.status == 'waitlisted' and waitlist.position(req.id):
+                label = f"{label} ({waitlist.position(req.id)})"
+            self.requests_tree.insert("", "end", values=req.display(label), tags=(req.status,))
+    
+    def auto_process_requests(self):
+        """Рассмотреть заявки на рассмотрении по правилам"""
+        try:
+            decided = self.db.auto_process_requests()
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось выполнить автообработку: {str(e)}")
+            return
+        
+        if decided:
+            summary = "\n".join(f"{rule}: {count}" for rule, count in decided.items())
+            messagebox.showinfo("Автообработка", f"Рассмотрено заявок: {sum(decided.values())}\n{summary}")
+        else:
+            messagebox.showinfo("Автообработка", "Нет заявок, подходящих под правила")
+        self.load_all_requests()
+    
+    def archive_requests(self):
+        """Перенести старые закрытые заявки в архив"""
+        if not messagebox.askyesno(
+            "Подтверждение",
+            "Перенести в архив завершённые и отклоненные заявки старше 180 дней?"
+        ):
+            return
+        
+        try:
+            moved = self.db.archive_requests()
+            messagebox.showinfo("Успех", f"Перенесено в архив заявок: {moved}")
+            self.load_all_requests()
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось выполнить архивацию: {str(e)}")
+    
+    def backup_database(self):
+        """Снять резервную копию базы в фоновом потоке"""
+        result = {}
+        
+        def run():
+            try:
+                result['paths'] = self.db.backup(force=True)
+            except (OSError, sqlite3.Error) as e:
+                result['error'] = e
+        
+        worker = threading.Thread(target=run, daemon=True)
+        self.backup_button.config(state="disabled", text="Копирование...")
+        worker.start()
+        self.root.after(50, self.finish_backup, worker, result)
+    
+    def finish_backup(self, worker, result):
+        """Дождаться окончания копирования и сообщить результат"""
+        if worker.is_alive():
+            self.root.after(50, self.finish_backup, worker, result)
+            return
+        
+        self.backup_button.config(state="normal", text="Резервная копия")
+        if 'error' in result:
+            messagebox.showerror("Ошибка", f"Не удалось создать копию: {result['error']}")
+        else:
+            messagebox.showinfo("Успех", "Резервная копия создана:\n" + "\n".join(result['paths']))
+    
+    def generate_report(self):
+        """Сформировать отчёт за семестр в фоновом потоке (части - в пуле процессов)"""
+        kind = list(REPORT_KINDS)[self.report_kind_combo.current()]
+        date_from = self.report_from_entry.get().strip()
+        date_to = self.report_to_entry.get().strip()
+        try:
+            datetime.strptime(date_from, "%Y-%m-%d")
+            datetime.strptime(date_to, "%Y-%m-%d")
+        except ValueError:
+            messagebox.showerror("Ошибка", "Введите даты отчёта в формате ГГГГ-ММ-ДД")
+            return
+        
+        job = ReportJob(kind, [shard.db_name for shard in self.db.shards], date_from, date_to)
+        result = {}
+        
+        def run():
+            try:
+                result['html'] = job.run()
+            except (OSError, sqlite3.Error) as e:
+                result['error'] = e
+        
+        worker = threading.Thread(target=run, daemon=True)
+        self.report_job = job
+        self.report_button.config(state="disabled")
+        self.report_cancel_button.config(state="normal")
+        self.report_progress.config(value=0, maximum=1)
+        self.report_status_label.config(text="Подготовка...")
+        worker.start()
+        self.root.after(100, self.finish_report, worker, job, result)
+    
+    def cancel_report(self):
+        """Отменить построение отчёта"""
+        self.report_job.cancel()
+        self.report_cancel_button.config(state="disabled")
+        self.report_status_label.config(text="Отмена...")
+    
+    def finish_report(self, worker, job, result):
+        """Показывать прогресс отчёта, по готовности предложить сохранить файл"""
+        # Вкладку статистики могли выгрузить или закрыть окно администратора
+        if not self.report_progress.winfo_exists():
+            job.cancel()
+            return
+        
+        if worker.is_alive():
+            if job.total and not job.cancelled.is_set():
+                self.report_progress.config(value=job.done, maximum=job.total)
+                self.report_status_label.config(text=f"Частей готово: {job.done} из {job.total}")
+            self.root.after(100, self.finish_report, worker, job, result)
+            return
+        
+        self.report_button.config(state="normal")
+        self.report_cancel_button.config(state="disabled")
+        if 'error' in result:
+            self.report_status_label.config(text="")
+            messagebox.showerror("Ошибка", f"Не удалось сформировать отчёт: {result['error']}")
+            return
+        if result['html'] is None:
+            self.report_status_label.config(text="Отменено")
+            return
         
-        # Настройка цветов
-        self.requests_tree.tag_configure('approved', background='#d4edda')
-        self.requests_tree.tag_configure('rejected', background='#f8d7da')
-        self.requests_tree.tag_configure('pending', background='#fff3cd')
-        self.requests_tree.tag_configure('completed', background='#e2e3e5')
+        self.report_progress.config(value=job.total or 1, maximum=job.total or 1)
+        path = filedialog.asksaveasfilename(
+            parent=self.root, title="Сохранить отчёт", defaultextension=".html",
+            initialfile=f"report-{job.kind}-{job.date_from}-{job.date_to}.html",
+            filetypes=[("HTML", "*.html")]
+        )
+        if not path:
+            self.report_status_label.config(text="Отчёт не сохранён")
+            return
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(result['html'])
+        self.report_status_label.config(text=f"Сохранено: {os.path.basename(path)}")
+    
+    def show_request_history(self):
+        """Показать журнал изменений выбранной заявки"""
+        selection = self.requests_tree.selection()
+        if not selection:
+            messagebox.showwarning("Внимание", "Выберите заявку из таблицы")
+            return
+        
+        request_id = self.requests_tree.item(selection[0])['values'][0]
+        users = {user.id: user.full_name for user in self.db.get_all_users(False)}
+        
+        dialog = Toplevel(self.root)
+        dialog.title(f"История заявки #{request_id}")
+        dialog.geometry("600x400")
+        dialog.transient(self.root)
+        
+        text = tk.Text(dialog, font=("Courier", 10), wrap="word")
+        text.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        records = self.db.get_history('requests', request_id)
+        for record in records:
+            actor = users.get(record['actor'], "система") if record['actor'] else "система"
+            text.insert("end", f"{record['ts']}  {actor}  {record['action']}\n")
+            before, after = record['before'] or {}, record['after'] or {}
+            for key in dict.fromkeys([*before, *after]):
+                text.insert("end", f"    {key}: {before.get(key)} -> {after.get(key)}\n")
+        if not records:
+            text.insert("end", "Изменений не найдено")
+        text.config(state="disabled")
     
     def update_status(self):
         """Обновить статус выбранной заявки"""
@@ -1154,7 +1687,9 @@ class AdminApp:
             return
         
         item = selection[0]
-        request_id = self.requests_tree.item(item)['values'][0]
+        # Версия строки - последнее (не отображаемое) значение
+        values = self.requests_tree.item(item)['values']
+        request_id, version = values[0], int(values[-1])
         translated_status = self.status_combo.get()
         
         # Преобразование статуса обратно в английский
@@ -1162,16 +1697,55 @@ class AdminApp:
         
         notes = self.notes_entry.get().strip() or None
         
+        # Слот уже занят - предложить лист ожидания вместо одобрения
+        if original_status == 'approved':
+            holder = self.db.get_slot_holder(request_id)
+            series_id = self.db.get_slot_series(request_id) if holder is None else None
+            if holder is not None or series_id is not None:
+                taken_by = f"заявкой #{holder}" if holder is not None else f"серией #{series_id}"
+                if not messagebox.askyesno(
+                    "Слот занят",
+                    f"Слот уже занят {taken_by}. Поставить заявку в лист ожидания?"
+                ):
+                    return
+                original_status = 'waitlisted'
+        
         try:
-            self.db.update_request_status(request_id, original_status, notes)
-            messagebox.showinfo("Успех", f"Статус заявки #{request_id} обновлен")
+            promoted = self.db.update_request_status(request_id, original_status, notes,
+                                                     expected_version=version)
+            message = f"Статус заявки #{request_id} обновлен"
+            if promoted:
+                message += f"\nЗаявка #{promoted} одобрена из листа ожидания"
+            messagebox.showinfo("Успех", message)
             self.notes_entry.delete(0, tk.END)
             self.load_all_requests()
+        except StaleRecordError as e:
+            # Заявку уже рассмотрел другой администратор - показать, что с ней сейчас
+            self.report_conflict(e, lambda req: [
+                ("Статус", self.status_translation.get(req.status, req.status)),
+                ("Комментарий", req.admin_notes or "-"),
+            ], "Список заявок обновлен, выберите статус заново.")
+            self.load_all_requests()
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось обновить статус: {str(e)}")
     
+    def report_conflict(self, error, fields, hint, parent=None):
+        """Сообщить, что запись изменили после чтения; свежая запись или None
+        
+        fields(запись) -> [(подпись, значение)] для показа актуальных данных.
+        """
+        if error.current is None:
+            messagebox.showerror("Конфликт правок", f"{error}.", parent=parent)
+            return None
+        current = "\n".join(f"{label}: {value}" for label, value in fields(error.current))
+        messagebox.showwarning("Конфликт правок", f"{error}.\n\nСейчас в базе:\n{current}\n\n{hint}",
+                               parent=parent)
+        return error.current
+    
     def load_users(self):
         """Загрузить список пользователей"""
+        self.refresh_filter_choices()
+        
         # Очистить таблицу
         for item in self.users_tree.get_children():
             self.users_tree.delete(item)
@@ -1181,36 +1755,22 @@ class AdminApp:
         for user in users:
             self.users_tree.insert("", "end", values=user)
     
-    def load_equipment(self):
-        """Загрузить оборудование"""
+    def load_equipment(self, cached=False):
+        """Загрузить оборудование с учетом фильтров"""
+        if not cached:
+            self.refresh_filter_choices()
+        
         # Очистить таблицу
         for item in self.equipment_tree.get_children():
             self.equipment_tree.delete(item)
         
         # Загрузить данные
-        equipment = self.db.get_all_equipment()
+        equipment = self.db.get_all_equipment(self.equipment_filter.values(), cached=cached)
         
         for eq in equipment:
-            eq_id, name, desc, status = eq
-            translated_status = self.equip_status_translation.get(status, status)
-            
-            # Подсветка статуса
-            tags = ()
-            if status == 'available':
-                tags = ('available',)
-            elif status == 'in_use':
-                tags = ('in_use',)
-            elif status == 'maintenance':
-                tags = ('maintenance',)
-            
-            self.equipment_tree.insert("", "end", 
-                                     values=(eq_id, name, desc, translated_status), 
-                                     tags=tags)
-        
-        # Настройка цветов
-        self.equipment_tree.tag_configure('available', background='#d4edda')
-        self.equipment_tree.tag_configure('in_use', background='#fff3cd')
-        self.equipment_tree.tag_configure('maintenance', background='#f8d7da')
+            # Строка с переведенным статусом, подсветка по тегу статуса
+            label = self.equip_status_translation.get(eq.status, eq.status)
+            self.equipment_tree.insert("", "end", values=eq.display(label), tags=(eq.status,))
     
     def add_user(self):
         """Добавить нового пользователя"""
@@ -1259,6 +1819,9 @@ class AdminApp:
                 messagebox.showinfo("Успех", "Пользователь успешно добавлен")
                 self.load_users()
                 dialog.destroy()
+            elif self.db.is_retired_name('users', username):
+                messagebox.showerror("Ошибка", "Логин принадлежит удалённому пользователю: его "
+                                     "заявки сохранены в истории. Выберите другой логин.")
             else:
                 messagebox.showerror("Ошибка", "Пользователь с таким логином уже существует")
         
@@ -1318,12 +1881,12 @@ class AdminApp:
         # Поля формы
         tk.Label(dialog, text="Логин:", font=("Arial", 11)).pack(pady=(20, 5))
         username_entry = tk.Entry(dialog, font=("Arial", 11), width=30)
-        username_entry.insert(0, user[1])
+        username_entry.insert(0, user.username)
         username_entry.pack()
         
         tk.Label(dialog, text="ФИО:", font=("Arial", 11)).pack(pady=(10, 5))
         fullname_entry = tk.Entry(dialog, font=("Arial", 11), width=30)
-        fullname_entry.insert(0, user[2])
+        fullname_entry.insert(0, user.full_name)
         fullname_entry.pack()
         
         tk.Label(dialog, text="Новый пароль (оставьте пустым, чтобы не менять):", 
@@ -1333,7 +1896,7 @@ class AdminApp:
         
         tk.Label(dialog, text="Роль:", font=("Arial", 11)).pack(pady=(10, 5))
         role_combo = ttk.Combobox(dialog, values=['teacher', 'admin'], width=28)
-        role_combo.set(user[3])
+        role_combo.set(user.role)
         role_combo.pack()
         
         def save_changes():
@@ -1346,7 +1909,18 @@ class AdminApp:
                 messagebox.showerror("Ошибка", "Заполните обязательные поля")
                 return
             
-            self.db.update_user(user_id, username, full_name, role, password if password else None)
+            nonlocal user
+            try:
+                self.db.update_user(user_id, username, full_name, role,
+                                    password if password else None, expected_version=user.version)
+            except StaleRecordError as e:
+                self.load_users()
+                user = self.report_conflict(e, lambda current: [
+                    ("Логин", current.username), ("ФИО", current.full_name), ("Роль", current.role),
+                ], "Ваши правки остались в форме: «Сохранить» запишет их поверх.", dialog)
+                if user is None:
+                    dialog.destroy()
+                return
             messagebox.showinfo("Успех", "Данные пользователя обновлены")
             self.load_users()
             dialog.destroy()
@@ -1401,9 +1975,10 @@ class AdminApp:
     
     def add_equipment(self):
         """Добавить новое оборудование"""
+        campuses = self.db.campuses()
         dialog = Toplevel(self.root)
         dialog.title("Добавить оборудование")
-        dialog.geometry("400x350")
+        dialog.geometry("400x410" if len(campuses) > 1 else "400x350")
         dialog.resizable(False, False)
         dialog.transient(self.root)
         dialog.grab_set()
@@ -1430,6 +2005,13 @@ class AdminApp:
         status_combo.current(0)
         status_combo.pack()
         
+        # Кампус (если их несколько)
+        campus_combo = ttk.Combobox(dialog, values=campuses, width=28, state="readonly")
+        campus_combo.current(0)
+        if len(campuses) > 1:
+            tk.Label(dialog, text="Кампус:", font=("Arial", 11)).pack(pady=(10, 5))
+            campus_combo.pack()
+        
         def save_equipment():
             name = name_entry.get().strip()
             description = desc_entry.get().strip()
@@ -1442,10 +2024,17 @@ class AdminApp:
                 messagebox.showerror("Ошибка", "Введите название оборудования")
                 return
             
-            if self.db.add_equipment(name, description, original_status):
+            if len(campuses) > 1:
+                added = self.db.add_equipment(name, description, original_status, campus_combo.get())
+            else:
+                added = self.db.add_equipment(name, description, original_status)
+            if added:
                 messagebox.showinfo("Успех", "Оборудование успешно добавлено")
                 self.load_equipment()
                 dialog.destroy()
+            elif self.db.is_retired_name('equipment', name):
+                messagebox.showerror("Ошибка", "Название принадлежит списанному оборудованию: "
+                                     "оно сохранено в истории заявок. Выберите другое название.")
             else:
                 messagebox.showerror("Ошибка", "Оборудование с таким названием уже существует")
         
@@ -1505,12 +2094,12 @@ class AdminApp:
         # Поля формы
         tk.Label(dialog, text="Название оборудования:", font=("Arial", 11)).pack(pady=(20, 5))
         name_entry = tk.Entry(dialog, font=("Arial", 11), width=30)
-        name_entry.insert(0, equipment[1])
+        name_entry.insert(0, equipment.name)
         name_entry.pack()
         
         tk.Label(dialog, text="Описание:", font=("Arial", 11)).pack(pady=(10, 5))
         desc_entry = tk.Entry(dialog, font=("Arial", 11), width=30)
-        desc_entry.insert(0, equipment[2])
+        desc_entry.insert(0, equipment.description)
         desc_entry.pack()
         
         tk.Label(dialog, text="Статус:", font=("Arial", 11)).pack(pady=(10, 5))
@@ -1519,7 +2108,7 @@ class AdminApp:
                                    width=28)
         
         # Установка текущего статуса
-        current_status = self.equip_status_translation.get(equipment[3], equipment[3])
+        current_status = self.equip_status_translation.get(equipment.status, equipment.status)
         status_combo.set(current_status)
         status_combo.pack()
         
@@ -1535,10 +2124,26 @@ class AdminApp:
                 messagebox.showerror("Ошибка", "Введите название оборудования")
                 return
             
-            if self.db.update_equipment(equip_id, name, description, original_status):
+            nonlocal equipment
+            try:
+                updated = self.db.update_equipment(equip_id, name, description, original_status,
+                                                   expected_version=equipment.version)
+            except StaleRecordError as e:
+                self.load_equipment()
+                equipment = self.report_conflict(e, lambda current: [
+                    ("Название", current.name), ("Описание", current.description or "-"),
+                    ("Статус", self.equip_status_translation.get(current.status, current.status)),
+                ], "Ваши правки остались в форме: «Сохранить» запишет их поверх.", dialog)
+                if equipment is None:
+                    dialog.destroy()
+                return
+            if updated:
                 messagebox.showinfo("Успех", "Данные оборудования обновлены")
                 self.load_equipment()
                 dialog.destroy()
+            elif self.db.is_retired_name('equipment', name):
+                messagebox.showerror("Ошибка", "Название принадлежит списанному оборудованию: "
+                                     "оно сохранено в истории заявок. Выберите другое название.")
             else:
                 messagebox.showerror("Ошибка", "Оборудование с таким названием уже существует")
         
@@ -1566,6 +2171,100 @@ class AdminApp:
             command=dialog.destroy
         ).pack(side="left", padx=5)
     
+    def manage_maintenance(self):
+        """Окна обслуживания выбранного оборудования"""
+        selection = self.equipment_tree.selection()
+        if not selection:
+            messagebox.showwarning("Внимание", "Выберите оборудование из таблицы")
+            return
+        
+        equip_id, equip_name = self.equipment_tree.item(selection[0])['values'][:2]
+        
+        dialog = Toplevel(self.root)
+        dialog.title(f"Обслуживание: {equip_name}")
+        dialog.geometry("560x420")
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        # Центрирование диалога
+        dialog.update_idletasks()
+        x = self.root.winfo_x() + (self.root.winfo_width() - dialog.winfo_width()) // 2
+        y = self.root.winfo_y() + (self.root.winfo_height() - dialog.winfo_height()) // 2
+        dialog.geometry(f"+{x}+{y}")
+        
+        # Запланированные и текущие окна
+        columns = ("ID", "С", "По", "Причина", "Состояние")
+        windows_tree = ttk.Treeview(dialog, columns=columns, show="headings", height=8)
+        for col, width in zip(columns, [40, 100, 100, 180, 100]):
+            windows_tree.heading(col, text=col)
+            windows_tree.column(col, width=width, minwidth=40)
+        windows_tree.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        state_translation = {'scheduled': 'Запланировано', 'active': 'Идёт'}
+        
+        def load_windows():
+            for item in windows_tree.get_children():
+                windows_tree.delete(item)
+            for window_id, _, start_date, end_date, reason, state in \
+                    self.db.get_maintenance_windows(equip_id):
+                windows_tree.insert("", "end", values=(
+                    window_id, start_date, end_date, reason or "",
+                    state_translation.get(state, state)
+                ))
+        
+        # Форма нового окна
+        form = tk.Frame(dialog)
+        form.pack(fill="x", padx=10)
+        tk.Label(form, text="С (ГГГГ-ММ-ДД):", font=("Arial", 10)).grid(row=0, column=0, sticky="w")
+        start_entry = tk.Entry(form, font=("Arial", 10), width=12)
+        start_entry.insert(0, datetime.now().strftime("%Y-%m-%d"))
+        start_entry.grid(row=0, column=1, padx=5)
+        tk.Label(form, text="По:", font=("Arial", 10)).grid(row=0, column=2, sticky="w")
+        end_entry = tk.Entry(form, font=("Arial", 10), width=12)
+        end_entry.grid(row=0, column=3, padx=5)
+        tk.Label(form, text="Причина:", font=("Arial", 10)).grid(row=1, column=0, sticky="w", pady=5)
+        reason_entry = tk.Entry(form, font=("Arial", 10), width=40)
+        reason_entry.grid(row=1, column=1, columnspan=3, sticky="w", padx=5, pady=5)
+        
+        def add_window():
+            start_date = start_entry.get().strip()
+            end_date = end_entry.get().strip() or start_date
+            try:
+                _, affected = self.db.add_maintenance_window(
+                    equip_id, start_date, end_date, reason_entry.get().strip()
+                )
+            except ValueError as e:
+                messagebox.showerror("Ошибка", f"Некорректные даты: {str(e)}", parent=dialog)
+                return
+            load_windows()
+            self.load_equipment()
+            if affected:
+                listed = "\n".join(f"#{request_id}: {day} {slot}" for request_id, day, slot, _ in affected[:10])
+                messagebox.showwarning(
+                    "Внимание",
+                    f"В окно обслуживания попадают {len(affected)} заявок:\n{listed}",
+                    parent=dialog
+                )
+        
+        def delete_window():
+            selected = windows_tree.selection()
+            if not selected:
+                return
+            self.db.delete_maintenance_window(windows_tree.item(selected[0])['values'][0])
+            load_windows()
+            self.load_equipment()
+        
+        button_frame = tk.Frame(dialog)
+        button_frame.pack(pady=10)
+        tk.Button(button_frame, text="Запланировать", font=("Arial", 11, "bold"), bg="#4CAF50",
+                  fg="white", padx=15, pady=5, command=add_window).pack(side="left", padx=5)
+        tk.Button(button_frame, text="Отменить окно", font=("Arial", 11), bg="#F44336",
+                  fg="white", padx=15, pady=5, command=delete_window).pack(side="left", padx=5)
+        tk.Button(button_frame, text="Закрыть", font=("Arial", 11), padx=15, pady=5,
+                  command=dialog.destroy).pack(side="left", padx=5)
+        
+        load_windows()
+    
     def delete_equipment(self):
         """Удалить оборудование"""
         selection = self.equipment_tree.selection()
@@ -1615,36 +2314,87 @@ class AdminApp:
             total_requests += count
         
         self.request_stats_text.insert(tk.END, f"\nВсего заявок: {total_requests}")
-    
-    def run(self):
-        """Запуск приложения"""
-        self.root.mainloop()
+        
+        # Загрузка оборудования
+        self.load_usage_stats()
+        
+        # Динамика заявок
+        self.load_trend_stats()
+    
+    def load_trend_stats(self):
+        """Число заявок по месяцам и годам из ежедневных агрегатов"""
+        text = self.trend_stats_text
+        text.delete("1.0", tk.END)
+        statuses = list(self.status_translation)
+        header = f"{'Период':<10}" + "".join(
+            f"{self.status_translation[st]:>17}" for st in statuses
+        ) + f"{'Всего':>8}\n"
+        
+        for title, period, limit in (("По месяцам", 'month', 12), ("По годам", 'year', 5)):
+            table = {}
+            for key, status, count in self.db.get_request_trend(period, limit):
+                table.setdefault(key, {})[status] = count
+            text.insert(tk.END, f"{title}:\n" + header)
+            for key, counts in table.items():
+                text.insert(tk.END, f"{key:<10}" + "".join(
+                    f"{counts.get(st, 0):>17}" for st in statuses
+                ) + f"{sum(counts.values()):>8}\n")
+            text.insert(tk.END, "\n")
+    
+    def load_usage_stats(self):
+        """Загрузка оборудования, доля одобрений, группы, недели и пиковые слоты"""
+        equipment = self.db.get_all_equipment()
+        names = {eq.id: eq.name for eq in equipment}
+        report = self.db.get_usage_report(names)
+        text = self.usage_stats_text
+        text.delete("1.0", tk.END)
+        
+        text.insert(tk.END, f"Период: {report.columns.first_day} - {report.columns.last_day}, "
+                            f"заявок: {len(report.columns)}\n\n")
+        text.insert(tk.END, f"{'Оборудование':<34}{'Загрузка':>10}{'Одобрено':>10}\n")
+        for equipment_id in sorted(report.equipment_ids, key=report.utilization, reverse=True):
+            name = names.get(equipment_id, f"#{equipment_id}")[:32]
+            text.insert(tk.END, f"{name:<34}{report.utilization(equipment_id):>9.1%}"
+                                f"{report.approval_rate(equipment_id):>10.0%}\n")
+        
+        text.insert(tk.END, "\nЗанятые слоты по группам:\n")
+        for group, count in report.group_counts()[:10]:
+            text.insert(tk.END, f"  {group:<20}{count:>6}\n")
+        
+        text.insert(tk.END, "\nЗанятые слоты по неделям (последние 8):\n")
+        for monday, count in report.week_counts()[-8:]:
+            text.insert(tk.END, f"  {monday}{count:>6}\n")
+        
+        text.insert(tk.END, "\nТепловая карта (день недели x слот):\n")
+        text.insert(tk.END, "    " + "".join(f"{slot:>13}" for slot in TIME_SLOTS) + "\n")
+        for weekday, row in zip(WEEKDAYS, report.heatmap_rows()):
+            text.insert(tk.END, f"  {weekday}" + "".join(f"{count:>13}" for count in row) + "\n")
+        peak = report.peak_slot()
+        if peak:
+            text.insert(tk.END, f"\nПиковый слот: {peak[0]} {peak[1]}")
+    
+    def logout(self):
+        """Выход из учетной записи (сохранённый токен удаляется)"""
+        self.db.sessions.end()
+        self.shell.show_login()
+
 
 class GuestApp:
     """Приложение для гостевого доступа"""
     
-    def __init__(self, db_manager):
-        self.db = db_manager
-        self.root = tk.Tk()
+    def __init__(self, shell):
+        self.shell = shell
+        self.db = shell.db
+        self.root = shell.root
+        self.frame = shell.new_view_frame()
         self.root.title("LabEquipment Manager - Гостевой доступ")
         self.root.geometry("1300x800")
         self.root.resizable(True, True)  # Разрешаем изменение размера
         self.center_window(1300, 800)
         
-        # Словарь для перевода статусов
-        self.status_translation = {
-            'pending': 'На рассмотрении',
-            'approved': 'Одобрено',
-            'rejected': 'Отклонено',
-            'completed': 'Завершено'
-        }
-        
-        # Словарь для статусов оборудования
-        self.equip_status_translation = {
-            'available': 'Доступно',
-            'in_use': 'В использовании',
-            'maintenance': 'На обслуживании'
-        }
+        # Общие словари подписей статусов
+        self.status_translation = REQUEST_STATUS_LABELS
+        self.equip_status_translation = EQUIPMENT_STATUS_LABELS
         
         self.create_widgets()
         self.load_all_requests()
@@ -1660,7 +2410,7 @@ class GuestApp:
     def create_widgets(self):
         """Создание интерфейса гостевого доступа"""
         # Заголовок
-        header_frame = tk.Frame(self.root, bg="#607D8B")
+        header_frame = tk.Frame(self.frame, bg="#607D8B")
         header_frame.pack(fill="x", pady=(0, 10))
         
         title_label = tk.Label(
@@ -1685,23 +2435,28 @@ class GuestApp:
         )
         info_label.pack(side="right")
         
-        # Панель вкладок
-        self.notebook = ttk.Notebook(self.root)
+        # Панель вкладок (вкладки строятся при первом открытии)
+        self.notebook = LazyNotebook(self.frame, max_loaded=1)
         self.notebook.pack(fill="both", expand=True, padx=10, pady=(0, 10))
         
         # Вкладка 1: Просмотр заявок
-        self.create_requests_tab()
+        requests_tab = self.notebook.add_lazy("Заявки", self.create_requests_tab, pinned=True)
         
         # Вкладка 2: Просмотр оборудования
-        self.create_equipment_tab()
+        self.notebook.add_lazy("Оборудование", self.create_equipment_tab)
         
         # Вкладка 3: Статистика
-        self.create_stats_tab()
+        self.notebook.add_lazy("Статистика", self.create_stats_tab)
+        
+        self.notebook.ensure_built(requests_tab)
     
-    def create_requests_tab(self):
+    def create_requests_tab(self, tab):
         """Создать вкладку просмотра заявок"""
-        tab = tk.Frame(self.notebook)
-        self.notebook.add(tab, text="Заявки")
+        # Панель фильтров
+        self.requests_filter = FilterBar(
+            tab, self.request_filter_fields(), lambda: self.load_all_requests(cached=True)
+        )
+        self.requests_filter.pack(fill="x", padx=10, pady=(10, 0))
         
         # Контейнер для таблицы
         table_container = tk.Frame(tab)
@@ -1710,6 +2465,7 @@ class GuestApp:
         # Таблица всех заявок
         columns = ("ID", "Преподаватель", "Оборудование", "Группа", "Цель", "Дата", "Время", "Статус", "Комментарий")
         self.requests_tree = ttk.Treeview(table_container, columns=columns, show="headings")
+        style_status_tags(self.requests_tree)
         
         # Настройка колонок
         col_widths = [50, 150, 150, 80, 200, 100, 100, 100, 200]
@@ -1742,10 +2498,16 @@ class GuestApp:
         )
         refresh_button.pack(pady=10)
     
-    def create_equipment_tab(self):
+    def create_equipment_tab(self, tab):
         """Создать вкладку просмотра оборудования"""
-        tab = tk.Frame(self.notebook)
-        self.notebook.add(tab, text="Оборудование")
+        # Панель фильтров
+        self.equipment_filter = FilterBar(
+            tab,
+            [('status', "Статус:", EQUIPMENT_STATUS_BY_LABEL),
+             ('text', "Поиск:", None)],
+            lambda: self.load_equipment(cached=True)
+        )
+        self.equipment_filter.pack(fill="x", padx=10, pady=(10, 0))
         
         # Контейнер для таблицы
         table_container = tk.Frame(tab)
@@ -1754,6 +2516,7 @@ class GuestApp:
         # Таблица оборудования
         columns = ("ID", "Название", "Описание", "Статус")
         self.equipment_tree = ttk.Treeview(table_container, columns=columns, show="headings")
+        style_status_tags(self.equipment_tree, EQUIPMENT_STATUS_COLORS)
         
         # Настройка колонок
         col_widths = [50, 200, 300, 100]
@@ -1789,11 +2552,8 @@ class GuestApp:
         # Загрузка оборудования
         self.load_equipment()
     
-    def create_stats_tab(self):
+    def create_stats_tab(self, tab):
         """Создать вкладку со статистикой"""
-        tab = tk.Frame(self.notebook)
-        self.notebook.add(tab, text="Статистика")
-        
         # Фрейм для статистики с прокруткой
         canvas = tk.Canvas(tab)
         scrollbar = ttk.Scrollbar(tab, orient="vertical", command=canvas.yview)
@@ -1845,7 +2605,7 @@ class GuestApp:
             scrollable_frame,
             text="Выход",
             font=("Arial", 11),
-            command=self.root.destroy,
+            command=self.shell.show_login,
             padx=15,
             pady=5
         )
@@ -1858,72 +2618,58 @@ class GuestApp:
         # Загрузка статистики
         self.load_stats()
     
-    def load_all_requests(self):
-        """Загрузить все заявки"""
+    def request_filter_fields(self):
+        """Поля панели фильтров заявок"""
+        equipment = {eq.name: eq.id for eq in self.db.get_all_equipment()}
+        teachers = {user.full_name: user.id for user in self.db.get_all_users() if user.role == 'teacher'}
+        return [
+            ('status', "Статус:", REQUEST_STATUS_BY_LABEL),
+            ('equipment_id', "Оборудование:", equipment),
+            ('teacher_id', "Преподаватель:", teachers),
+            ('date_from', "Дата с:", None),
+            ('date_to', "по:", None),
+            ('text', "Поиск:", None),
+        ]
+    
+    def refresh_filter_choices(self):
+        """Обновить списки оборудования и преподавателей в фильтре заявок"""
+        for key, _, choices in self.request_filter_fields():
+            if key in ('equipment_id', 'teacher_id'):
+                self.requests_filter.set_choices(key, choices)
+    
+    def load_all_requests(self, cached=False):
+        """Загрузить все заявки с учетом фильтров"""
+        # Полная перезагрузка (не по фильтру) - обновить и варианты фильтров
+        if not cached:
+            self.refresh_filter_choices()
+        
         # Очистить таблицу
         for item in self.requests_tree.get_children():
             self.requests_tree.delete(item)
         
         # Загрузить данные
-        requests = self.db.get_all_requests()
+        requests = self.db.get_all_requests(self.requests_filter.values(), cached=cached)
         for req in requests:
-            # Преобразование статуса
-            original_status = req[7]
-            translated_status = self.status_translation.get(original_status, original_status)
-            
-            # Создание новой строки с переведенным статусом
-            translated_req = list(req)
-            translated_req[7] = translated_status
-            
-            # Подсветка статуса
-            tags = ()
-            if original_status == 'approved':
-                tags = ('approved',)
-            elif original_status == 'rejected':
-                tags = ('rejected',)
-            elif original_status == 'pending':
-                tags = ('pending',)
-            elif original_status == 'completed':
-                tags = ('completed',)
-            
-            self.requests_tree.insert("", "end", values=translated_req, tags=tags)
-        
-        # Настройка цветов
-        self.requests_tree.tag_configure('approved', background='#d4edda')
-        self.requests_tree.tag_configure('rejected', background='#f8d7da')
-        self.requests_tree.tag_configure('pending', background='#fff3cd')
-        self.requests_tree.tag_configure('completed', background='#e2e3e5')
+            # Строка с переведенным статусом, подсветка по тегу статуса
+            label = self.status_translation.get(req.status, req.status)
+            self.requests_tree.insert("", "end", values=req.display(label), tags=(req.status,))
     
-    def load_equipment(self):
-        """Загрузить оборудование"""
+    def load_equipment(self, cached=False):
+        """Загрузить оборудование с учетом фильтров"""
+        if not cached:
+            self.refresh_filter_choices()
+        
         # Очистить таблицу
         for item in self.equipment_tree.get_children():
             self.equipment_tree.delete(item)
         
         # Загрузить данные
-        equipment = self.db.get_all_equipment()
+        equipment = self.db.get_all_equipment(self.equipment_filter.values(), cached=cached)
         
         for eq in equipment:
-            eq_id, name, desc, status = eq
-            translated_status = self.equip_status_translation.get(status, status)
-            
-            # Подсветка статуса
-            tags = ()
-            if status == 'available':
-                tags = ('available',)
-            elif status == 'in_use':
-                tags = ('in_use',)
-            elif status == 'maintenance':
-                tags = ('maintenance',)
-            
-            self.equipment_tree.insert("", "end", 
-                                     values=(eq_id, name, desc, translated_status), 
-                                     tags=tags)
-        
-        # Настройка цветов
-        self.equipment_tree.tag_configure('available', background='#d4edda')
-        self.equipment_tree.tag_configure('in_use', background='#fff3cd')
-        self.equipment_tree.tag_configure('maintenance', background='#f8d7da')
+            # Строка с переведенным статусом, подсветка по тегу статуса
+            label = self.equip_status_translation.get(eq.status, eq.status)
+            self.equipment_tree.insert("", "end", values=eq.display(label), tags=(eq.status,))
     
     def load_stats(self):
         """Загрузить статистику"""
@@ -1950,23 +2696,93 @@ class GuestApp:
             total_requests += count
         
         self.request_stats_text.insert(tk.END, f"\nВсего заявок: {total_requests}")
-    
-    def run(self):
-        """Запуск приложения"""
-        self.root.mainloop()
+
 
 def main():
     """Главная функция"""
+    print("=== Запуск LabEquipment Manager ===")
     print("Инициализация приложения...")
     
     try:
+        # Восстановление из снимка до открытия базы (клиенты должны быть закрыты)
+        if "--restore" in sys.argv:
+            snapshot = sys.argv[sys.argv.index("--restore") + 1]
+            saved = restore_snapshot(snapshot, "lab_equipment.db")
+            print(f"База (с архивом и кампусами) восстановлена из {snapshot}, "
+                  f"прежние файлы сохранены с суффиксом .before-restore ({saved})")
+            return
+        
         # Инициализация базы данных
-        db = DatabaseManager()
+        db = open_database(fast_start="--check-schema" not in sys.argv)
+        
+        # Новый кампус со своей базой
+        if "--add-campus" in sys.argv:
+            name = sys.argv[sys.argv.index("--add-campus") + 1]
+            index = add_campus(db.shards[0], name)
+            print(f"Кампус '{name}' добавлен: {shard_path(db.db_name, index)}")
+            db.close()
+            return
+        
+        # Автоматическое рассмотрение заявок по правилам
+        if "--auto-approve" in sys.argv:
+            decided = db.auto_process_requests()
+            print(f"Рассмотрено автоматически: {sum(decided.values())} заявок {dict(decided)}")
+            db.close()
+            return
         
-        # Создание главного окна входа
-        root = tk.Tk()
-        app = LoginWindow(root, db)
-        root.mainloop()
+        # Перенос старых закрытых заявок в архив
+        if "--archive" in sys.argv:
+            print(f"Перенесено в архив: {db.archive_requests()} заявок")
+            db.close()
+            return
+        
+        # Резервная копия без остановки клиентов
+        if "--backup" in sys.argv:
+            print("Резервная копия: " + ", ".join(db.backup(force=True)))
+            db.close()
+            return
+        
+        # Отчёт за текущий семестр в HTML без запуска окна
+        if "--report" in sys.argv:
+            kind = sys.argv[sys.argv.index("--report") + 1]
+            date_from, date_to = term_bounds()
+            job = ReportJob(kind, [shard.db_name for shard in db.shards], date_from, date_to)
+            path = f"report-{kind}-{date_from}-{date_to}.html"
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(job.run())
+            print(f"Отчёт сохранён: {path} (частей: {job.total})")
+            db.close()
+            return
+        
+        # Пересчёт ежедневных агрегатов для существующей базы
+        if "--rebuild-rollup" in sys.argv:
+            print(f"Агрегаты пересчитаны: {db.rebuild_daily_stats()} строк")
+            db.close()
+            return
+        
+        # Один интерпретатор Tk на весь сеанс
+        with STARTUP.phase("Создание Tk"):
+            shell = AppShell(db)
+        with STARTUP.phase("Окно входа"):
+            shell.show_login()
+        
+        def first_frame():
+            STARTUP.mark("Первый кадр")
+            STARTUP.report()
+        
+        shell.root.after_idle(first_frame)
+        shell.run()
+        
+        # Сколько раз за сеанс база была занята другим клиентом
+        locks = db.lock_statistics()
+        if locks['locked']:
+            print(f"Блокировки БД: {locks['locked']}, повторов: {locks['retries']}, "
+                  f"не помогло: {locks['failures']}, ожидание {locks['waited']:.2f} с")
+        
+        # Профиль запросов реестра (--profile-sql)
+        if "--profile-sql" in sys.argv:
+            for name, calls, seconds in db.statement_profile()[:20]:
+                print(f"{name:<28}{calls:>8}{seconds * 1000:>12.1f} мс")
         
         # Закрытие БД при выходе
         db.close()
@@ -1976,6 +2792,7 @@ def main():
         print(f"Ошибка: {e}")
         messagebox.showerror("Критическая ошибка", f"Не удалось запустить приложение: {str(e)}")
 
+
 if __name__ == "__main__":
     print("=" * 50)
     print("LABEQUIPMENT MANAGER v1.0 (Tkinter версия)")